@@ -0,0 +1,294 @@
+import types
+import Queue
+import kvlite
+import logging
+import threading
+
+from kvlite.settings import ITEMS_PER_REQUEST
+from kvlite.managers import SqliteCollectionManager
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------
+# Future class
+# -----------------------------------------------------------------
+class Future(object):
+    ''' Future
+
+    the result of asynchronous call, the subset of concurrent.futures.Future API
+    '''
+    def __init__(self):
+
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._error = None
+        self._callbacks = list()
+
+    def done(self):
+        ''' return True if the call is completed
+        '''
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        ''' return the result of call, the error of call is raised. Waits for
+        completion `timeout` seconds, forever if None
+        '''
+        if not self._done.wait(timeout):
+            raise RuntimeError('The call is not completed in %s seconds' % timeout)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def exception(self, timeout=None):
+        ''' return the error of call or None
+        '''
+        if not self._done.wait(timeout):
+            raise RuntimeError('The call is not completed in %s seconds' % timeout)
+        return self._error
+
+    def add_done_callback(self, fn):
+        ''' call fn(future) when the call is completed, immediately if it's
+        completed already. Callbacks are called in executor thread, the errors
+        of callbacks are logged and ignored
+        '''
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        self._call_back(fn)
+
+    def set_result(self, result):
+        ''' complete the call with result
+        '''
+        self._complete(result, None)
+
+    def set_exception(self, error):
+        ''' complete the call with error
+        '''
+        self._complete(None, error)
+
+    def _complete(self, result, error):
+        ''' store the result, wake up waiting threads and run callbacks
+        '''
+        with self._lock:
+            if self._done.is_set():
+                raise RuntimeError('The future is completed already')
+            self._result, self._error = result, error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, list()
+        for fn in callbacks:
+            self._call_back(fn)
+
+    def _call_back(self, fn):
+        ''' call fn(future), the error is logged, so it does not stop the thread
+        which completed the future
+        '''
+        try:
+            fn(self)
+        except Exception:
+            logger.exception('exception calling callback for %r', self)
+
+# -----------------------------------------------------------------
+# AsyncIterator class
+# -----------------------------------------------------------------
+class AsyncIterator(object):
+    ''' AsyncIterator
+
+    asynchronous iteration over collection by pages in key order,
+    next() returns the future of the next page, empty list after the last page
+
+    pages = collection.scan(limit=100)
+    page = pages.next().result()
+    while page:
+        ...
+        page = pages.next().result()
+    '''
+    def __init__(self, collection, limit=ITEMS_PER_REQUEST):
+
+        self._collection = collection
+        self._limit = limit
+        self._token = ''
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        ''' return the future of the next page of (key, document), pages are
+        selected one after another
+        '''
+        future = Future()
+        with self._lock:
+            previous, self._pending = self._pending, future
+
+        def select(token):
+            if token is None:
+                future.set_result(list())
+                return
+            self._collection._call(lambda c: c.get(after=token, limit=self._limit)).add_done_callback(fetched)
+
+        def fetched(page):
+            error = page.exception()
+            if error is not None:
+                self._token = None
+                future.set_exception(error)
+                return
+            docs, self._token = page.result()
+            future.set_result(docs)
+
+        # the page is selected after the previous one, by its continuation token
+        if previous is None:
+            select(self._token)
+        else:
+            previous.add_done_callback(lambda _: select(self._token))
+        return future
+
+# -----------------------------------------------------------------
+# AsyncCollection class
+# -----------------------------------------------------------------
+class AsyncCollection(object):
+    ''' AsyncCollection
+
+    asynchronous access to collection, methods return Future objects. The calls
+    are executed by dedicated threads, every thread uses own connection, so
+    SQLite connections are used only in the thread where they were created:
+
+    - reads are executed by `readers` threads, the calls from many clients
+    are executed at the same time
+    - writes (put, delete, commit) are executed one by one by the writer thread,
+    the changes are visible to readers after commit()
+
+    the amount of pending calls is limited by `queue_size`, the call is blocked
+    if the queue is full. `cache` is not supported. Collections in SQLite memory database use the writer
+    thread only, a memory database is not shared between connections
+    '''
+    def __init__(self, uri, readers=4, queue_size=1000, **kwargs):
+        ''' __init__
+
+        uri         - collection URI
+        readers     - the number of reader threads/connections
+        queue_size  - max amount of pending calls
+        kwargs      - parameters of kvlite.open()
+        '''
+        if kwargs.get('cache') is not None:
+            raise RuntimeError('Cache is not supported, the cache cannot be shared between threads '
+                               'and changes of writer thread are not visible to caches of readers')
+        self._uri = uri
+        self._kwargs = kwargs
+
+        # the collection is created and URI is checked before start of threads
+        collection = kvlite.open(uri, **kwargs)
+        collection.commit()
+        collection.close()
+
+        if uri.startswith('sqlite://') and SqliteCollectionManager.parse_uri(uri)['db'] == ':memory:':
+            readers = 0
+        self._writes = Queue.Queue(queue_size)
+        self._reads = Queue.Queue(queue_size) if readers > 0 else self._writes
+        self._threads = [threading.Thread(target=self._worker, args=(self._writes,)), ]
+        self._threads.extend([threading.Thread(target=self._worker, args=(self._reads,)) for _ in range(readers)])
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _worker(self, queue):
+        ''' execute calls from queue with own collection
+        '''
+        collection = None
+        while True:
+            call = queue.get()
+            if call is None:
+                break
+            future, func = call
+            try:
+                if collection is None:
+                    collection = kvlite.open(self._uri, **self._kwargs)
+                result = func(collection)
+                # generators are consumed in the thread of connection
+                if isinstance(result, types.GeneratorType):
+                    result = list(result)
+            except Exception, err:
+                future.set_exception(err)
+            else:
+                future.set_result(result)
+        if collection is not None:
+            collection.close()
+
+    def _call(self, func, write=False):
+        ''' return the future of func(collection)
+        '''
+        if self._closed:
+            raise RuntimeError('The collection is closed')
+        future = Future()
+        (self._writes if write else self._reads).put((future, func))
+        return future
+
+    def get(self, *args, **kwargs):
+        ''' returns the future of documents selected by criteria, see BaseCollection.get(),
+        iterators are returned as lists
+        '''
+        return self._call(lambda c: c.get(*args, **kwargs))
+
+    def exists(self, key):
+        ''' returns the future of exists(key)
+        '''
+        return self._call(lambda c: c.exists(key))
+
+    def existing(self, keys):
+        ''' returns the future of the list of existing keys
+        '''
+        return self._call(lambda c: c.existing(keys))
+
+    def count(self):
+        ''' returns the future of the amount of documents
+        '''
+        return self._call(lambda c: c.count)
+
+    def scan(self, limit=ITEMS_PER_REQUEST):
+        ''' returns AsyncIterator over pages of `limit` documents in key order
+        '''
+        return AsyncIterator(self, limit)
+
+    def put(self, *kv):
+        ''' returns the future of put(), see BaseCollection.put()
+        '''
+        return self._call(lambda c: c.put(*kv), write=True)
+
+    def delete(self, k):
+        ''' returns the future of delete(k)
+        '''
+        return self._call(lambda c: c.delete(k), write=True)
+
+    def commit(self):
+        ''' returns the future of commit of changes made by put() and delete()
+        '''
+        return self._call(lambda c: c.commit(), write=True)
+
+    def close(self):
+        ''' wait for pending calls and stop threads, not committed changes are
+        discarded
+        '''
+        if self._closed:
+            return
+        self._closed = True
+        queues = [self._writes] + [self._reads] * (len(self._threads) - 1)
+        for queue in queues:
+            queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+def open(uri, readers=4, queue_size=1000, **kwargs):
+    ''' open collection for asynchronous access, see AsyncCollection
+
+    kwargs - parameters of kvlite.open(): serializer_name, key_codec
+    '''
+    return AsyncCollection(uri, readers=readers, queue_size=queue_size, **kwargs)
@@ -0,0 +1,18 @@
+#   kvlite benchmarks
+#
+#   python -m kvlite.bench --output results.json --baseline baseline.json
+#
+from kvlite.bench.suite import run
+from kvlite.bench.suite import measure
+from kvlite.bench.suite import BACKENDS
+from kvlite.bench.suite import DOC_SIZES
+from kvlite.bench.suite import BENCHMARKS
+from kvlite.bench.suite import BATCH_SIZES
+from kvlite.bench.baseline import load
+from kvlite.bench.baseline import save
+from kvlite.bench.baseline import compare
+
+__all__ = [
+    'run', 'measure', 'load', 'save', 'compare',
+    'BACKENDS', 'DOC_SIZES', 'BENCHMARKS', 'BATCH_SIZES',
+]
@@ -0,0 +1,101 @@
+import os
+import sys
+import argparse
+
+from kvlite.bench import run
+from kvlite.bench import load
+from kvlite.bench import save
+from kvlite.bench import compare
+from kvlite.bench import BACKENDS
+
+def names(value):
+    ''' returns the list of comma-separated names
+    '''
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+def numbers(value):
+    ''' returns the list of comma-separated integers
+    '''
+    return [int(number) for number in names(value)]
+
+def print_result(result):
+    ''' print the result of benchmark
+    '''
+    line = '%-12s %-14s %-14s %-7s %5s' % (
+        result['benchmark'], result['backend'] or '-', result['serializer'] or '-',
+        result['doc_size'], result['batch_size'] or '-')
+    if result.get('error'):
+        print '%s FAILED %s' % (line, result['error'])
+    else:
+        print '%s %12.1f %s/sec' % (line, result['rate'] or 0, result['unit'])
+    sys.stdout.flush()
+
+def print_differences(differences):
+    ''' print the differences with baseline
+    '''
+    for diff in differences:
+        if diff['status'] in ('same', 'new', 'failed'):
+            continue
+        print '%-7s x%-6.2f %-12s %-14s %-14s %-7s %5s' % (
+            diff['status'], diff['ratio'], diff['benchmark'], diff['backend'] or '-',
+            diff['serializer'] or '-', diff['doc_size'], diff['batch_size'] or '-')
+    statuses = [diff['status'] for diff in differences]
+    print 'slower: %d, faster: %d, same: %d, new: %d, failed: %d' % tuple(
+        statuses.count(status) for status in ('slower', 'faster', 'same', 'new', 'failed'))
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog='python -m kvlite.bench',
+                                     description='kvlite benchmarks')
+    parser.add_argument('--backends', type=names, help='comma-separated backends: %s' % ', '.join(sorted(BACKENDS)))
+    parser.add_argument('--serializers', type=names, help='comma-separated serializers, all by default')
+    parser.add_argument('--doc-sizes', type=names, help='comma-separated document sizes: small, medium, large')
+    parser.add_argument('--batch-sizes', type=numbers, help='comma-separated batch sizes')
+    parser.add_argument('--benchmarks', type=names, help='comma-separated benchmarks, all by default')
+    parser.add_argument('--documents', type=int, default=1000, help='the amount of documents, default: 1000')
+    parser.add_argument('--repeat', type=int, default=3, help='measurements per benchmark, default: 3')
+    parser.add_argument('--seed', type=int, default=0, help='seed of generated documents, default: 0')
+    parser.add_argument('--mysql-uri', help='URI template of MySQL collections, {name} is collection name')
+    parser.add_argument('--output', help='store results in JSON file')
+    parser.add_argument('--baseline', help='compare results with baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store results as baseline instead of comparison')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed change of time per operation, default: 0.2 (20%%)')
+    args = parser.parse_args()
+
+    uris = dict()
+    if args.mysql_uri:
+        uris['mysql'] = args.mysql_uri
+    try:
+        report = run(backends=args.backends, serializers=args.serializers, doc_sizes=args.doc_sizes,
+                     batch_sizes=args.batch_sizes, benchmarks=args.benchmarks, documents=args.documents,
+                     repeat=args.repeat, seed=args.seed, uris=uris, callback=print_result)
+    except RuntimeError, err:
+        print 'Error: %s' % err
+        sys.exit(2)
+
+    for skipped in report['skipped']:
+        print 'skipped %(backend)s/%(serializer)s/%(doc_size)s: %(reason)s' % skipped
+    if args.output:
+        save(report, args.output)
+        print 'results are stored in %s' % args.output
+
+    failed = [result for result in report['results'] if result.get('error')]
+    if failed:
+        print 'failed benchmarks: %d' % len(failed)
+
+    if args.baseline and args.save_baseline:
+        save(report, args.baseline)
+        print 'results are stored as baseline in %s' % args.baseline
+    elif args.baseline:
+        if not os.path.exists(args.baseline):
+            print 'Error: baseline %s does not exist, results are not compared. ' \
+                  'Store baseline by --save-baseline' % args.baseline
+            sys.exit(2)
+        differences = compare(load(args.baseline), report, args.threshold)
+        print_differences(differences)
+        if [diff for diff in differences if diff['status'] == 'slower']:
+            sys.exit(1)
+    if failed:
+        sys.exit(1)
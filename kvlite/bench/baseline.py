@@ -0,0 +1,68 @@
+import os
+import json
+
+from kvlite.bench.suite import result_id
+
+def load(path):
+    ''' returns the report stored in JSON file
+    '''
+    with open(path) as source:
+        return json.load(source)
+
+def save(report, path):
+    ''' store the report in JSON file, the directory is created if needed
+    '''
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(path, 'w') as target:
+        json.dump(report, target, indent=2, sort_keys=True)
+
+def compare(baseline, report, threshold=0.2):
+    ''' compare the results of report with baseline, returns the list of
+    differences sorted by ratio, slowest first
+
+    the time per operation (median) is compared, so the runs with different
+    amount of documents can be compared too. The status of difference is
+
+    - slower    - the time is increased more than `threshold`, 0.2 = 20%
+    - faster    - the time is decreased more than `threshold`
+    - same      - the change is within `threshold`
+    - new       - the result is not found in baseline or failed in baseline
+    - failed    - the benchmark is failed, see `error` of result
+    '''
+    previous = dict()
+    for result in baseline['results']:
+        if not result.get('error'):
+            previous[tuple(result_id(result))] = result
+
+    differences = list()
+    for result in report['results']:
+        rid = tuple(result_id(result))
+        diff = {
+            'benchmark': result['benchmark'],
+            'backend': result['backend'],
+            'serializer': result['serializer'],
+            'doc_size': result['doc_size'],
+            'batch_size': result['batch_size'],
+            'ratio': None,
+            'status': 'new',
+        }
+        if result.get('error'):
+            diff['status'] = 'failed'
+        elif rid in previous:
+            before = previous[rid]['median'] / previous[rid]['operations']
+            after = result['median'] / result['operations']
+            if before > 0:
+                diff['ratio'] = after / before
+                if diff['ratio'] > 1 + threshold:
+                    diff['status'] = 'slower'
+                elif diff['ratio'] < 1 - threshold:
+                    diff['status'] = 'faster'
+                else:
+                    diff['status'] = 'same'
+            else:
+                diff['status'] = 'same'
+        differences.append(diff)
+    differences.sort(key=lambda d: d['ratio'] or 0, reverse=True)
+    return differences
@@ -0,0 +1,219 @@
+import time
+
+# -----------------------------------------------------------------
+# BufferedCollection class
+# -----------------------------------------------------------------
+class BufferedCollection(object):
+    ''' BufferedCollection
+
+    write-behind wrapper for collection. put() and delete() are collected in
+    memory and written by flush() as one transaction (group commit). The buffer
+    is flushed automatically when the amount of buffered documents, their size
+    or the time since the first buffered change exceeds the limit. Limits are
+    checked by put()/delete(), there's no background flushing because database
+    connections cannot be shared between threads.
+
+    get() by key returns buffered changes (read-your-writes), other methods and
+    attributes of collection flush the buffer before the call.
+
+    with collection.buffered(rows=1000) as docs:
+        for k, v in source:
+            docs.put(k, v)
+
+    the buffer is flushed on exit from context, changes are discarded if the
+    block is failed
+    '''
+    def __init__(self, collection, rows=1000, size=None, interval=None):
+        ''' __init__
+
+        collection  - collection object
+        rows        - max amount of buffered documents
+        size        - max size of buffered serialized documents in bytes
+        interval    - max time in seconds between the first buffered change and flush
+        '''
+        if int(rows) <= 0:
+            raise RuntimeError('The amount of buffered rows should be positive, %s' % rows)
+        self.collection = collection
+        self._max_rows = int(rows)
+        self._max_size = int(size) if size is not None else None
+        self._interval = float(interval) if interval is not None else None
+
+        # {prepared key: (document, prepared key/value) or None for deleted document}
+        self._changes = dict()
+        self._size = 0
+        self._since = None
+        self.flushes = 0
+
+    def __enter__(self):
+        ''' enter context
+        '''
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        ''' flush the buffer or discard changes if the block is failed
+        '''
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
+
+    def __len__(self):
+        ''' return amount of buffered changes
+        '''
+        return len(self._changes)
+
+    @property
+    def size(self):
+        ''' return size of buffered serialized documents in bytes
+        '''
+        return self._size
+
+    def put(self, *kv):
+        ''' put document(s) in buffer
+
+        put(k,v) or put([(k1,v1), (k2,v2)])
+        '''
+        if len(kv) == 1 and isinstance(kv[0], (list, tuple)):
+            kv = kv[0]
+        elif len(kv) == 2 and not isinstance(kv[0], (list, tuple)) and not isinstance(kv[1], (list, tuple)):
+            kv = [kv,]
+        else:
+            raise RuntimeError('Incorrect format of key/values, %s' % (kv,))
+
+        for k, v in kv:
+            kv_insert = self.collection.prepare_kv(k, v, backend=self.collection.BACKEND)
+            self._change(self.collection.prepare_key(k), (v, kv_insert))
+        self._check_limits()
+
+    def delete(self, k):
+        ''' delete document by k
+        '''
+        _key = self.collection.prepare_key(k)
+        if _key == self.collection._ZEROS_KEY:
+            raise RuntimeError('Metadata cannot be deleted')
+        self._change(_key, None)
+        self._check_limits()
+
+    def get(self, criteria=None, *args, **kwargs):
+        ''' returns documents selected from collection by criteria,
+        for details see BaseCollection.get()
+
+        documents selected by key include buffered changes, for other criteria
+        the buffer is flushed before select
+        '''
+        if isinstance(criteria, dict) and '_key' in criteria:
+            if isinstance(criteria['_key'], (str, unicode, int, long)):
+                _key = self.collection.prepare_key(criteria['_key'])
+                if _key in self._changes:
+                    if self._changes[_key] is None:
+                        return (None, None)
+                    return (self.collection.key_codec.decode(_key), self._changes[_key][0])
+            elif isinstance(criteria['_key'], (list, tuple)):
+                return self._get_many(map(self.collection.prepare_key, criteria['_key']), 
+                                        ordered=kwargs.get('ordered', False), lazy=kwargs.get('lazy', False))
+            elif isinstance(criteria['_key'], dict):
+                # key range, buffered changes are written before select
+                self.flush()
+            return self.collection.get(criteria, *args, **kwargs)
+        self.flush()
+        return self.collection.get(criteria, *args, **kwargs)
+
+    def _get_many(self, _keys, ordered=False, lazy=False):
+        ''' return documents by prepared keys with buffered changes
+
+        ordered - return documents in the order of keys, (key, None) for 
+            missed document
+        lazy    - return stored documents as LazyValue proxies
+        '''
+        decode = self.collection.key_codec.decode
+        if ordered:
+            stored = dict(self.collection._get_many(*[k for k in _keys if k not in self._changes], lazy=lazy))
+            for k in _keys:
+                change = self._changes.get(k)
+                if change is not None:
+                    yield (decode(k), change[0])
+                else:
+                    yield (decode(k), stored.get(k))
+            return
+        stored = list()
+        for k in _keys:
+            if k not in self._changes:
+                stored.append(k)
+            elif self._changes[k] is not None:
+                yield (self.collection.key_codec.decode(k), self._changes[k][0])
+        if stored:
+            for k, v in self.collection._decode_docs(self.collection._get_many(*stored, lazy=lazy)):
+                yield (k, v)
+
+    def flush(self):
+        ''' write buffered changes and commit them as one transaction
+        '''
+        if not self._changes:
+            return
+        deleted = [k for k, change in self._changes.items() if change is None]
+        kv_docs, kv_insert = list(), list()
+        for k, change in self._changes.items():
+            if change is not None:
+                kv_docs.append((k, change[0]))
+                kv_insert.append(change[1])
+        try:
+            for _key in deleted:
+                self.collection._delete(_key)
+            if kv_docs:
+                self.collection._write(kv_docs, kv_insert)
+            self.collection.commit()
+        except:
+            self.collection._rollback()
+            raise
+        self.flushes += 1
+        self.discard()
+
+    def discard(self):
+        ''' discard buffered changes
+        '''
+        self._changes = dict()
+        self._size = 0
+        self._since = None
+
+    def commit(self):
+        ''' flush buffered changes
+        '''
+        self.flush()
+
+    def close(self):
+        ''' flush buffered changes and close collection
+        '''
+        self.flush()
+        self.collection.close()
+
+    def __iter__(self):
+        ''' flush buffered changes and iterate over collection
+        '''
+        self.flush()
+        return iter(self.collection)
+
+    def __getattr__(self, name):
+        ''' flush buffered changes and return collection attribute
+        '''
+        self.flush()
+        return getattr(self.collection, name)
+
+    def _change(self, _key, change):
+        ''' store change of document by prepared key
+        '''
+        previous = self._changes.get(_key)
+        if previous is not None:
+            self._size -= len(previous[1][1])
+        if change is not None:
+            self._size += len(change[1][1])
+        self._changes[_key] = change
+        if self._since is None:
+            self._since = time.time()
+
+    def _check_limits(self):
+        ''' flush the buffer if one of limits is exceeded
+        '''
+        if len(self._changes) >= self._max_rows or \
+                (self._max_size is not None and self._size >= self._max_size) or \
+                (self._interval is not None and time.time() - self._since >= self._interval):
+            self.flush()
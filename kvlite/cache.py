@@ -0,0 +1,99 @@
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+# -----------------------------------------------------------------
+# LRUCache class
+# -----------------------------------------------------------------
+class LRUCache(object):
+    ''' LRUCache
+
+    in-process cache of serialized documents with least recently used
+    eviction, bounded by amount of documents and by size of serialized documents.
+    Collections deserialize cached documents on every hit, so returned documents
+    can be modified by caller
+    '''
+    def __init__(self, items=10000, size=None):
+        ''' __init__
+
+        items   - max amount of cached documents
+        size    - max size of cached documents in bytes, not limited if None
+        '''
+        if int(items) <= 0:
+            raise RuntimeError('The amount of cached items should be positive, %s' % items)
+        self._max_items = int(items)
+        self._max_size = int(size) if size is not None else None
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        ''' return amount of cached documents
+        '''
+        return len(self._entries)
+
+    def __contains__(self, k):
+        ''' check if key is cached, hit/miss counters are not changed
+        '''
+        return k in self._entries
+
+    @property
+    def size(self):
+        ''' return size of cached documents in bytes
+        '''
+        return self._size
+
+    @property
+    def stats(self):
+        ''' return cache statistics
+        '''
+        return {
+            'items': len(self._entries),
+            'size': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def get(self, k, default=None):
+        ''' return cached document by key or default value
+        '''
+        try:
+            v, size = self._entries.pop(k)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries[k] = (v, size)
+        self.hits += 1
+        return v
+
+    def put(self, k, v, size=0):
+        ''' put document in cache, the least recently used documents are evicted
+        when the cache is full
+
+        size - size of serialized document, documents larger than the cache size
+            are not cached
+        '''
+        self.delete(k)
+        if self._max_size is not None and size > self._max_size:
+            return
+        self._entries[k] = (v, size)
+        self._size += size
+        while len(self._entries) > self._max_items or \
+                (self._max_size is not None and self._size > self._max_size):
+            _, (_, _size) = self._entries.popitem(last=False)
+            self._size -= _size
+
+    def delete(self, k):
+        ''' remove document from cache
+        '''
+        entry = self._entries.pop(k, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def clear(self):
+        ''' remove all documents from cache, counters are not changed
+        '''
+        self._entries.clear()
+        self._size = 0
@@ -29,6 +29,7 @@ ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE."""
 
 import os
+import sys
 import cmd
 import json
 import kvlite
@@ -48,6 +49,8 @@ class Console(cmd.Cmd):
         self.__kvlite_colls = dict()
         self.__current_coll_name = None
         self.__current_coll = None
+        self.__items_limit = kvlite.settings.ITEMS_PER_REQUEST
+        self.__items_token = None
 
     def emptyline(self):
         return False
@@ -72,9 +75,10 @@ class Console(cmd.Cmd):
                 '', 'do_help', 'do_version', 'do_licence', 'do_history', 'do_exit', 
                 '',
                 'do_create', 'do_use', 'do_show', 'do_remove', 'do_import', 'do_export', 'do_copy', 
+                'do_migrate', 
                 '',
                 'do_hash', 'do_items', 'do_get', 'do_put', 'do_delete', 
-                'do_count', 'do_scheme', 'do_index', 
+                'do_count', 'do_scheme', 'do_index', 'do_search', 
                 ''
             ]
             for name in names:
@@ -150,12 +154,16 @@ class Console(cmd.Cmd):
         print 'Export completed to file: %s' % filename
 
     def do_copy(self, line):
-        '''   copy <source> <target>\tcopy data from source kvlite database to target kvlite database
+        '''   copy <source> <target> [batch_size]\tcopy data from source kvlite database to target kvlite database
                                 <source> - reference name to source database
                                 <target> - reference name to target database
-                                for creating reference name, use `create` command'''
+                                [batch_size] - how many documents are copied per transaction
+                                for creating reference name, use `create` command
+                                interrupted copying is continued from the last committed batch'''
+        params = [param for param in line.split(' ') if param <> '']
         try:
-            source_ref, target_ref = [param for param in line.split(' ') if param <> ''][:2]
+            source_ref, target_ref = params[:2]
+            batch_size = int(params[2]) if len(params) > 2 else kvlite.settings.ITEMS_PER_REQUEST
         except ValueError:
             print 'Error! Please specify <source> and <target>'
             return
@@ -167,11 +175,22 @@ class Console(cmd.Cmd):
             print 'Error! The target reference is not created, please use `create` command'
             return
 
+        def progress(copied, rowid):
+            sys.stdout.write('\rCopied: %d' % copied)
+            sys.stdout.flush()
+
         source = kvlite.open(self.__kvlite_colls[source_ref])
         target = kvlite.open(self.__kvlite_colls[target_ref])
-        kvlite.copy(source, target)
-        source.close()
-        target.close()        
+        try:
+            kvlite.utils.copy(source, target, batch_size=batch_size, callback=progress)
+            print
+            print 'Done'
+        except RuntimeError, err:
+            print
+            print 'Error! %s' % err
+        finally:
+            source.close()
+            target.close()        
 
     def do_show(self, line):
         '''   show collections <details>\tlist of available collections'''
@@ -198,6 +217,7 @@ class Console(cmd.Cmd):
             self.prompt = '%s>' % collection_name
             self.__current_coll_name = collection_name
             self.__current_coll = kvlite.open(self.__kvlite_colls[self.__current_coll_name])
+            self.__items_token = None
             return
         else:
             print 'Error! Unknown collection: %s' % collection_name
@@ -253,6 +273,41 @@ class Console(cmd.Cmd):
             print 'Error! %s' % err
             return
 
+    def do_migrate(self, line):
+        '''   migrate <collection_name> [batch_size]	convert SQLite collection to compact layout
+                                (20-byte binary keys, WITHOUT ROWID table), the collection 
+                                is available for reading and writing during migration'''
+        params = [param for param in line.split(' ') if param <> '']
+        try:
+            name = params[0]
+            batch_size = int(params[1]) if len(params) > 1 else kvlite.settings.ITEMS_PER_REQUEST
+        except (IndexError, ValueError):
+            print 'Error! Please specify <collection_name>'
+            return
+        if name not in self.__kvlite_colls:
+            print 'Error! Collection name does not exist in the list: %s' % name
+            return
+
+        def progress(copied):
+            sys.stdout.write('\rCopied: %d' % copied)
+            sys.stdout.flush()
+
+        try:
+            uri = self.__kvlite_colls[name]
+            manager = kvlite.managers.CollectionManager(uri)
+            params = manager.parse_uri(uri)
+            manager.migrate(params['collection'], batch_size=batch_size, callback=progress)
+            print
+            print 'Done'
+        except Exception, err:
+            print
+            print 'Error! %s' % err
+            return
+        # reopen current collection with new layout
+        if self.__current_coll and self.__current_coll_name == name:
+            self.__current_coll.close()
+            self.__current_coll = kvlite.open(uri)
+
     def do_scheme(self, line):
         '''   scheme\t\tshow structure of collection'''
         if not self.__current_coll_name in self.__kvlite_colls:
@@ -276,11 +331,28 @@ class Console(cmd.Cmd):
             print 'sha1 hash:', hashlib.sha1(line).hexdigest()
         
     def do_items(self, line):
-        '''   items\t\tlist of collection's items '''        
+        '''   items [limit|next]\tlist of collection's items, all or by pages with `limit` items, 
+                                use `items next` to show the next page'''        
         if not self.__current_coll_name in self.__kvlite_colls:
             print 'Error! Unknown collection: %s' % self.__current_coll_name
             return
-        for k,v in self.__current_coll.get():
+        line = line.strip()
+        if not line:
+            items = self.__current_coll.get()
+        else:
+            if line == 'next':
+                if self.__items_token is None:
+                    print 'No more items'
+                    return
+            else:
+                try:
+                    self.__items_limit = int(line)
+                except ValueError:
+                    print getattr(self, 'do_items').__doc__
+                    return
+                self.__items_token = ''
+            items, self.__items_token = self.__current_coll.get(after=self.__items_token, limit=self.__items_limit)
+        for k,v in items:
             print '_key:', k
             pprint.pprint(v)
             print
@@ -334,7 +406,7 @@ class Console(cmd.Cmd):
         '''   delete <key>\t\tdelete entry by key '''
         key = key.rstrip().lstrip()
         try:
-            if self.__current_coll.get({'_key': key}) <> (None, None):
+            if self.__current_coll.exists(key):
                 self.__current_coll.delete(key)
                 self.__current_coll.commit()
                 print 'Done'
@@ -347,11 +419,59 @@ class Console(cmd.Cmd):
             return
 
     def do_index(self, line):
-        '''   index <details>\tmake index for current collection'''
-        print 'Warning! This functionality is not implemented yet'
-        print line
+        '''   index <details>\tmake index for current collection
+                                index list - list of collection indexes
+                                index create <name> <fields> - create index, where <fields> is 
+                                    JSON, {"field": 1} or [["field0", 1], ["field1", -1]]
+                                index build <name> - continue interrupted index building
+                                index remove <name> - remove index'''
+        if not self.__current_coll:
+            print 'Error! The collection is not selected, please use collection'
+            return
+        params = [p for p in line.split(' ', 2) if p <> '']
+        if not params:
+            print getattr(self, 'do_index').__doc__
+            return
+        try:
+            if params[0] == 'list':
+                for name, index in self.__current_coll.indexes.items():
+                    print '%s: %s' % (name, index.fields)
+                return
+            elif params[0] == 'create' and len(params) == 3:
+                fields = json.loads(params[2], object_pairs_hook=list)
+                print 'Building ...'
+                self.__current_coll.make_index(params[1], fields)
+            elif params[0] == 'build' and len(params) == 2:
+                print 'Building ...'
+                self.__current_coll.build_index(params[1])
+            elif params[0] == 'remove' and len(params) == 2:
+                self.__current_coll.remove_index(params[1])
+            else:
+                print getattr(self, 'do_index').__doc__
+                return
+        except (ValueError, RuntimeError), err:
+            print 'Error! %s' % err
+            return
         print 'Done'
 
+    def do_search(self, line):
+        '''   search <index> <criteria>\tsearch documents by index, where <criteria> is data in JSON format'''
+        if not self.__current_coll:
+            print 'Error! The collection is not selected, please use collection'
+            return
+        try:
+            name, criteria = [p for p in line.split(' ', 1) if p <> '']
+            criteria = json.loads(criteria)
+            for k,v in self.__current_coll.search(name, criteria):
+                print '_key:', k
+                pprint.pprint(v)
+                print
+        except ValueError, err:
+            print getattr(self, 'do_search').__doc__
+            print '   Error! %s' % err
+        except RuntimeError, err:
+            print 'Error! %s' % err
+
         
         
 # ----------------------------------
@@ -1,10 +1,54 @@
+import re
+import time
+import base64
 import kvlite
+import binascii
+import itertools
+import multiprocessing
 
-from kvlite.settings import KEY_LENGTH
+from timeit import default_timer
+
+from kvlite.settings import SQLITE_OPTIONS
 from kvlite.settings import ITEMS_PER_REQUEST
 
 from kvlite.serializers import cPickleSerializer
 from kvlite.serializers import CompressedJsonSerializer
+from kvlite.serializers import ZDICT_SIZE
+
+from kvlite.keys import META_KEY
+from kvlite.keys import ZeroFillKeyCodec
+
+from kvlite.indexes import MysqlIndex
+from kvlite.indexes import SqliteIndex
+
+from kvlite.lazy import LazyValue
+from kvlite.stats import Stats
+from kvlite.stats import StatsCursor
+from kvlite.stats import instrumented
+from kvlite.buffer import BufferedCollection
+
+# marker of documents which are not found in cache
+_MISSING = object()
+
+# serializer of scan() worker process
+_worker_serializer = None
+
+def _init_scan_worker(serializer):
+    ''' initialize scan() worker process
+    '''
+    global _worker_serializer
+    _worker_serializer = serializer
+
+def _loads_batch(rows):
+    ''' deserialize the list of (prepared key, serialized document) in worker process
+    '''
+    docs = list()
+    for k, v in rows:
+        try:
+            docs.append(_worker_serializer.loads(v))
+        except Exception, err:
+            raise RuntimeError('key %s, %s' % (k, err))
+    return docs
 
 # -----------------------------------------------------------------
 # BaseCollection class
@@ -12,55 +56,88 @@ from kvlite.serializers import CompressedJsonSerializer
 class BaseCollection(object):
     ''' BaseCollection
     '''
-    def __init__(self, connection, collection_name, serializer=cPickleSerializer):
+    BACKEND = None
+    INDEX_CLASS = None
+
+    def __init__(self, connection, collection_name, serializer=cPickleSerializer, cache=None, options=None, 
+                    key_codec=ZeroFillKeyCodec):
         ''' __init__
+        
+        cache       - kvlite.cache.LRUCache object, serialized documents read by key 
+                    are cached and invalidated by put()/delete() of this collection object
+        options     - connection options from URI, see `settings`
+        key_codec   - the codec of keys, see kvlite.keys
         '''
         self._conn = connection
-        self._cursor = self._conn.cursor()
+        self._stats = Stats()
+        self._cursor = StatsCursor(self._conn.cursor(), self._stats)
         self._collection = collection_name
         self._serializer = serializer
+        self.cache = cache
+        self.options = options or dict()
+        self.key_codec = key_codec
 
         self._uuid_cache = list()
-        self._ZEROS_KEY = self.prepare_key(0)
+        # documents are written in current transaction, they are not cached
+        # till commit
+        self._uncommitted = False
+        self._indexes = None
+        # index definitions are read from metadata in current transaction
+        self._indexes_loaded = False
+        self._ZEROS_KEY = META_KEY
 
-    @staticmethod
-    def prepare_key(key):
-        ''' prepare key
+    def prepare_key(self, key):
+        ''' prepare key by key codec, for default codec:
         
         - convert key to string if it's integer
         - zero fill key
         '''
-        _key = key
-        if isinstance(_key, int):
-            _key = str(key)
-        if len(_key) > KEY_LENGTH:
-            raise RuntimeError('The length of key is more than %d bytes' % (KEY_LENGTH))
-        return _key.zfill(KEY_LENGTH)
+        return self.key_codec.encode(key)
+
+    def _decode_docs(self, docs):
+        ''' return documents with keys decoded by key codec
+        '''
+        if self.key_codec is ZeroFillKeyCodec:
+            return docs
+        return ((self.key_codec.decode(k), v) for k, v in docs)
     
     def prepare_kv(self, k, v, backend='sqlite'):
         ''' prepare key/value pair before insert to database
         
         backend can be 'mysql' or 'sqlite'
         '''
-        
-        k = self.prepare_key(k)
+        return self._prepare_kv(self.prepare_key(k), v, backend)
+
+    def _prepare_kv(self, k, v, backend='sqlite'):
+        ''' prepare key/value pair by prepared key
+        '''
+        started = default_timer()
         if k == self._ZEROS_KEY:
             v = cPickleSerializer.dumps(v)
         else:
             v = self._serializer.dumps(v)
+        operation = self._stats.current
+        operation.encode.add(default_timer() - started)
+        operation.bytes_written += len(v)
         
         if backend == 'sqlite':
             return (k,v) 
         elif backend == 'mysql':
-            return (binascii.a2b_hex(k), v, v)
+            return (binascii.a2b_hex(k), v)
         else:
             raise RuntimeError('Uknown backend: %s' % backend)
                 
     @property
     def meta(self):
         ''' return meta information from zero's key
+        
+        if the collection is opened with URI options, active connection 
+        settings are shown as 'settings', they are not stored
         '''
-        return self.get({'_key': self._ZEROS_KEY})[1]
+        meta = self._get_one(self._ZEROS_KEY)[1]
+        if self.options and isinstance(meta, dict):
+            meta['settings'] = self.settings
+        return meta
 
     @meta.setter
     def meta(self, info):
@@ -68,50 +145,638 @@ class BaseCollection(object):
         '''
         if not isinstance(info, dict):
             raise RuntimeError('Metadata should be dictionary')
-        self.put(self._ZEROS_KEY, info)
+        if 'settings' in info:
+            info = dict(info)
+            del info['settings']
+        self._write([(self._ZEROS_KEY, info),], [self._prepare_kv(self._ZEROS_KEY, info, self.BACKEND),])
 
     @property
+    def settings(self):
+        ''' return connection settings defined by URI options
+        '''
+        return dict(self.options)
+
+    @property
+    def location(self):
+        ''' return the location of collection: backend, database and collection 
+        name, e.g. sqlite:///path/to/db.sqlite:docs. The credentials are not included
+        '''
+        return '%s:%s' % (self._database(), self._collection)
+
+    @property
+    @instrumented('count')
     def count(self):
         ''' return amount of documents in collection
+        
+        the counter is maintained by database triggers on put()/delete(), 
+        for collections without counter all documents are counted
         '''
-        SQL = 'SELECT count(*) FROM %s' % self._collection
-        self._cursor.execute(SQL + ' WHERE k <> ?;', (self._ZEROS_KEY,))
-        return int(self._cursor.fetchone()[0])
+        try:
+            self._cursor.execute('SELECT n FROM %s_count;' % self._collection)
+            return int(self._cursor.fetchone()[0])
+        except Exception:
+            return self._count_all()
 
-    def get(self, criteria=None, offset=None, limit=ITEMS_PER_REQUEST):
+    @property
+    def estimated_count(self):
+        ''' return estimated amount of documents from database statistics,
+        the exact count is returned if statistics is not available
+        '''
+        try:
+            estimated = self._estimated_count()
+        except Exception:
+            estimated = None
+        if estimated is None:
+            return self.count
+        return estimated
+
+    def train_dictionary(self, samples=1000, size=ZDICT_SIZE):
+        ''' train compression dictionary of serializer on the first `samples` 
+        documents and store it in metadata with new version, returns the version
+
+        new documents are compressed with new dictionary, stored documents are not 
+        changed. The serializer should support dictionaries, see ZdictJsonSerializer. 
+        Other opened collection objects reload dictionaries from metadata when they 
+        read a document compressed with unknown dictionary
+        '''
+        if not hasattr(self._serializer, 'train'):
+            raise RuntimeError('The serializer of collection does not support compression dictionaries')
+        docs = [v for k, v in itertools.islice(self._get_all(), int(samples))]
+        serializer = self._serializer.train(docs, size)
+        meta = self.meta
+        self._serializer = serializer
+        self.meta = serializer.to_meta(meta)
+        return serializer.version
+
+    def get(self, criteria=None, offset=None, limit=ITEMS_PER_REQUEST, after=None, reverse=False, ordered=False, 
+                lazy=False):
         ''' returns documents selected from collection by criteria.
         
         - If the criteria is not defined, get() returns all documents.
         - Hint: the combination `offset` and `limit` paramters can be 
         used for pagination
+        - Hint: for large collections use `after` and `limit` for pagination, 
+        the cost of the page does not depend on its position
+        - Key range {'_key': {'$gte': k1, '$lt': k2}} or {'_key': {'$prefix': p}}
+        returns all documents in the range in key order, documents are selected 
+        by batches of `limit` rows
         
         offset  - starts with this position in database
         limit   - how many document will be returned
+        after   - continuation token, '' for the first page. If defined, get() 
+                returns the tuple (documents, next token), next token is None 
+                for the last page
+        reverse - return documents of key range in descending key order
+        ordered - return documents selected by the list of keys in the order 
+                of keys, (key, None) is returned for missed document
+        lazy    - return documents as LazyValue proxies deserialized on first 
+                access, the document selected by one key is not lazy
         '''
         if criteria is None:
-            if offset >=0 and limit > 0:
-                return self._get_paged(offset=offset, limit=limit)
+            if after is not None:
+                docs, token = self._get_after(after, limit=limit, lazy=lazy)
+                return (list(self._decode_docs(docs)), token)
+            elif offset >=0 and limit > 0:
+                return self._decode_docs(self._get_paged(offset=offset, limit=limit, lazy=lazy))
             else:
-                return self._get_all()
+                return self._decode_docs(self._get_all(lazy=lazy))
             
         if not isinstance(criteria, dict):
             raise RuntimeError('Incorrect criteria format')
         
         if '_key' in criteria:
-            if isinstance(criteria['_key'], (str, unicode)):
-                return self._get_one(self.prepare_key(criteria['_key']))
+            if isinstance(criteria['_key'], (str, unicode, int, long)):
+                k, v = self._get_one(self.prepare_key(criteria['_key']))
+                if k is None:
+                    return (None, None)
+                return (self.key_codec.decode(k), v)
             elif isinstance(criteria['_key'], (list, tuple)):
-                criteria['_key'] = map(self.prepare_key, criteria['_key'])
-                return self._get_many(*criteria['_key'])
+                _keys = map(self.prepare_key, criteria['_key'])
+                if ordered:
+                    return self._decode_docs(self._get_ordered(_keys, lazy=lazy))
+                return self._decode_docs(self._get_many(*_keys, lazy=lazy))
+            elif isinstance(criteria['_key'], dict):
+                lower, upper = self._key_range(criteria['_key'])
+                return self._decode_docs(self._get_range(lower, upper, reverse=reverse, limit=limit, lazy=lazy))
+
+    @instrumented('keys')
+    def keys(self, conditions=None, reverse=False, limit=ITEMS_PER_REQUEST):
+        ''' iterate over keys in key order, documents are not selected
+
+        conditions  - key range conditions, e.g. {'$prefix': p}, see get()
+        reverse     - iterate in descending key order
+        limit       - how many keys are selected per request
+        '''
+        lower, upper = self._key_range(conditions or dict())
+        for k, _ in self._get_range(lower, upper, reverse=reverse, limit=limit, values=False):
+            yield self.key_codec.decode(k)
+
+    @instrumented('exists')
+    def exists(self, key):
+        ''' return True if the document with key exists, the document is not selected
+        '''
+        _key = self.prepare_key(key)
+        if _key == self._ZEROS_KEY:
+            return False
+        if self.cache is not None and _key in self.cache:
+            return True
+        return bool(self._get_raw_keys([_key,]))
+
+    @instrumented('existing')
+    def existing(self, keys):
+        ''' iterate over existing keys from the list of keys in the order of the list, 
+        keys are returned as passed. Keys are checked by chunks of ITEMS_PER_REQUEST 
+        keys, documents are not selected
+        '''
+        keys = iter(keys)
+        while True:
+            chunk = list(itertools.islice(keys, ITEMS_PER_REQUEST))
+            if not chunk:
+                break
+            _keys = map(self.prepare_key, chunk)
+            found = set(self._get_raw_keys([k for k in set(_keys) if k <> self._ZEROS_KEY]))
+            for key, _key in zip(chunk, _keys):
+                if _key in found:
+                    yield key
+
+    @property
+    def indexes(self):
+        ''' return dictionary of collection indexes, {name: index object}
+        
+        index definitions are stored in metadata, they are read again by the first 
+        write of every transaction, so the indexes made or removed by other 
+        collection objects are maintained by put()/delete()
+        '''
+        if self._indexes is None:
+            self._load_indexes()
+        return self._indexes
+
+    def _load_indexes(self):
+        ''' read index definitions from metadata, the objects of known indexes are kept
+        '''
+        indexes = dict()
+        meta = self.meta or dict()
+        for name, index in meta.get('indexes', dict()).items():
+            current = (self._indexes or dict()).get(name)
+            if current is not None and current.name == index['table']:
+                current.state = index.get('state', 'ready')
+                indexes[name] = current
+            else:
+                indexes[name] = self.INDEX_CLASS(self._conn, index['table'], index['fields'], 
+                                                    index.get('state', 'ready'))
+        self._indexes = indexes
+        self._indexes_loaded = True
+
+    def make_index(self, name, parameters, build=True):
+        ''' make index for collection
+        
+        name        - the name of index, letters, digits and underscore are allowed
+        parameters  - indexed fields, { "field": 1 } or [("field0", 1), ("field1", -1)]
+        build       - build index from existing documents, if False the index is only 
+                    registered and can be built later by build_index() or in background 
+                    by kvlite.indexes.IndexBuilder
+        
+        the index is updated on every put()/delete() since registration, also during building
+        '''
+        if not re.match(r'^\w+$', str(name)):
+            raise RuntimeError('Incorrect index name: %s' % name)
+        if name in self.indexes:
+            raise RuntimeError('Index already exists: %s' % name)
+
+        index = self.INDEX_CLASS(self._conn, '%s_idx_%s' % (self._collection, name), parameters, 'building')
+        index.create()
+        meta = self.meta
+        meta.setdefault('indexes', dict())[name] = {
+            'table': index.name, 'fields': index.fields, 'state': index.state, 'rowid': 0,
+        }
+        self.meta = meta
+        self._indexes[name] = index
+        self.commit()
+        if build:
+            self.build_index(name)
+
+    def build_index(self, name, batch_size=ITEMS_PER_REQUEST, rows_per_sec=None, bytes_per_sec=None, stop_event=None):
+        ''' build index from existing documents
+        
+        documents are processed by batches in rowid order, every batch is committed 
+        together with the progress watermark in metadata, so interrupted building 
+        continues from the last watermark. Only documents existing at the start of 
+        building are processed, later changes are indexed by put()/delete().
+        
+        batch_size      - how many documents are processed per transaction
+        rows_per_sec    - limit of processed documents per second
+        bytes_per_sec   - limit of read bytes per second
+        stop_event      - threading.Event, building is stopped when the event is set
+        
+        returns True when index is built, False when building was stopped
+        '''
+        if name not in self.indexes:
+            raise RuntimeError('Unknown index: %s' % name)
+        index = self.indexes[name]
+        rowid = self.meta['indexes'][name].get('rowid', 0)
+        max_rowid = self._max_rowid()
+        self.commit()
+
+        started = time.time()
+        total_rows, total_bytes = 0, 0
+        while index.state <> 'ready':
+            if stop_event and stop_event.is_set():
+                return False
+            rows = [r for r in self._get_rows(rowid, limit=batch_size, lock=True) if r[0] <= max_rowid]
+            if rows:
+                index.put([(k, self._loads(k, v)) for _, k, v in rows if k <> self._ZEROS_KEY])
+                rowid = rows[-1][0]
+            else:
+                index.state = 'ready'
+            meta = self.meta
+            meta['indexes'][name].update({'rowid': rowid, 'state': index.state})
+            self.meta = meta
+            self.commit()
+
+            total_rows += len(rows)
+            total_bytes += sum([len(v) for _, _, v in rows])
+            delay = max(
+                total_rows / float(rows_per_sec) if rows_per_sec else 0, 
+                total_bytes / float(bytes_per_sec) if bytes_per_sec else 0,
+            ) - (time.time() - started)
+            if delay > 0:
+                time.sleep(delay)
+        return True
+
+    def remove_index(self, name):
+        ''' remove index by name
+        '''
+        if name not in self.indexes:
+            raise RuntimeError('Unknown index: %s' % name)
+        self._indexes.pop(name).remove()
+        meta = self.meta
+        del meta['indexes'][name]
+        self.meta = meta
+        self.commit()
+
+    @instrumented('search')
+    def search(self, name, criteria, limit=None):
+        ''' returns documents selected by criteria via index
+        
+        name        - the name of index
+        criteria    - search criteria, for details see docs/index-and-search.md
+        limit       - how many document will be returned, all if not defined
+        '''
+        if name not in self.indexes:
+            # the index can be made by other collection object
+            self._load_indexes()
+        if name not in self.indexes:
+            raise RuntimeError('Unknown index: %s' % name)
+        if self.indexes[name].state <> 'ready':
+            self.indexes[name].state = self.meta['indexes'][name].get('state', 'ready')
+            if self.indexes[name].state <> 'ready':
+                raise RuntimeError('Index %s is not ready, building is in progress' % name)
+        keys = self.indexes[name].search(criteria, limit)
+        for k, v in self._get_ordered(keys, missed=False):
+            yield (self.key_codec.decode(k), v)
+
+    def _update_indexes(self, kv):
+        ''' update indexes by the list of (prepared key, document)
+        '''
+        if not self._indexes_loaded:
+            self._load_indexes()
+        if not self._indexes:
+            return
+        kv = [(k, v) for k, v in kv if k <> self._ZEROS_KEY]
+        for index in self.indexes.values():
+            index.put(kv)
+
+    def _delete_from_indexes(self, keys):
+        ''' delete prepared keys from indexes
+        '''
+        if not self._indexes_loaded:
+            self._load_indexes()
+        for index in self._indexes.values():
+            index.delete(keys)
+
+    def _loads(self, k, v):
+        ''' deserialize value by prepared key
+        '''
+        started = default_timer()
+        try:
+            if k == self._ZEROS_KEY:
+                return cPickleSerializer.loads(v)
+            try:
+                return self._serializer.loads(v)
+            except Exception:
+                if not hasattr(self._serializer, 'from_meta'):
+                    raise
+            # the serializer configuration could be changed by other collection 
+            # object, e.g. new compression dictionary, reload it from metadata
+            self._serializer = self._serializer.from_meta(self.meta)
+            return self._serializer.loads(v)
+        except Exception, err:
+            raise RuntimeError('key %s, %s' % (k, err))
+        finally:
+            self._stats.current.decode.add(default_timer() - started)
+
+    def _decode(self, k, v, lazy=False):
+        ''' return document or LazyValue proxy by prepared key and serialized document
+        '''
+        if lazy:
+            return LazyValue(self._loads, k, v)
+        return self._loads(k, v)
+
+    def _loads_cached(self, k, v):
+        ''' deserialize value by prepared key and put serialized document in cache,
+        documents read in transaction with not committed writes are not cached
+        '''
+        doc = self._loads(k, v)
+        if self.cache is not None and k <> self._ZEROS_KEY and not self._uncommitted:
+            self.cache.put(k, v, len(v))
+        return doc
+
+    def _cached(self, k):
+        ''' return document from cache by prepared key, _MISSING if it's not cached.
+        The document is deserialized on every call, so changes of returned 
+        documents do not change the cache
+        '''
+        v = self.cache.get(k, _MISSING)
+        if v is _MISSING:
+            return v
+        return self._loads(k, v)
+
+    def _invalidate(self, keys):
+        ''' remove documents from cache by prepared keys, called by writes
+        '''
+        self._uncommitted = True
+        if self.cache is not None:
+            for k in keys:
+                self.cache.delete(k)
+
+    @instrumented('get_one')
+    def _get_one(self, _key):
+        ''' return document by prepared key
+        '''        
+        if self.cache is not None and _key <> self._ZEROS_KEY:
+            v = self._cached(_key)
+            if v is not _MISSING:
+                return (_key, v)
+        try:
+            rows = self._get_raw([_key,])
+        except Exception, err:
+            raise RuntimeError(err)
+        if rows:
+            k, v = rows[0]
+            return (k, self._loads_cached(k, v))
+        else:
+            return (None, None)
+
+    @instrumented('get_many')
+    def _get_many(self, *_keys, **kwargs):
+        ''' return docs by keys in arbitrary order, only documents missed 
+        in cache are selected from database by chunks of ITEMS_PER_REQUEST keys
+
+        lazy - return LazyValue proxies for documents selected from database, 
+            they are not cached
+        '''
+        lazy = kwargs.get('lazy', False)
+        _missed = list()
+        for k in _keys:
+            if k == self._ZEROS_KEY:
+                continue
+            v = self._cached(k) if self.cache is not None else _MISSING
+            if v is _MISSING:
+                _missed.append(k)
+            else:
+                yield (k, v)
+        for i in range(0, len(_missed), ITEMS_PER_REQUEST):
+            for k, v in self._get_raw(_missed[i:i + ITEMS_PER_REQUEST]):
+                if lazy:
+                    yield (k, LazyValue(self._loads, k, v))
+                else:
+                    yield (k, self._loads_cached(k, v))
+
+    def _get_ordered(self, _keys, missed=True, lazy=False):
+        ''' return docs by keys in the order of keys, keys are selected by chunks 
+        of ITEMS_PER_REQUEST keys when the previous chunk is consumed
+
+        missed - return (key, None) for missed documents, skip them if False
+        lazy   - see _get_many()
+        '''
+        _keys = iter(_keys)
+        while True:
+            chunk = list(itertools.islice(_keys, ITEMS_PER_REQUEST))
+            if not chunk:
+                break
+            documents = dict(self._get_many(*chunk, lazy=lazy))
+            for k in chunk:
+                if k in documents:
+                    yield (k, documents[k])
+                elif missed:
+                    yield (k, None)
+
+    @instrumented('get_after')
+    def _get_after(self, after, limit=ITEMS_PER_REQUEST, lazy=False):
+        ''' return the list of docs in key order after continuation token 
+        and next continuation token
+        '''
+        try:
+            _key = base64.urlsafe_b64decode(str(after))
+        except TypeError:
+            _key = None
+        if _key is None or (_key and not self.key_codec.is_valid(_key)):
+            raise RuntimeError('Incorrect continuation token: %s' % after)
+        rows = self._get_keyset(_key, limit=limit)
+        docs = [(k, self._decode(k, v, lazy)) for k, v in rows]
+        if len(docs) < limit:
+            return (docs, None)
+        return (docs, base64.urlsafe_b64encode(docs[-1][0]))
+
+    def _key_range(self, conditions):
+        ''' return (lower, upper) bounds of prepared keys by key range conditions, 
+        the bound is (prepared key, inclusive) or None
+        '''
+        lowers, uppers = list(), list()
+        for op, value in conditions.items():
+            if op in ('$gt', '$gte'):
+                lowers.append((self.prepare_key(value), op == '$gte'))
+            elif op in ('$lt', '$lte'):
+                uppers.append((self.prepare_key(value), op == '$lte'))
+            elif op == '$prefix':
+                _from, _to = self.key_codec.prefix_range(value)
+                lowers.append((_from, True))
+                if _to is not None:
+                    uppers.append((_to, False))
+            else:
+                raise RuntimeError('Unknown key range operator: %s' % op)
+        # the greatest lower and the least upper bounds, exclusive bound is 
+        # stronger than inclusive one with the same key
+        lower = max(lowers, key=lambda b: (b[0], not b[1])) if lowers else None
+        upper = min(uppers, key=lambda b: (b[0], b[1])) if uppers else None
+        return (lower, upper)
 
+    @instrumented('get_range')
+    def _get_range(self, lower=None, upper=None, reverse=False, limit=ITEMS_PER_REQUEST, lazy=False, 
+                    values=True):
+        ''' return docs in key range in key order, documents are selected 
+        by batches of `limit` rows
+
+        lower, upper - (prepared key, inclusive) or None, see _key_range()
+        values       - select documents, (key, None) is returned if False
+        '''
+        if limit <= 0:
+            raise RuntimeError('The limit should be positive, %s' % limit)
+        while True:
+            rows = self._get_key_range(lower, upper, reverse=reverse, limit=limit, values=values)
+            for k, v in rows:
+                yield (k, self._decode(k, v, lazy) if values else None)
+            if len(rows) < limit:
+                break
+            # the next batch starts after the last selected key
+            if reverse:
+                upper = (rows[-1][0], False)
+            else:
+                lower = (rows[-1][0], False)
+
+    @instrumented('get_all')
+    def _get_all(self, lazy=False):
+        ''' return all docs, see _decode() for `lazy`
+        '''
+        rowid = 0
+        while True:
+            rows = self._get_rows(rowid)
+            if not rows:
+                break
+            for rowid, k, v in rows:
+                if k == self._ZEROS_KEY:
+                    continue
+                yield (k, self._decode(k, v, lazy))
+
+    @instrumented('scan')
+    def scan(self, processes=None, batch_size=ITEMS_PER_REQUEST, queue_size=None):
+        ''' iterate over all docs in the same order as iteration over collection, 
+        documents are deserialized by worker processes
+
+        rows are selected by batches of `batch_size` rows and every batch is 
+        deserialized by worker, at most `queue_size` batches are processed at the 
+        same time, so the memory usage does not depend on collection size
+
+        processes   - the number of worker processes, cpu count by default
+        batch_size  - how many rows are selected per request
+        queue_size  - max amount of batches in progress, 2 * processes by default
+        '''
+        processes = processes or multiprocessing.cpu_count()
+        queue_size = queue_size or 2 * processes
+        if hasattr(self._serializer, 'from_meta'):
+            # workers use the serializer configuration of current metadata
+            self._serializer = self._serializer.from_meta(self.meta)
+        pool = multiprocessing.Pool(processes, _init_scan_worker, (self._serializer,))
+        try:
+            pending = list()
+            rowid = 0
+            while True:
+                rows = self._get_rows(rowid, limit=batch_size)
+                if not rows:
+                    break
+                rowid = rows[-1][0]
+                batch = [(k, str(v)) for _, k, v in rows if k <> self._ZEROS_KEY]
+                if batch:
+                    pending.append(([k for k, _ in batch], pool.apply_async(_loads_batch, (batch,))))
+                while len(pending) >= queue_size:
+                    keys, result = pending.pop(0)
+                    for k, v in zip(keys, result.get()):
+                        yield (self.key_codec.decode(k), v)
+            for keys, result in pending:
+                for k, v in zip(keys, result.get()):
+                    yield (self.key_codec.decode(k), v)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def __iter__(self):
+        ''' iterate over all docs
+        '''
+        return self._decode_docs(self._get_all())
+
+    def _rowid_bounds(self, parts):
+        ''' return the list of (rowid_from, rowid_to] ranges splitting collection 
+        into `parts` partitions
+        '''
+        max_rowid = self._max_rowid()
+        step = max(max_rowid / parts + 1, 1)
+        return [(rowid, min(rowid + step, max_rowid)) for rowid in range(0, max_rowid, step)]
+
+    @instrumented('put')
+    def put(self, *kv):
+        ''' put document(s) in collection 
+        
+        kv is list of key/value
+        
+        put(k,v) or put([(k1,v1), (k2,v2)])
+        
+        returns the amount of written documents, inserted or updated
+        '''
+        kv_docs = list()
+        if not isinstance(kv, (list,tuple)):
+            raise RuntimeError('key/value should be packed in the list or tuple')
+        
+        # put([(k1,v1), (k2,v2)])
+        if len(kv) == 1 \
+            and isinstance(kv[0], (list, tuple)):
+            
+            kv_docs = [(self.prepare_key(k), v) for k, v in kv[0]]
+
+        # put(k,v)
+        elif len(kv) == 2 \
+            and not isinstance(kv[0], (list, tuple)) \
+            and not isinstance(kv[1], (list, tuple)):
+            
+            kv_docs.append((self.prepare_key(kv[0]), kv[1]))
+
+        else:
+            raise RuntimeError('Incorrect format of key/values, %s' % kv)
+
+        return self._write(kv_docs, [self._prepare_kv(k, v, backend=self.BACKEND) for k, v in kv_docs])
+
+    def stats(self, reset=False):
+        ''' return statistics of this collection object: calls, errors, latency 
+        histograms of operations and their phases (sql, fetch, decode, encode), 
+        read and written bytes, see kvlite.stats. Cache statistics are returned 
+        as `cache` if the collection uses cache
+
+        reset - reset counters after reading
+        '''
+        result = self._stats.to_dict()
+        if self.cache is not None:
+            result['cache'] = self.cache.stats
+        if reset:
+            self._stats.reset()
+        return result
+
+    def buffered(self, rows=1000, size=None, interval=None):
+        ''' return BufferedCollection for this collection, put()/delete() are 
+        collected in memory and written by batches, see kvlite.buffer
+        '''
+        return BufferedCollection(self, rows=rows, size=size, interval=interval)
+
+    @instrumented('commit')
     def commit(self):
         ''' commit
         '''
         self._conn.commit()
+        self._indexes_loaded = False
+        self._uncommitted = False
+
+    def _rollback(self):
+        ''' rollback not committed changes, the cache is cleared
+        '''
+        self._conn.rollback()
+        self._indexes_loaded = False
+        self._uncommitted = False
+        if self.cache is not None:
+            self.cache.clear()
 
     def close(self):
         ''' close connection to database 
         '''
+        if self.cache is not None:
+            self.cache.clear()
         try:
             self._conn.close()
         except:
@@ -123,6 +788,14 @@ class BaseCollection(object):
 class MysqlCollection(BaseCollection):
     ''' Mysql Connection 
     '''
+    BACKEND = 'mysql'
+    INDEX_CLASS = MysqlIndex
+
+    # max amount of rows in one INSERT statement
+    MAX_INSERT_ROWS = 1000
+
+    _max_allowed_packet = None
+
     def get_uuid(self, amount=100):
         ''' 
         return one uuid. 
@@ -142,70 +815,89 @@ class MysqlCollection(BaseCollection):
                 self._uuid_cache.append(u)
         return self._uuid_cache.pop()
 
-    def _get_one(self, _key):
-        ''' return document by _key 
-        '''        
-        _key = self.prepare_key(_key)
-        SQL = 'SELECT k,v FROM %s WHERE k = ' % self._collection
-        try:
-            self._cursor.execute(SQL + "%s", binascii.a2b_hex(_key))
-        except Exception, err:
-            raise RuntimeError(err)
+    def _get_raw(self, _keys):
+        ''' return the list of raw (k, v) rows by prepared keys
+        '''
+        SQL_SELECT_MANY = 'SELECT k,v FROM {} WHERE k IN ({});'
+        SQL_SELECT_MANY = SQL_SELECT_MANY.format(self._collection, ','.join(['%s']*len(_keys)))
+        self._cursor.execute(SQL_SELECT_MANY, tuple([binascii.a2b_hex(k) for k in _keys]))
+        return [(binascii.b2a_hex(r[0]), r[1]) for r in self._cursor.fetchall()]
+
+    def _get_raw_keys(self, _keys):
+        ''' return the list of existing prepared keys from the list of prepared keys
+        '''
+        if not _keys:
+            return list()
+        SQL_SELECT_KEYS = 'SELECT k FROM {} WHERE k IN ({});'
+        SQL_SELECT_KEYS = SQL_SELECT_KEYS.format(self._collection, ','.join(['%s']*len(_keys)))
+        self._cursor.execute(SQL_SELECT_KEYS, tuple([binascii.a2b_hex(k) for k in _keys]))
+        return [binascii.b2a_hex(r[0]) for r in self._cursor.fetchall()]
+
+    def _database(self):
+        ''' return the server and the name of database
+        '''
+        self._cursor.execute('SELECT @@hostname, @@port, DATABASE();')
+        return 'mysql://%s:%s/%s' % self._cursor.fetchone()
+
+    def _count_all(self):
+        ''' return amount of documents by scanning collection
+        '''
+        SQL = 'SELECT count(*) FROM %s' % self._collection
+        self._cursor.execute(SQL + ' WHERE k <> %s;', (binascii.a2b_hex(self._ZEROS_KEY),))
+        return int(self._cursor.fetchone()[0])
+
+    def _estimated_count(self):
+        ''' return estimated amount of documents from information_schema
+        '''
+        SQL = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s;'
+        self._cursor.execute(SQL, (self._collection,))
         result = self._cursor.fetchone()
-        if result:
-            try:
-                v = self._serializer.loads(result[1])
-            except Exception, err:
-                raise RuntimeError('key %s, %s' % (_key, err))
-            return (binascii.b2a_hex(result[0]), v)
-        else:
-            return (None, None)
+        if result and result[0] is not None:
+            return max(int(result[0]) - 1, 0)
 
-    def _get_many(self, *_keys):
-        ''' return docs by keys 
-        '''        
-        if _keys:
-            if isinstance(_keys, (list, tuple)):
-                bin_keys = [binascii.a2b_hex(k) for k in _keys if k <> self._ZEROS_KEY]
-                SQL_SELECT_MANY = 'SELECT k,v FROM {} WHERE k IN ({})'
-                SQL_SELECT_MANY = SQL_SELECT_MANY.format(self._collection,','.join(['%s']*len(bin_keys)));
-                self._cursor.execute(SQL_SELECT_MANY, tuple(bin_keys))
-                result = self._cursor.fetchall()
-                if not result:
-                    return
-                for r in result:
-                    k = binascii.b2a_hex(r[0])
-                    try:
-                        v = self._serializer.loads(r[1])
-                    except Exception, err:
-                        raise RuntimeError('key %s, %s' % (k, err))
-                    yield (k, v)
-
-    def _get_all(self):
-        ''' return all docs 
+    def _max_rowid(self):
+        ''' return max rowid in collection 
         '''
-        rowid = 0
-        while True:
-            SQL_SELECT_ALL = 'SELECT __rowid__, k,v FROM %s WHERE __rowid__ > %d LIMIT %s;'
-            SQL_SELECT_ALL %=  (self._collection, rowid, ITEMS_PER_REQUEST)
-            self._cursor.execute(SQL_SELECT_ALL)
-            result = self._cursor.fetchall()
-            if not result:
-                break
-            for r in result:
-                rowid = r[0]
-                k = binascii.b2a_hex(r[1])
-                if k == self._ZEROS_KEY:
-                    continue
-                try:
-                    v = self._serializer.loads(r[2])
-                except Exception, err:
-                    raise RuntimeError('key %s, %s' % (k, err))
-                yield (k, v)
-                
-    __iter__ = _get_all
+        self._cursor.execute('SELECT MAX(__rowid__) FROM %s;' % self._collection)
+        return self._cursor.fetchone()[0] or 0
+
+    def _get_rows(self, rowid=0, limit=ITEMS_PER_REQUEST, lock=False):
+        ''' return the list of raw (rowid, k, v) rows with rowid greater than `rowid`
+        
+        lock - lock selected rows till the end of transaction
+        '''
+        SQL_SELECT_ROWS = 'SELECT __rowid__, k,v FROM %s WHERE __rowid__ > %d ORDER BY __rowid__ LIMIT %d'
+        SQL_SELECT_ROWS %=  (self._collection, int(rowid), int(limit))
+        if lock:
+            SQL_SELECT_ROWS += ' LOCK IN SHARE MODE'
+        self._cursor.execute(SQL_SELECT_ROWS + ';')
+        return [(r[0], binascii.b2a_hex(r[1]), r[2]) for r in self._cursor.fetchall()]
+
+    def _get_keyset(self, _key, limit=ITEMS_PER_REQUEST):
+        ''' return the list of raw (k, v) rows with keys greater than _key in key order
+        '''
+        SQL_SELECT_KEYSET = 'SELECT k,v FROM %s WHERE k > %%s AND k <> %%s ORDER BY k LIMIT %d;'
+        SQL_SELECT_KEYSET %= (self._collection, int(limit))
+        self._cursor.execute(SQL_SELECT_KEYSET, (binascii.a2b_hex(_key), binascii.a2b_hex(self._ZEROS_KEY)))
+        return [(binascii.b2a_hex(r[0]), r[1]) for r in self._cursor.fetchall()]
+
+    def _get_key_range(self, lower=None, upper=None, reverse=False, limit=ITEMS_PER_REQUEST, values=True):
+        ''' return the list of raw (k, v) rows in key range in key order, 
+        see BaseCollection._get_range()
+        '''
+        conditions, params = ['k <> %s'], [binascii.a2b_hex(self._ZEROS_KEY)]
+        for bound, operators in ((lower, ('>', '>=')), (upper, ('<', '<='))):
+            if bound is not None:
+                conditions.append('k %s %%s' % operators[bound[1]])
+                params.append(binascii.a2b_hex(bound[0]))
+        SQL_SELECT_RANGE = 'SELECT %s FROM %s WHERE %s ORDER BY k %s LIMIT %d;'
+        SQL_SELECT_RANGE %= ('k,v' if values else 'k', self._collection, ' AND '.join(conditions), 
+                                'DESC' if reverse else 'ASC', int(limit))
+        self._cursor.execute(SQL_SELECT_RANGE, tuple(params))
+        return [(binascii.b2a_hex(r[0]), r[1] if values else None) for r in self._cursor.fetchall()]
 
-    def _get_paged(self, offset=None, limit=ITEMS_PER_REQUEST):
+    @instrumented('get_paged')
+    def _get_paged(self, offset=None, limit=ITEMS_PER_REQUEST, lazy=False):
         ''' return docs by offset and limit
         
         offset and limit are used for pagination, for details 
@@ -225,50 +917,69 @@ class MysqlCollection(BaseCollection):
             k = binascii.b2a_hex(r[0])
             if k == self._ZEROS_KEY:
                 continue
-            try:
-                v = self._serializer.loads(r[1])
-            except Exception, err:
-                raise RuntimeError('key %s, %s' % (k, err))
-            yield (k, v)
+            yield (k, self._decode(k, r[1], lazy))
 
 
-    def put(self, k, v):
-        ''' put document in collection 
-        '''        
-        kv_insert = list()
-        if not isinstance(kv, (list,tuple)):
-            raise RuntimeError('key/value should be packed in the list or tuple')
+    def _write(self, kv_docs, kv_insert):
+        ''' insert or update documents by multi-row INSERT ... ON DUPLICATE KEY UPDATE 
+        statements, the size of statement is limited by max_allowed_packet and 
+        MAX_INSERT_ROWS
         
-        # put([(k1,v1), (k2,v2)])
-        if len(kv) == 1 \
-            and isinstance(kv[0], (list, tuple)):
-            
-            kv_insert = [self.prepare_kv(*kvs, backend='mysql') for kvs in kv[0]]
-
-        # put(k,v)
-        elif len(kv) == 2 \
-            and not isinstance(kv[0], (list, tuple)) \
-            and not isinstance(kv[1], (list, tuple)):
-            
-            kv_insert.append(self.prepare_kv(*kv, backend='mysql'))
-
-        else:
-            raise RuntimeError('Incorrect format of key/values, %s' % kv)
+        kv_docs     - the list of (prepared key, document) 
+        kv_insert   - the list of prepared key/value pairs, see prepare_kv()
+        
+        returns the amount of written rows like SQLite, the affected rows reported 
+        by MySQL (1 for inserted, 2 for updated, 0 for unchanged row) are not used
+        '''
+        self._invalidate([k for k, v in kv_docs])
+        SQL_INSERT = 'INSERT INTO %s (k,v) VALUES ' % self._collection
+        SQL_UPDATE = ' ON DUPLICATE KEY UPDATE v=VALUES(v);'
+        max_size = self._max_packet() - len(SQL_INSERT) - len(SQL_UPDATE) - 1024
+        for batch in self._insert_batches(kv_insert, max_size):
+            SQL_INSERT_MANY = SQL_INSERT + ','.join(['(%s,%s)'] * len(batch)) + SQL_UPDATE
+            self._cursor.execute(SQL_INSERT_MANY, tuple(itertools.chain(*batch)))
+        self._update_indexes(kv_docs)
+        return len(kv_insert)
 
-        k = self.prepare_key(k)
-        SQL_INSERT = 'INSERT INTO %s (k,v) ' % self._collection
-        SQL_INSERT += 'VALUES (%s,%s) ON DUPLICATE KEY UPDATE v=%s;;'
+    def _insert_batches(self, kv_insert, max_size):
+        ''' split prepared key/value pairs by batches of MAX_INSERT_ROWS rows, 
+        escaped size of batch is not more than max_size bytes
+        '''
+        batch, size = list(), 0
+        for k, v in kv_insert:
+            # binary strings are escaped, in worst case every byte is doubled
+            row_size = 2 * (len(k) + len(v)) + 8
+            if batch and (len(batch) >= self.MAX_INSERT_ROWS or size + row_size > max_size):
+                yield batch
+                batch, size = list(), 0
+            batch.append((k, v))
+            size += row_size
+        if batch:
+            yield batch
 
-        self._cursor.execute(SQL_INSERT, kv_insert)
+    def _max_packet(self):
+        ''' return max_allowed_packet of MySQL server
+        '''
+        if self._max_allowed_packet is None:
+            self._cursor.execute('SELECT @@max_allowed_packet;')
+            self._max_allowed_packet = int(self._cursor.fetchone()[0])
+        return self._max_allowed_packet
 
+    @instrumented('delete')
     def delete(self, k):
         ''' delete document by k 
         '''
-        _key = self.prepare_key(k)
+        self._delete(self.prepare_key(k))
+
+    def _delete(self, _key):
+        ''' delete document by prepared key
+        '''
         if _key == self._ZEROS_KEY:
             raise RuntimeError('Metadata cannot be deleted')
+        self._invalidate([_key,])
         SQL_DELETE = '''DELETE FROM %s WHERE k = ''' % self._collection
         self._cursor.execute(SQL_DELETE + "%s;", binascii.a2b_hex(_key))
+        self._delete_from_indexes([_key,])
 
 # -----------------------------------------------------------------
 # SqliteCollection class
@@ -276,6 +987,75 @@ class MysqlCollection(BaseCollection):
 class SqliteCollection(BaseCollection):
     ''' Sqlite Collection
     '''    
+    BACKEND = 'sqlite'
+    INDEX_CLASS = SqliteIndex
+
+    # PRAGMA values of synchronous option
+    SYNCHRONOUS = {0: 'off', 1: 'normal', 2: 'full', 3: 'extra'}
+
+    def __init__(self, *args, **kwargs):
+        ''' __init__, see BaseCollection
+        '''
+        super(SqliteCollection, self).__init__(*args, **kwargs)
+        self._compact = (self.layout == 'compact')
+        self._ZEROS_BLOB = binascii.a2b_hex(self._ZEROS_KEY)
+
+    @property
+    def layout(self):
+        ''' return the layout of collection table
+        
+        default - text keys, rowid table with unique index on keys 
+        compact - 20-byte binary keys, WITHOUT ROWID table clustered on keys
+        '''
+        SQL = "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;"
+        self._cursor.execute(SQL, (self._collection,))
+        result = self._cursor.fetchone()
+        if result and 'WITHOUT ROWID' in result[0].upper():
+            return 'compact'
+        return 'default'
+
+    def _db_key(self, k):
+        ''' convert prepared key to database key
+        
+        hex keys are stored as text for default layout and as binary for compact 
+        layout, the keys of other codecs are stored as binary
+        '''
+        if self.key_codec.HEX or k == self._ZEROS_KEY:
+            if not self._compact:
+                return k
+            try:
+                return buffer(binascii.a2b_hex(k))
+            except TypeError:
+                raise RuntimeError('Incorrect key for compact layout, hex string is expected: %s' % k)
+        return buffer(k)
+
+    def _py_key(self, k):
+        ''' convert database key to prepared key
+        '''
+        if self._compact:
+            k = str(k)
+            if self.key_codec.HEX or k == self._ZEROS_BLOB:
+                return binascii.b2a_hex(k)
+            return k
+        if isinstance(k, buffer):
+            return str(k)
+        return k
+
+    @property
+    def settings(self):
+        ''' return active values of PRAGMA options, see SQLITE_OPTIONS in settings.py
+        '''
+        settings = dict()
+        for name, (pragma, _) in SQLITE_OPTIONS.items():
+            self._cursor.execute('PRAGMA %s;' % pragma)
+            result = self._cursor.fetchone()
+            if result is None:
+                continue
+            settings[name] = result[0]
+        if 'synchronous' in settings:
+            settings['synchronous'] = self.SYNCHRONOUS.get(settings['synchronous'], settings['synchronous'])
+        return settings
+
     def get_uuid(self):
         ''' return id based on uuid 
         '''
@@ -284,111 +1064,155 @@ class SqliteCollection(BaseCollection):
                 self._uuid_cache.append(uuid)
         return self._uuid_cache.pop()
 
-    def put(self, *kv):
-        ''' put document(s) in collection 
+    def _write(self, kv_docs, kv_insert):
+        ''' insert or replace documents
         
-        kv is list of key/value
+        kv_docs     - the list of (prepared key, document) 
+        kv_insert   - the list of prepared key/value pairs, see prepare_kv()
         
-        put(k,v) or put([(k1,v1), (k2,v2)])
+        returns the amount of written rows
         '''
-        kv_insert = list()
-        if not isinstance(kv, (list,tuple)):
-            raise RuntimeError('key/value should be packed in the list or tuple')
-        
-        # put([(k1,v1), (k2,v2)])
-        if len(kv) == 1 \
-            and isinstance(kv[0], (list, tuple)):
-            
-            kv_insert = [self.prepare_kv(*kvs, backend='sqlite') for kvs in kv[0]]
-
-        # put(k,v)
-        elif len(kv) == 2 \
-            and not isinstance(kv[0], (list, tuple)) \
-            and not isinstance(kv[1], (list, tuple)):
-            
-            kv_insert.append(self.prepare_kv(*kv, backend='sqlite'))
-
-        else:
-            raise RuntimeError('Incorrect format of key/values, %s' % kv)
-
+        self._invalidate([k for k, v in kv_docs])
         SQL_INSERT = 'INSERT OR REPLACE INTO %s (k,v) ' % self._collection
         SQL_INSERT += 'VALUES (?,?)'
+        if self._compact or not self.key_codec.HEX:
+            kv_insert = [(self._db_key(k), v) for k, v in kv_insert]
         self._cursor.executemany(SQL_INSERT, kv_insert)
+        self._update_indexes(kv_docs)
+        # every row is inserted or replaced, the cursor reports -1 when 
+        # executemany() starts the transaction
+        return len(kv_insert)
 
-    def _get_one(self, _key):
-        ''' return document by _key 
-        '''        
-        _key = self.prepare_key(_key)
-        SQL = 'SELECT k,v FROM %s WHERE k = ?;' % self._collection
-        try:
-            self._cursor.execute(SQL, (_key,))
-        except Exception, err:
-            raise RuntimeError(err)
+    def _get_raw(self, _keys):
+        ''' return the list of raw (k, v) rows by prepared keys
+        '''
+        SQL_SELECT_MANY = 'SELECT k,v FROM %s WHERE k IN (%s);'
+        SQL_SELECT_MANY %= (self._collection, ','.join(['?']*len(_keys)))
+        self._cursor.execute(SQL_SELECT_MANY, tuple([self._db_key(k) for k in _keys]))
+        return [(self._py_key(r[0]), r[1]) for r in self._cursor.fetchall()]
+
+    def _get_raw_keys(self, _keys):
+        ''' return the list of existing prepared keys from the list of prepared keys
+        '''
+        if not _keys:
+            return list()
+        SQL_SELECT_KEYS = 'SELECT k FROM %s WHERE k IN (%s);'
+        SQL_SELECT_KEYS %= (self._collection, ','.join(['?']*len(_keys)))
+        self._cursor.execute(SQL_SELECT_KEYS, tuple([self._db_key(k) for k in _keys]))
+        return [self._py_key(r[0]) for r in self._cursor.fetchall()]
+
+    def _database(self):
+        ''' return the path of database file, memory databases are identified 
+        by connection
+        '''
+        self._cursor.execute('PRAGMA database_list;')
+        path = [r[2] for r in self._cursor.fetchall() if r[1] == 'main'][0]
+        if not path:
+            return 'sqlite://memory-%x' % id(self._conn)
+        return 'sqlite://%s' % path
+
+    def _count_all(self):
+        ''' return amount of documents by scanning collection
+        '''
+        SQL = 'SELECT count(*) FROM %s' % self._collection
+        self._cursor.execute(SQL + ' WHERE k <> ?;', (self._db_key(self._ZEROS_KEY),))
+        return int(self._cursor.fetchone()[0])
+
+    def _estimated_count(self):
+        ''' return estimated amount of documents from sqlite_stat1, 
+        the statistics is collected by ANALYZE
+        '''
+        SQL = 'SELECT stat FROM sqlite_stat1 WHERE tbl = ? ORDER BY idx IS NOT NULL LIMIT 1;'
+        self._cursor.execute(SQL, (self._collection,))
         result = self._cursor.fetchone()
-        if result:
-            try:
-                if _key == self._ZEROS_KEY:
-                    v = cPickleSerializer.loads(result[1])
-                else:
-                    v = self._serializer.loads(result[1])
-            except Exception, err:
-                raise RuntimeError('key %s, %s' % (_key, err))
-            return (result[0], v)
-        else:
-            return (None, None)
+        if result and result[0]:
+            return max(int(result[0].split()[0]) - 1, 0)
 
-    def _get_many(self, *_keys):
-        ''' return docs by keys or all docs if keys are not defined 
-        '''        
-        if _keys:
-            if isinstance(_keys, (list, tuple)):
-                # check if keys are even
-                for key in _keys:
-                    if key == self._ZEROS_KEY:
-                        continue
-                    key = self.prepare_key(key)
-                SQL_SELECT_MANY = 'SELECT k,v FROM %s WHERE k IN ({seq})';
-                SQL_SELECT_MANY %= (self._collection)
-                SQL_SELECT_MANY = SQL_SELECT_MANY.format(seq=','.join(['?']*len(_keys)))
-                self._cursor.execute(SQL_SELECT_MANY, _keys)
-                result = self._cursor.fetchall()
-                if not result:
-                    return
-                for r in result:
-                    k = r[0]
-                    if k == self._ZEROS_KEY:
-                        continue
-                    try:
-                        v = self._serializer.loads(r[1])
-                    except Exception, err:
-                        raise RuntimeError('key %s, %s' % (k, err))
-                    yield (k, v)
-
-    def _get_all(self):
-        ''' return all docs 
-        '''        
-        rowid = 0
-        while True:
-            SQL_SELECT_MANY = 'SELECT rowid, k,v FROM %s WHERE rowid > %d LIMIT %d ;'
-            SQL_SELECT_MANY %= (self._collection, rowid, ITEMS_PER_REQUEST)
-            self._cursor.execute(SQL_SELECT_MANY)
-            result = self._cursor.fetchall()
-            if not result:
+    def _max_rowid(self):
+        ''' return max rowid in collection, for compact layout the keys are 
+        used as rowid
+        '''
+        if self._compact:
+            self._cursor.execute('SELECT MAX(k) FROM %s;' % self._collection)
+            result = self._cursor.fetchone()[0]
+            return self._py_key(result) if result is not None else 0
+        self._cursor.execute('SELECT MAX(rowid) FROM %s;' % self._collection)
+        return self._cursor.fetchone()[0] or 0
+
+    def _rowid_bounds(self, parts):
+        ''' return the list of (rowid_from, rowid_to] ranges splitting collection 
+        into `parts` partitions
+        '''
+        if not self._compact:
+            return super(SqliteCollection, self)._rowid_bounds(parts)
+        self._cursor.execute('SELECT count(*) FROM %s;' % self._collection)
+        total = self._cursor.fetchone()[0]
+        bounds, rowid_from = list(), 0
+        for part in range(1, parts + 1):
+            offset = total * part / parts
+            if part < parts and offset <= 0:
+                continue
+            SQL = 'SELECT k FROM %s ORDER BY k LIMIT 1 OFFSET %d;' % (self._collection, offset - 1)
+            self._cursor.execute(SQL)
+            result = self._cursor.fetchone()
+            if result is None:
                 break
-            for r in result:
-                rowid = r[0]
-                k = r[1]
-                if k == self._ZEROS_KEY:
-                    continue
-                try:
-                    v = self._serializer.loads(r[2])
-                except Exception, err:
-                    raise RuntimeError('key %s, %s' % (k, err))
-                yield (k, v)
+            rowid_to = self._py_key(result[0])
+            if rowid_to <> rowid_from:
+                bounds.append((rowid_from, rowid_to))
+            rowid_from = rowid_to
+        return bounds
 
-    __iter__ = _get_all
+    def _get_rows(self, rowid=0, limit=ITEMS_PER_REQUEST, lock=False):
+        ''' return the list of raw (rowid, k, v) rows with rowid greater than `rowid`,
+        for compact layout the rows are selected in key order and keys are used as rowid
+        
+        lock - start write transaction before select, the changes made in the same 
+            transaction are not mixed with other writers
+        '''
+        if lock:
+            self._cursor.execute('BEGIN IMMEDIATE;')
+        if self._compact:
+            SQL_SELECT_ROWS = 'SELECT k,v FROM %s WHERE k > ? ORDER BY k LIMIT %d ;'
+            SQL_SELECT_ROWS %= (self._collection, int(limit))
+            # integer rowid is left by the scan started before migration to compact layout, 
+            # the scan is restarted
+            if not isinstance(rowid, basestring):
+                rowid = None
+            self._cursor.execute(SQL_SELECT_ROWS, (self._db_key(rowid) if rowid else buffer(''),))
+            return [(self._py_key(r[0]), self._py_key(r[0]), r[1]) for r in self._cursor.fetchall()]
+        SQL_SELECT_ROWS = 'SELECT rowid, k,v FROM %s WHERE rowid > %d ORDER BY rowid LIMIT %d ;'
+        SQL_SELECT_ROWS %= (self._collection, int(rowid), int(limit))
+        self._cursor.execute(SQL_SELECT_ROWS)
+        if not self.key_codec.HEX:
+            return [(r[0], self._py_key(r[1]), r[2]) for r in self._cursor.fetchall()]
+        return self._cursor.fetchall()
+
+    def _get_keyset(self, _key, limit=ITEMS_PER_REQUEST):
+        ''' return the list of raw (k, v) rows with keys greater than _key in key order
+        '''
+        SQL_SELECT_KEYSET = 'SELECT k,v FROM %s WHERE k > ? AND k <> ? ORDER BY k LIMIT %d;'
+        SQL_SELECT_KEYSET %= (self._collection, int(limit))
+        self._cursor.execute(SQL_SELECT_KEYSET, (self._db_key(_key), self._db_key(self._ZEROS_KEY)))
+        return [(self._py_key(r[0]), r[1]) for r in self._cursor.fetchall()]
+
+    def _get_key_range(self, lower=None, upper=None, reverse=False, limit=ITEMS_PER_REQUEST, values=True):
+        ''' return the list of raw (k, v) rows in key range in key order, 
+        see BaseCollection._get_range()
+        '''
+        conditions, params = ['k <> ?'], [self._db_key(self._ZEROS_KEY)]
+        for bound, operators in ((lower, ('>', '>=')), (upper, ('<', '<='))):
+            if bound is not None:
+                conditions.append('k %s ?' % operators[bound[1]])
+                params.append(self._db_key(bound[0]))
+        SQL_SELECT_RANGE = 'SELECT %s FROM %s WHERE %s ORDER BY k %s LIMIT %d;'
+        SQL_SELECT_RANGE %= ('k,v' if values else 'k', self._collection, ' AND '.join(conditions), 
+                                'DESC' if reverse else 'ASC', int(limit))
+        self._cursor.execute(SQL_SELECT_RANGE, tuple(params))
+        return [(self._py_key(r[0]), r[1] if values else None) for r in self._cursor.fetchall()]
 
-    def _get_paged(self, offset=None, limit=ITEMS_PER_REQUEST):
+    @instrumented('get_paged')
+    def _get_paged(self, offset=None, limit=ITEMS_PER_REQUEST, lazy=False):
         ''' return docs by offset and limit
         
         offset and limit are used for pagination, for details 
@@ -399,27 +1223,30 @@ class SqliteCollection(BaseCollection):
         
         SQL_SELECT_MANY = 'SELECT k,v FROM %s WHERE k <> ? LIMIT %d, %d ;'
         SQL_SELECT_MANY %= (self._collection, int(offset), int(limit))
-        self._cursor.execute(SQL_SELECT_MANY, (self._ZEROS_KEY, ))
+        self._cursor.execute(SQL_SELECT_MANY, (self._db_key(self._ZEROS_KEY), ))
         result = self._cursor.fetchall()
         if not result:
             return
         for r in result:
-            k = r[0]
+            k = self._py_key(r[0])
             if k == self._ZEROS_KEY:
                 continue
-            try:
-                v = self._serializer.loads(r[1])
-            except Exception, err:
-                raise RuntimeError('key %s, %s' % (k, err))
-            yield (k, v)
+            yield (k, self._decode(k, r[1], lazy))
 
+    @instrumented('delete')
     def delete(self, k):
         ''' delete document by k 
         '''
-        _key = self.prepare_key(k)
+        self._delete(self.prepare_key(k))
+
+    def _delete(self, _key):
+        ''' delete document by prepared key
+        '''
         if _key == self._ZEROS_KEY:
             raise RuntimeError('Metadata cannot be deleted')
+        self._invalidate([_key,])
         SQL_DELETE = '''DELETE FROM %s WHERE k = ?;''' % self._collection
-        self._cursor.execute(SQL_DELETE, (_key,))
+        self._cursor.execute(SQL_DELETE, (self._db_key(_key),))
+        self._delete_from_indexes([_key,])
                     
  
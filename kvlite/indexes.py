@@ -0,0 +1,355 @@
+import kvlite
+import struct
+import itertools
+import binascii
+import threading
+
+from kvlite.settings import ITEMS_PER_REQUEST
+
+# the types of values which can be stored in index
+INDEXED_VALUE_TYPES = (str, unicode, int, long, float, bool)
+
+# the prefixes of MySQL index values, numbers are ordered before strings as in SQLite
+MYSQL_NUMBER_PREFIX = '\x01'
+MYSQL_STRING_PREFIX = '\x02'
+
+# max size of prepared MySQL index value, the size of value columns which are 
+# parts of primary key. Longer values are rejected
+MYSQL_MAX_VALUE_SIZE = 255
+
+# search operators and their SQL equivalents
+SEARCH_OPERATORS = {
+    '$gt': '>',
+    '$gte': '>=',
+    '$lt': '<',
+    '$lte': '<=',
+    '$ne': '<>',
+}
+
+# -----------------------------------------------------------------
+# BaseIndex class
+# -----------------------------------------------------------------
+class BaseIndex(object):
+    ''' BaseIndex
+
+    Secondary index is stored in separate table as (value(s), key) rows,
+    see details in docs/index-and-search.md
+    '''
+    PLACEHOLDER = '?'
+
+    def __init__(self, connection, name, fields, state='ready'):
+        ''' __init__
+
+        name    - the name of index table
+        fields  - the list of (field, order) pairs, see prepare_fields()
+        state   - 'building' or 'ready'
+        '''
+        self._conn = connection
+        self._cursor = self._conn.cursor()
+        self._name = name
+        self._fields = self.prepare_fields(fields)
+        self.state = state
+        self._columns = ['f%d' % i for i in range(len(self._fields))]
+
+    @property
+    def name(self):
+        ''' return the name of index table
+        '''
+        return self._name
+
+    @property
+    def fields(self):
+        ''' return the list of indexed fields
+        '''
+        return self._fields
+
+    @staticmethod
+    def prepare_fields(parameters):
+        ''' prepare index fields
+
+        parameters can be dictionary with one field: { "field": 1 } or the list
+        of (field, order) pairs for compound index: [("field0", 1), ("field1", -1)]
+
+        returns the list of [field, order] pairs
+        '''
+        if isinstance(parameters, dict):
+            if len(parameters) > 1 and type(parameters) is dict:
+                raise RuntimeError('Compound index fields should be defined as list of (field, order) pairs')
+            parameters = parameters.items()
+        if not isinstance(parameters, (list, tuple)) or not parameters:
+            raise RuntimeError('Incorrect index parameters: %s' % parameters)
+
+        fields = list()
+        for field in parameters:
+            try:
+                name, order = field
+            except (TypeError, ValueError):
+                raise RuntimeError('Incorrect index field definition: %s' % field)
+            if not isinstance(name, (str, unicode)) or not name:
+                raise RuntimeError('Incorrect index field name: %s' % name)
+            if order not in (1, -1):
+                raise RuntimeError('Index order should be 1 or -1, field: %s' % name)
+            fields.append([str(name), order])
+        return fields
+
+    @staticmethod
+    def field_value(document, name):
+        ''' return the value of field from document, field name can be
+        defined for sub-documents as "field0.field1"
+        '''
+        value = document
+        for part in name.split('.'):
+            if not isinstance(value, dict) or part not in value:
+                return None
+            value = value[part]
+        return value
+
+    def values(self, document):
+        ''' return the list of value tuples for document
+
+        if the field value is list or tuple each item will be indexed separately.
+        Documents without indexed fields are not included in index
+        '''
+        field_values = list()
+        for name, _ in self._fields:
+            value = self.field_value(document, name)
+            if not isinstance(value, (list, tuple)):
+                value = [value,]
+            value = [self.prepare_value(v) for v in value if isinstance(v, INDEXED_VALUE_TYPES)]
+            if not value:
+                return []
+            field_values.append(value)
+        return list(set(itertools.product(*field_values)))
+
+    @staticmethod
+    def prepare_value(value):
+        ''' prepare value before insert to index table
+        '''
+        return value
+
+    @staticmethod
+    def encode_key(key):
+        ''' convert collection key to index key
+        '''
+        return key
+
+    @staticmethod
+    def decode_key(key):
+        ''' convert index key to collection key
+        '''
+        return key
+
+    def put(self, kv):
+        ''' add documents to index, kv is the list of (prepared key, document)
+
+        the previous index rows for these keys will be replaced
+        '''
+        self.delete([k for k, _ in kv])
+        rows = list()
+        for k, document in kv:
+            for values in self.values(document):
+                rows.append(values + (self.encode_key(k),))
+        if rows:
+            self._cursor.executemany(self.SQL_INSERT % (
+                self._name, ','.join(self._columns + ['k',]),
+                ','.join([self.PLACEHOLDER] * (len(self._columns) + 1))), rows)
+
+    def delete(self, keys):
+        ''' remove index rows for keys
+        '''
+        keys = [self.encode_key(k) for k in keys]
+        for i in range(0, len(keys), ITEMS_PER_REQUEST):
+            chunk = keys[i:i + ITEMS_PER_REQUEST]
+            SQL_DELETE = 'DELETE FROM %s WHERE k IN (%s);'
+            SQL_DELETE %= (self._name, ','.join([self.PLACEHOLDER] * len(chunk)))
+            self._cursor.execute(SQL_DELETE, chunk)
+
+    def search(self, criteria, limit=None):
+        ''' return collection keys matched to criteria
+
+        criteria is dictionary { "field": value } where value can be a simple
+        value or dictionary with operators: $gt, $gte, $lt, $lte, $ne, $in.
+        The keys are returned in index order
+        '''
+        if not isinstance(criteria, dict):
+            raise RuntimeError('Incorrect criteria format')
+        names = [name for name, _ in self._fields]
+        conditions = list()
+        params = list()
+        for field, condition in criteria.items():
+            if field not in names:
+                raise RuntimeError('The field %s is not in index %s' % (field, self._name))
+            column = self._columns[names.index(field)]
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            for op, value in condition.items():
+                if op == '$eq':
+                    conditions.append('%s = %s' % (column, self.PLACEHOLDER))
+                    params.append(self.prepare_value(value))
+                elif op == '$in':
+                    if not isinstance(value, (list, tuple)) or not value:
+                        raise RuntimeError('The value for $in should be non-empty list')
+                    conditions.append('%s IN (%s)' % (column, ','.join([self.PLACEHOLDER] * len(value))))
+                    params.extend([self.prepare_value(v) for v in value])
+                elif op in SEARCH_OPERATORS:
+                    conditions.append('%s %s %s' % (column, SEARCH_OPERATORS[op], self.PLACEHOLDER))
+                    params.append(self.prepare_value(value))
+                else:
+                    raise RuntimeError('Unknown search operator: %s' % op)
+
+        SQL_SEARCH = 'SELECT k FROM %s' % self._name
+        if conditions:
+            SQL_SEARCH += ' WHERE ' + ' AND '.join(conditions)
+        SQL_SEARCH += ' ORDER BY ' + ','.join(['%s %s' % (column, 'ASC' if order == 1 else 'DESC')
+                                        for column, (_, order) in zip(self._columns, self._fields)])
+        SQL_SEARCH += ', k'
+        self._cursor.execute(SQL_SEARCH + ';', params)
+
+        found = set()
+        while True:
+            result = self._cursor.fetchmany(ITEMS_PER_REQUEST)
+            if not result:
+                break
+            for r in result:
+                k = self.decode_key(r[0])
+                if k in found:
+                    continue
+                found.add(k)
+                yield k
+                if limit and len(found) >= limit:
+                    return
+
+    def remove(self):
+        ''' remove index table
+        '''
+        self._cursor.execute('DROP TABLE IF EXISTS %s;' % self._name)
+
+# -----------------------------------------------------------------
+# MysqlIndex class
+# -----------------------------------------------------------------
+class MysqlIndex(BaseIndex):
+    ''' MysqlIndex
+
+    values are stored as binary strings which keep the order of values as in 
+    SQLite index: numbers and booleans are ordered by value before strings, 
+    strings are ordered by bytes, see prepare_value()
+    '''
+    PLACEHOLDER = '%s'
+    SQL_INSERT = 'INSERT IGNORE INTO %s (%s) VALUES (%s);'
+
+    @staticmethod
+    def prepare_value(value):
+        ''' prepare value before insert to index table
+
+        numbers are encoded as the prefix, 8 bytes of double with flipped bits 
+        for sorting and 8 bytes of the difference between integer and double, 
+        so integers out of double precision are compared exactly. Strings are 
+        encoded as the prefix and UTF-8 bytes, RuntimeError is raised if the 
+        string is longer than MYSQL_MAX_VALUE_SIZE - 1 bytes
+        '''
+        if isinstance(value, (int, long, float)):
+            number = float(value) + 0.0
+            bits = struct.unpack('>Q', struct.pack('>d', number))[0]
+            if bits >> 63:
+                bits ^= 0xFFFFFFFFFFFFFFFF
+            else:
+                bits |= 1 << 63
+            rest = value - long(number) if isinstance(value, (int, long)) else 0
+            rest = max(min(rest, 2 ** 63 - 1), -2 ** 63)
+            return MYSQL_NUMBER_PREFIX + struct.pack('>QQ', bits, rest + 2 ** 63)
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        if len(value) >= MYSQL_MAX_VALUE_SIZE:
+            raise RuntimeError('The indexed value is too long for MySQL index: %d bytes, max %d bytes' % 
+                                (len(value), MYSQL_MAX_VALUE_SIZE - 1))
+        return MYSQL_STRING_PREFIX + value
+
+    @staticmethod
+    def encode_key(key):
+        ''' convert collection key to index key
+        '''
+        return binascii.a2b_hex(key)
+
+    @staticmethod
+    def decode_key(key):
+        ''' convert index key to collection key
+        '''
+        return binascii.b2a_hex(key)
+
+    def create(self):
+        ''' create index table
+        '''
+        SQL_CREATE_TABLE = '''CREATE TABLE IF NOT EXISTS %s ( %s,
+                                k BINARY(20) NOT NULL,
+                                PRIMARY KEY (%s,k), KEY (k) ) ENGINE=InnoDB;'''
+        SQL_CREATE_TABLE %= (self._name,
+                            ', '.join(['%s VARBINARY(%d) NOT NULL' % (c, MYSQL_MAX_VALUE_SIZE) for c in self._columns]),
+                            ','.join(self._columns))
+        self._cursor.execute(SQL_CREATE_TABLE)
+
+# -----------------------------------------------------------------
+# SqliteIndex class
+# -----------------------------------------------------------------
+class SqliteIndex(BaseIndex):
+    ''' SqliteIndex
+    '''
+    SQL_INSERT = 'INSERT OR IGNORE INTO %s (%s) VALUES (%s);'
+
+    def create(self):
+        ''' create index table
+        '''
+        SQL_CREATE_TABLE = 'CREATE TABLE IF NOT EXISTS %s (%s, k NOT NULL, UNIQUE (%s, k));'
+        SQL_CREATE_TABLE %= (self._name, ', '.join(self._columns),
+                            ', '.join(['%s %s' % (column, 'ASC' if order == 1 else 'DESC')
+                                        for column, (_, order) in zip(self._columns, self._fields)]))
+        self._cursor.execute(SQL_CREATE_TABLE)
+        self._cursor.execute('CREATE INDEX IF NOT EXISTS %s_k ON %s (k);' % (self._name, self._name))
+
+# -----------------------------------------------------------------
+# IndexBuilder class
+# -----------------------------------------------------------------
+class IndexBuilder(threading.Thread):
+    ''' IndexBuilder
+
+    builds registered index in background thread with own connection 
+    to database, see details in BaseCollection.build_index()
+
+    >>> collection.make_index('title', {'title': 1}, build=False)
+    >>> builder = IndexBuilder(uri, 'title', rows_per_sec=1000)
+    >>> builder.start()
+    '''
+    def __init__(self, uri, name, serializer_name=None, **kwargs):
+        ''' __init__
+
+        serializer_name is checked by kvlite.open(), by default the serializer 
+        from collection metadata is used. kwargs are passed to 
+        BaseCollection.build_index(): batch_size, rows_per_sec, bytes_per_sec
+        '''
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._uri = uri
+        self._name = name
+        self._serializer_name = serializer_name
+        self._kwargs = kwargs
+        self._stop_event = threading.Event()
+
+        self.completed = False
+        self.error = None
+
+    def run(self):
+        ''' build index
+        '''
+        collection = None
+        try:
+            collection = kvlite.open(self._uri, serializer_name=self._serializer_name)
+            self.completed = collection.build_index(self._name, stop_event=self._stop_event, **self._kwargs)
+        except Exception, err:
+            self.error = err
+        finally:
+            if collection is not None:
+                collection.close()
+
+    def stop(self):
+        ''' stop building, it can be continued later from the last watermark
+        '''
+        self._stop_event.set()
@@ -0,0 +1,144 @@
+import struct
+
+from kvlite.settings import KEY_LENGTH
+
+# -----------------------------------------------------------------
+# Key codecs
+#
+# the key codec converts user keys to the keys stored in database (prepared keys)
+# and back. The codec used by collection is stored in metadata as `key_codec`,
+# the metadata key is the same for all codecs
+# -----------------------------------------------------------------
+META_KEY = '0' * KEY_LENGTH
+
+HEX_DIGITS = '0123456789abcdef'
+
+def next_prefix(prefix):
+    ''' return the least byte string greater than all strings started with 
+    prefix, None if there's no such string
+    '''
+    prefix = prefix.rstrip('\xff')
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+class ZeroFillKeyCodec(object):
+    ''' ZeroFillKeyCodec
+
+    integers are converted to strings, all keys are zero-filled to KEY_LENGTH
+    characters. The codec of collections created by kvlite before key codecs,
+    keys should be hex strings for MySQL and compact SQLite layout
+    '''
+    name = 'zfill'
+
+    # prepared keys are hex strings
+    HEX = True
+
+    @staticmethod
+    def encode(key):
+        ''' return prepared key
+        '''
+        _key = key
+        if isinstance(_key, (int, long)):
+            _key = str(key)
+        if len(_key) > KEY_LENGTH:
+            raise RuntimeError('The length of key is more than %d bytes' % (KEY_LENGTH))
+        return _key.zfill(KEY_LENGTH)
+
+    @staticmethod
+    def decode(_key):
+        ''' return key by prepared key, zero-filled keys are returned as is
+        '''
+        return _key
+
+    @staticmethod
+    def is_valid(_key):
+        ''' check prepared key
+        '''
+        return len(_key) == KEY_LENGTH
+
+    @staticmethod
+    def prefix_range(prefix):
+        ''' return the range [from, to) of prepared keys started with prefix, 
+        `to` is None if there's no upper bound
+
+        prefix should be a hex string in lower case, keys are compared as 
+        zero-filled hex strings
+        '''
+        if isinstance(prefix, unicode):
+            prefix = prefix.encode('utf-8')
+        if not isinstance(prefix, str) or len(prefix) > KEY_LENGTH or \
+                [c for c in prefix if c not in HEX_DIGITS]:
+            raise RuntimeError('Incorrect key prefix, hex string is expected: %s' % prefix)
+        _to = prefix.rstrip('f')
+        if _to:
+            _to = _to[:-1] + HEX_DIGITS[HEX_DIGITS.index(_to[-1]) + 1]
+            _to = _to.ljust(KEY_LENGTH, '0')
+        return (prefix.ljust(KEY_LENGTH, '0'), _to or None)
+
+class OrderedKeyCodec(object):
+    ''' OrderedKeyCodec
+
+    variable-length keys which are sorted in the same order as original keys:
+    integers are stored as fixed-width big-endian numbers, strings as bytes
+    (unicode as utf-8). Integers are sorted before strings. Decoded keys are
+    integers and strings. SQLite only
+    '''
+    name = 'ordered'
+
+    HEX = False
+
+    INT_PREFIX = '\x01'
+    STR_PREFIX = '\x02'
+
+    # integers are shifted to unsigned range to keep the order of negative numbers
+    INT_OFFSET = 2 ** 63
+
+    @staticmethod
+    def encode(key):
+        ''' return prepared key
+        '''
+        if isinstance(key, bool):
+            raise RuntimeError('Incorrect key type: %s' % type(key))
+        if isinstance(key, (int, long)):
+            if not -OrderedKeyCodec.INT_OFFSET <= key < OrderedKeyCodec.INT_OFFSET:
+                raise RuntimeError('The integer key is out of 64-bit range: %s' % key)
+            return OrderedKeyCodec.INT_PREFIX + struct.pack('>Q', key + OrderedKeyCodec.INT_OFFSET)
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        if isinstance(key, str):
+            return OrderedKeyCodec.STR_PREFIX + key
+        raise RuntimeError('Incorrect key type: %s' % type(key))
+
+    @staticmethod
+    def decode(_key):
+        ''' return key by prepared key
+        '''
+        if _key == META_KEY:
+            return _key
+        if _key[:1] == OrderedKeyCodec.INT_PREFIX:
+            return int(struct.unpack('>Q', _key[1:])[0] - OrderedKeyCodec.INT_OFFSET)
+        return _key[1:]
+
+    @staticmethod
+    def is_valid(_key):
+        ''' check prepared key
+        '''
+        if _key[:1] == OrderedKeyCodec.INT_PREFIX:
+            return len(_key) == 9
+        return _key[:1] == OrderedKeyCodec.STR_PREFIX
+
+    @staticmethod
+    def prefix_range(prefix):
+        ''' return the range [from, to) of prepared keys started with prefix, 
+        the prefix is applied to string keys only
+        '''
+        if not isinstance(prefix, (str, unicode)):
+            raise RuntimeError('Incorrect key prefix, string is expected: %s' % prefix)
+        _from = OrderedKeyCodec.encode(prefix)
+        return (_from, next_prefix(_from))
+
+KEY_CODECS = {
+    ZeroFillKeyCodec.name: ZeroFillKeyCodec,
+    OrderedKeyCodec.name: OrderedKeyCodec,
+}
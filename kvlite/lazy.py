@@ -0,0 +1,92 @@
+_NOT_LOADED = object()
+
+# -----------------------------------------------------------------
+# LazyValue class
+# -----------------------------------------------------------------
+class LazyValue(object):
+    ''' LazyValue
+
+    proxy of document returned by get(..., lazy=True). The proxy keeps serialized
+    document and deserializes it on first access to the document, so the cost of
+    deserialization depends on documents used by caller, not on scanned ones.
+
+    for k, v in collection.get(lazy=True):
+        if k.startswith('00ff'):
+            print v['title']
+
+    the document is available as `value`, items, iteration, comparison and other
+    attributes are delegated to the document. Errors of deserialization are
+    raised on first access
+    '''
+    __slots__ = ('_loads', '_key', '_raw', '_value')
+
+    def __init__(self, loads, k, raw):
+        ''' __init__
+
+        loads   - function(prepared key, serialized document)
+        k       - prepared key
+        raw     - serialized document
+        '''
+        self._loads = loads
+        self._key = k
+        self._raw = raw
+        self._value = _NOT_LOADED
+
+    @property
+    def loaded(self):
+        ''' return True if the document is deserialized
+        '''
+        return self._value is not _NOT_LOADED
+
+    @property
+    def raw(self):
+        ''' return serialized document
+        '''
+        return self._raw
+
+    @property
+    def value(self):
+        ''' return deserialized document
+        '''
+        if self._value is _NOT_LOADED:
+            self._value = self._loads(self._key, self._raw)
+            self._raw = None
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.value, name)
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __setitem__(self, key, value):
+        self.value[key] = value
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __nonzero__(self):
+        return bool(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyValue):
+            other = other.value
+        return self.value == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __repr__(self):
+        return repr(self.value)
+
+    def __str__(self):
+        return str(self.value)
@@ -0,0 +1,296 @@
+import time
+import threading
+
+# the list of created pools, see get_pool()
+POOLS = dict()
+POOLS_LOCK = threading.Lock()
+
+# statements which are not changing data and can be executed out of transaction
+READ_STATEMENTS = ('SELECT', 'SHOW')
+
+# MySQL client errors of broken connection: server has gone away, lost connection
+# to server during query, lost connection to server at handshake
+DISCONNECT_ERRORS = (2006, 2013, 2055)
+
+def is_disconnect(err):
+    ''' return True if the error of statement means that the connection is broken
+    '''
+    args = getattr(err, 'args', None) or (None,)
+    return args[0] in DISCONNECT_ERRORS
+
+# -----------------------------------------------------------------
+# ConnectionPool class
+# -----------------------------------------------------------------
+class ConnectionPool(object):
+    ''' ConnectionPool
+
+    thread-safe pool of database connections
+    '''
+    def __init__(self, connect, size=5, recycle=3600, timeout=30, ping=10):
+        ''' __init__
+
+        connect - function without arguments, returns new connection
+        size    - max amount of connections
+        recycle - idle connection is reopened after `recycle` seconds
+        timeout - how many seconds to wait for free connection
+        ping    - idle connection is checked by ping() after `ping` seconds
+        '''
+        self._connect = connect
+        self._size = int(size)
+        self._recycle = float(recycle)
+        self._timeout = float(timeout)
+        self._ping = float(ping)
+
+        self._idle = list()
+        self._created = 0
+        self._lock = threading.Condition()
+
+    @property
+    def size(self):
+        ''' return max amount of connections
+        '''
+        return self._size
+
+    @property
+    def options(self):
+        ''' return pool options: size, recycle, timeout, ping
+        '''
+        return {'size': self._size, 'recycle': self._recycle, 'timeout': self._timeout, 'ping': self._ping}
+
+    @property
+    def created(self):
+        ''' return amount of opened connections
+        '''
+        return self._created
+
+    @property
+    def idle(self):
+        ''' return amount of idle connections
+        '''
+        return len(self._idle)
+
+    def checkout(self):
+        ''' return connection from pool, new connection is opened if there's no
+        idle connections and the pool is not full
+        '''
+        deadline = time.time() + self._timeout
+        with self._lock:
+            while True:
+                if self._idle:
+                    conn, since = self._idle.pop()
+                    break
+                if self._created < self._size:
+                    self._created += 1
+                    conn, since = None, None
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError('Connection pool is exhausted, size: %d' % self._size)
+                self._lock.wait(remaining)
+        try:
+            if conn is not None:
+                idle_time = time.time() - since
+                if idle_time > self._recycle or (idle_time > self._ping and not self._is_alive(conn)):
+                    self._close(conn)
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+        except:
+            with self._lock:
+                self._created -= 1
+                self._lock.notify()
+            raise
+        return conn
+
+    def checkin(self, conn):
+        ''' return connection to pool
+        '''
+        with self._lock:
+            self._idle.append((conn, time.time()))
+            self._lock.notify()
+
+    def discard(self, conn):
+        ''' close broken connection
+        '''
+        self._close(conn)
+        with self._lock:
+            self._created -= 1
+            self._lock.notify()
+
+    def close(self):
+        ''' close idle connections
+        '''
+        with self._lock:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+                self._created -= 1
+
+    @staticmethod
+    def _is_alive(conn):
+        ''' check connection
+        '''
+        try:
+            conn.ping()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        ''' close connection
+        '''
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+# -----------------------------------------------------------------
+# PooledConnection class
+# -----------------------------------------------------------------
+class PooledConnection(object):
+    ''' PooledConnection
+
+    connection-like object for collections and managers. Pooled connections
+    are in autocommit mode, the transaction is started by first statement
+    which changes data and the real connection is checked out from the pool
+    till commit(), rollback() or close(). Read statements out of transaction
+    return the connection to pool right after execution.
+    '''
+    def __init__(self, pool):
+        ''' __init__
+        '''
+        self._pool = pool
+        self._conn = None
+        self._in_transaction = False
+
+    def cursor(self):
+        ''' return cursor
+        '''
+        return PooledCursor(self)
+
+    def _acquire(self, write):
+        ''' return real connection, start transaction for write statements
+        '''
+        if self._conn is None:
+            self._conn = self._pool.checkout()
+        if write and not self._in_transaction:
+            self._conn.cursor().execute('BEGIN;')
+            self._in_transaction = True
+        return self._conn
+
+    def _release(self, discard=False):
+        ''' return real connection to pool
+        '''
+        if self._conn is not None:
+            if discard:
+                self._pool.discard(self._conn)
+            else:
+                self._pool.checkin(self._conn)
+        self._conn = None
+        self._in_transaction = False
+
+    def _finish(self, method):
+        ''' finish transaction by commit or rollback and release connection
+        '''
+        if self._conn is None:
+            return
+        try:
+            getattr(self._conn, method)()
+        except:
+            self._release(discard=True)
+            raise
+        self._release()
+
+    def commit(self):
+        ''' commit
+        '''
+        self._finish('commit')
+
+    def rollback(self):
+        ''' rollback
+        '''
+        self._finish('rollback')
+
+    def close(self):
+        ''' rollback not committed changes and return connection to pool
+        '''
+        try:
+            self.rollback()
+        except Exception:
+            pass
+
+# -----------------------------------------------------------------
+# PooledCursor class
+# -----------------------------------------------------------------
+class PooledCursor(object):
+    ''' PooledCursor
+
+    cursor for PooledConnection, results are stored on client side
+    so fetch methods can be used after connection release
+    '''
+    def __init__(self, connection):
+        ''' __init__
+        '''
+        self._connection = connection
+        self._cursor = None
+
+    @staticmethod
+    def is_write(sql):
+        ''' return True if the statement changes data or locks rows
+        '''
+        statement = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+        if statement not in READ_STATEMENTS:
+            return True
+        sql = sql.upper()
+        return 'FOR UPDATE' in sql or 'LOCK IN SHARE MODE' in sql
+
+    def _execute(self, method, sql, args):
+        ''' execute statement by real cursor
+        '''
+        write = self.is_write(sql)
+        self._cursor = self._connection._acquire(write).cursor()
+        try:
+            result = getattr(self._cursor, method)(sql, args)
+        except Exception, err:
+            # the connection is returned to pool after errors of statement, 
+            # e.g. missing table, broken connection is closed
+            if not self._connection._in_transaction:
+                self._connection._release(discard=is_disconnect(err))
+            raise
+        if not self._connection._in_transaction:
+            self._connection._release()
+        return result
+
+    def execute(self, sql, args=None):
+        ''' execute statement
+        '''
+        return self._execute('execute', sql, args)
+
+    def executemany(self, sql, args):
+        ''' execute statement for the sequence of args
+        '''
+        return self._execute('executemany', sql, args)
+
+    def __getattr__(self, name):
+        ''' fetchone(), fetchall(), rowcount, ... from real cursor
+        '''
+        if self._cursor is None:
+            raise AttributeError(name)
+        return getattr(self._cursor, name)
+
+def get_pool(key, connect, **options):
+    ''' return connection pool by key, new pool is created with options if it does not exist,
+    see details in ConnectionPool. RuntimeError is raised if the options differ from 
+    the options of existing pool
+    '''
+    with POOLS_LOCK:
+        if key not in POOLS:
+            POOLS[key] = ConnectionPool(connect, **options)
+        pool = POOLS[key]
+    existing = pool.options
+    conflicts = sorted([name for name, value in options.items() if existing.get(name) <> value])
+    if conflicts:
+        raise RuntimeError('The connection pool is created with other options: %s' % 
+                            ', '.join(['%s=%s' % (name, existing.get(name)) for name in conflicts]))
+    return pool
@@ -1,5 +1,8 @@
+import re
 import json
 import zlib
+import struct
+import marshal
 
 import cPickle as pickle
 
@@ -45,4 +48,192 @@ class CompressedJsonSerializer(object):
         '''
         return json.loads(zlib.decompress(v))
 
+# -----------------------------------------------------------------
+# MarshalSerializer class
+# -----------------------------------------------------------------
+
+class MarshalSerializer(object):
+    ''' MarshalSerializer 
+
+    fast binary format of standard Python module `marshal`, supports plain 
+    documents only: dict, list, tuple, str, unicode, int, long, float, bool 
+    and None. The format is stable within Python 2.x
+    '''
+
+    # marshal format version
+    VERSION = 2
+
+    @staticmethod
+    def dumps(v):
+        ''' dumps value 
+        '''
+        try:
+            return marshal.dumps(v, MarshalSerializer.VERSION)
+        except ValueError, err:
+            raise RuntimeError('The value cannot be serialized by marshal, %s' % err)
+
+    @staticmethod
+    def loads(v):
+        ''' loads value  
+        '''
+        return marshal.loads(str(v))
+
+# -----------------------------------------------------------------
+# ZdictJsonSerializer class
+# -----------------------------------------------------------------
 
+# JSON fragments used for dictionary training: keys with leading delimiter, 
+# strings, numbers and literals
+ZDICT_FRAGMENTS = re.compile(r'[{,\[]?\s*"(?:[^"\\]|\\.)*"\s*:?\s*|-?\d[\d.eE+-]*|true|false|null')
+
+# max size of dictionary, zlib window is 32KB
+ZDICT_SIZE = 32 * 1024
+
+def train_zdict(texts, size=ZDICT_SIZE):
+    ''' return zlib preset dictionary built from sample texts
+
+    the dictionary is made of JSON fragments found in more than one sample, 
+    the most frequent fragments are placed at the end of dictionary where 
+    they are referenced by shorter distances
+    '''
+    counts = dict()
+    for text in texts:
+        for fragment in set(ZDICT_FRAGMENTS.findall(text)):
+            counts[fragment] = counts.get(fragment, 0) + 1
+    fragments = sorted([f for f, c in counts.items() if c > 1], key=lambda f: (counts[f], f))
+    return ''.join(fragments)[-size:]
+
+class ZdictJsonSerializer(object):
+    ''' ZdictJsonSerializer 
+
+    JSON format compressed by zlib with preset dictionary trained on documents 
+    of collection, see BaseCollection.train_dictionary(). Dictionaries are stored 
+    in collection metadata as `zdict` by versions, every value starts with 
+    2-byte version of dictionary used for compression (0 - no dictionary), 
+    so values compressed by previous dictionaries can be read after retraining.
+
+    The preset dictionary is made by priming raw deflate stream with dictionary, 
+    the primed compressor/decompressor is copied for every value
+    '''
+    # the size of version header
+    HEADER = struct.Struct('>H')
+
+    def __init__(self, dictionaries=None, version=0):
+        ''' __init__
+
+        dictionaries    - {version: dictionary}
+        version         - the version of dictionary used for compression
+        '''
+        self.dictionaries = dict(dictionaries or dict())
+        if version and version not in self.dictionaries:
+            raise RuntimeError('Unknown dictionary version: %s' % version)
+        self.version = version
+        self._compressors = dict()
+        self._decompressors = dict()
+
+    def __getstate__(self):
+        ''' return state for pickling, primed compressors are not pickled
+        '''
+        return {'dictionaries': self.dictionaries, 'version': self.version}
+
+    def __setstate__(self, state):
+        ''' restore pickled state
+        '''
+        self.__init__(state['dictionaries'], state['version'])
+
+    @classmethod
+    def from_meta(cls, meta):
+        ''' return serializer with dictionaries from collection metadata
+        '''
+        zdict = (meta or dict()).get('zdict', dict())
+        return cls(zdict.get('dictionaries'), zdict.get('version', 0))
+
+    def to_meta(self, meta):
+        ''' store dictionaries in collection metadata
+        '''
+        meta['zdict'] = {'version': self.version, 'dictionaries': self.dictionaries}
+        return meta
+
+    def train(self, docs, size=ZDICT_SIZE):
+        ''' return serializer with new version of dictionary trained on documents
+        '''
+        zdict = train_zdict([json.dumps(doc) for doc in docs], size)
+        if not zdict:
+            raise RuntimeError('There are no repeated fragments in sample documents')
+        version = max(self.dictionaries.keys() or [0]) + 1
+        if version >= 2 ** 16:
+            raise RuntimeError('The amount of dictionary versions is exceeded')
+        dictionaries = dict(self.dictionaries)
+        dictionaries[version] = zdict
+        return ZdictJsonSerializer(dictionaries, version)
+
+    def _compressor(self, version):
+        ''' return compressor primed with dictionary
+        '''
+        if version not in self._compressors:
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+            if version:
+                compressor.compress(self.dictionaries[version])
+                compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._compressors[version] = compressor
+        return self._compressors[version].copy()
+
+    def _decompressor(self, version):
+        ''' return decompressor primed with dictionary
+        '''
+        if version not in self._decompressors:
+            if version and version not in self.dictionaries:
+                raise RuntimeError('Unknown dictionary version: %s' % version)
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            if version:
+                decompressor.decompress(compressor.compress(self.dictionaries[version]) + \
+                                        compressor.flush(zlib.Z_SYNC_FLUSH))
+            self._decompressors[version] = decompressor
+        return self._decompressors[version].copy()
+
+    def dumps(self, v):
+        ''' dumps value 
+        '''
+        compressor = self._compressor(self.version)
+        return self.HEADER.pack(self.version) + compressor.compress(json.dumps(v)) + compressor.flush()
+
+    def loads(self, v):
+        ''' loads value  
+        '''
+        v = str(v)
+        version = self.HEADER.unpack(v[:self.HEADER.size])[0]
+        decompressor = self._decompressor(version)
+        return json.loads(decompressor.decompress(v[self.HEADER.size:]) + decompressor.flush())
+
+# -----------------------------------------------------------------
+# Serializers registry
+# -----------------------------------------------------------------
+
+SERIALIZERS = {
+    'pickle': cPickleSerializer,
+    'completed_json': CompressedJsonSerializer,
+    'marshal': MarshalSerializer,
+    'zdict_json': ZdictJsonSerializer,
+}
+
+def register_serializer(name, serializer):
+    ''' register serializer by name, the name is stored in collection metadata 
+    and used by kvlite.open() to select serializer of existing collection
+
+    serializer - the class or module with methods or functions `dumps` and `loads`. 
+        The serializer configured by collection metadata should have class method 
+        `from_meta(meta)` which returns serializer object, see ZdictJsonSerializer
+    '''
+    if not hasattr(serializer, 'dumps') or not hasattr(serializer, 'loads'):
+        raise RuntimeError('Serializer should have dumps() and loads(), %s' % name)
+    if name in SERIALIZERS and SERIALIZERS[name] is not serializer:
+        raise RuntimeError('Serializer is already registered: %s' % name)
+    SERIALIZERS[name] = serializer
+
+def get_serializer(name):
+    ''' return registered serializer by name
+    '''
+    if name not in SERIALIZERS:
+        raise RuntimeError('Unknown serializer: %s' % name)
+    return SERIALIZERS[name]
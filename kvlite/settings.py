@@ -1,7 +1,6 @@
 import types
 
-from kvlite.serializers import cPickleSerializer
-from kvlite.serializers import CompressedJsonSerializer
+from kvlite.serializers import SERIALIZERS
 
 # ITEMS_PER_REQUEST is used in Collection._get_many()
 ITEMS_PER_REQUEST = 100
@@ -11,6 +10,32 @@ KEY_LENGTH = 40
     
 SUPPORTED_BACKENDS = ['mysql', 'sqlite', ]
 
+# SQLite URI options, {option: (PRAGMA name, allowed values or type)}
+SQLITE_OPTIONS = {
+    'journal': ('journal_mode', ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')),
+    'synchronous': ('synchronous', ('off', 'normal', 'full', 'extra')),
+    'mmap_size': ('mmap_size', int),
+    'cache_size': ('cache_size', int),
+    'busy_timeout': ('busy_timeout', int),
+}
+
+# named sets of SQLite URI options, the options defined in URI override profile
+SQLITE_PROFILES = {
+    # readers don't block writer, every commit is synced to disk
+    'durable': {
+        'journal': 'wal', 'synchronous': 'full', 'busy_timeout': 5000,
+    },
+    # commits are synced at checkpoints only, last commits can be lost on power failure
+    'fast': {
+        'journal': 'wal', 'synchronous': 'normal', 'busy_timeout': 5000,
+        'cache_size': -65536, 'mmap_size': 268435456,
+    },
+    # for initial loading of data, database can be corrupted on crash
+    'bulk-load': {
+        'journal': 'memory', 'synchronous': 'off', 'cache_size': -262144,
+    },
+}
+
 SUPPORTED_VALUE_TYPES = {
     types.NoneType: {
         'name': 'none_type',
@@ -51,10 +76,9 @@ SUPPORTED_VALUE_TYPES = {
 # SERIALIZERS 
 # -----------------------------------------------------------------
 ''' the name of class or module to serialize msgs with, must have methods or 
-functions named ``dumps`` and ``loads``, cPickleSerializer is the default
+functions named ``dumps`` and ``loads``, cPickleSerializer is the default.
+The registry is kvlite.serializers.SERIALIZERS, new serializers are added by 
+kvlite.serializers.register_serializer()
 '''
-SERIALIZERS = {
-    'pickle': cPickleSerializer,
-    'completed_json': CompressedJsonSerializer,
-}
+DEFAULT_SERIALIZER = 'pickle'
 
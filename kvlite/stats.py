@@ -0,0 +1,328 @@
+import time
+import types
+import functools
+
+from timeit import default_timer
+
+# the amount of histogram buckets, the bucket i counts latencies in range
+# [2 ** (i-1), 2 ** i) microseconds, up to 2 ** 40 us (~12 days)
+BUCKETS = 41
+
+# phases of operations
+PHASES = ('sql', 'fetch', 'decode', 'encode')
+
+# the name of operation for phases made outside of instrumented methods
+OTHER = 'other'
+
+# -----------------------------------------------------------------
+# Histogram class
+# -----------------------------------------------------------------
+class Histogram(object):
+    ''' Histogram
+
+    latency histogram with power of 2 buckets in microseconds, the cost
+    of add() does not depend on the amount of values. Only bucket counters and
+    the total are updated by add(), percentiles are upper bounds of buckets
+    '''
+    __slots__ = ('counts', 'total')
+
+    def __init__(self):
+
+        self.counts = [0] * BUCKETS
+        self.total = 0.0
+
+    def add(self, seconds):
+        ''' add latency in seconds
+        '''
+        self.counts[int(seconds * 1000000).bit_length()] += 1
+        self.total += seconds
+
+    def update(self, histogram):
+        ''' add values of histogram dictionary, see to_dict()
+        '''
+        for bound, n in histogram['buckets'].items():
+            self.counts[int(bound).bit_length() - 1] += n
+        self.total += histogram['total']
+
+    @property
+    def count(self):
+        ''' return the amount of values
+        '''
+        return sum(self.counts)
+
+    def percentile(self, percent):
+        ''' return the upper bound of the bucket with percentile in seconds,
+        None if the histogram is empty
+        '''
+        count = self.count
+        if not count:
+            return None
+        rank = count * percent / 100.0
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return (2 ** i) / 1000000.0
+
+    def to_dict(self):
+        ''' return histogram as dictionary, latencies in seconds, `buckets` are
+        {upper bound in microseconds: count} of not empty buckets
+        '''
+        count = self.count
+        return {
+            'count': count,
+            'total': self.total,
+            'mean': self.total / count if count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.percentile(100),
+            'buckets': dict((2 ** i, n) for i, n in enumerate(self.counts) if n),
+        }
+
+# -----------------------------------------------------------------
+# Operation class
+# -----------------------------------------------------------------
+class Operation(object):
+    ''' Operation
+
+    counters of operation: errors, latency histogram of calls, histograms of
+    phases, read and written bytes
+    '''
+    __slots__ = ('errors', 'latency', 'bytes_read', 'bytes_written') + PHASES
+
+    def __init__(self):
+
+        self.errors = 0
+        self.latency = Histogram()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        for phase in PHASES:
+            setattr(self, phase, Histogram())
+
+    @property
+    def used(self):
+        ''' return True if any counter is not empty
+        '''
+        return bool(self.latency.count or self.bytes_read or self.bytes_written
+                    or [phase for phase in PHASES if getattr(self, phase).count])
+
+    def to_dict(self, uptime):
+        ''' return counters as dictionary, `rate` is calls per second of uptime
+        '''
+        count = self.latency.count
+        phases = dict((phase, getattr(self, phase)) for phase in PHASES)
+        return {
+            'count': count,
+            'errors': self.errors,
+            'rate': count / uptime if uptime > 0 else None,
+            'latency': self.latency.to_dict(),
+            'phases': dict((name, h.to_dict()) for name, h in phases.items() if h.count),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+        }
+
+# -----------------------------------------------------------------
+# Stats class
+# -----------------------------------------------------------------
+class Stats(object):
+    ''' Stats
+
+    statistics of collection object: operations, latency and phases (sql, fetch,
+    decode, encode) of operations, read and written bytes. Phases are accounted
+    to the innermost running operation, e.g. SQL of get() by key is accounted to
+    get_one, phases outside of operations are accounted to `other`. The latency
+    of iterators is the time spent in the iterator, the time of caller between
+    items is not included.
+
+    Stats is not thread-safe, like collection object it should be used by one thread
+    '''
+    def __init__(self):
+
+        self.reset()
+
+    def reset(self):
+        ''' reset all counters
+        '''
+        # the innermost running operation
+        self.current = Operation()
+        self.operations = {OTHER: self.current}
+        self.started = time.time()
+
+    def operation(self, name):
+        ''' return counters of operation by name
+        '''
+        try:
+            return self.operations[name]
+        except KeyError:
+            return self.operations.setdefault(name, Operation())
+
+    def iterate(self, operation, iterator, seconds):
+        ''' iterate over items of iterator returned by operation, `seconds` is
+        the time of operation call
+        '''
+        timer = default_timer
+        next_item = iterator.next
+        try:
+            while True:
+                previous = self.current
+                self.current = operation
+                started = timer()
+                try:
+                    item = next_item()
+                except StopIteration:
+                    seconds += timer() - started
+                    self.current = previous
+                    break
+                except:
+                    self.current = previous
+                    operation.errors += 1
+                    operation.latency.add(seconds + timer() - started)
+                    seconds = None
+                    raise
+                seconds += timer() - started
+                self.current = previous
+                yield item
+        finally:
+            # the iterator is finished or closed by caller
+            if seconds is not None:
+                operation.latency.add(seconds)
+
+    def to_dict(self):
+        ''' return statistics as dictionary
+        '''
+        uptime = time.time() - self.started
+        operations = dict((name, op) for name, op in self.operations.items() if op.used)
+        return {
+            'uptime': uptime,
+            'operations': dict((name, op.to_dict(uptime)) for name, op in operations.items()),
+            'bytes_read': sum(op.bytes_read for op in operations.values()),
+            'bytes_written': sum(op.bytes_written for op in operations.values()),
+        }
+
+def merge(results):
+    ''' return statistics merged from the list of statistics dictionaries, 
+    e.g. of collection objects opened by different threads, see BaseCollection.stats()
+    '''
+    merged = Stats()
+    merged.started = time.time() - max([result['uptime'] for result in results] or [0])
+    cache = dict()
+    for result in results:
+        for name, counters in result['operations'].items():
+            operation = merged.operation(name)
+            operation.errors += counters['errors']
+            operation.bytes_read += counters['bytes_read']
+            operation.bytes_written += counters['bytes_written']
+            operation.latency.update(counters['latency'])
+            for phase, histogram in counters['phases'].items():
+                getattr(operation, phase).update(histogram)
+        for name, value in result.get('cache', dict()).items():
+            cache[name] = cache.get(name, 0) + value
+    result = merged.to_dict()
+    if cache:
+        result['cache'] = cache
+    return result
+
+def instrumented(name):
+    ''' decorator of collection method, the calls of method are accounted as
+    operation `name` in collection statistics, see Stats
+    '''
+    def decorator(method):
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stats = self._stats
+            try:
+                operation = stats.operations[name]
+            except KeyError:
+                operation = stats.operation(name)
+            previous = stats.current
+            stats.current = operation
+            started = default_timer()
+            try:
+                result = method(self, *args, **kwargs)
+            except:
+                stats.current = previous
+                operation.errors += 1
+                operation.latency.add(default_timer() - started)
+                raise
+            stats.current = previous
+            if type(result) is types.GeneratorType:
+                return stats.iterate(operation, result, default_timer() - started)
+            operation.latency.add(default_timer() - started)
+            return result
+        return wrapper
+    return decorator
+
+# -----------------------------------------------------------------
+# StatsCursor class
+# -----------------------------------------------------------------
+class StatsCursor(object):
+    ''' StatsCursor
+
+    database cursor accounting execute() as `sql` phase and fetch*() as `fetch`
+    phase of current operation, the size of fetched strings is accounted as
+    read bytes. Other attributes are delegated to cursor
+    '''
+    def __init__(self, cursor, stats):
+
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, *args):
+        started = default_timer()
+        try:
+            return self._cursor.execute(*args)
+        finally:
+            self._stats.current.sql.add(default_timer() - started)
+
+    def executemany(self, *args):
+        started = default_timer()
+        try:
+            return self._cursor.executemany(*args)
+        finally:
+            self._stats.current.sql.add(default_timer() - started)
+
+    def fetchone(self):
+        started = default_timer()
+        row = self._cursor.fetchone()
+        operation = self._stats.current
+        operation.fetch.add(default_timer() - started)
+        if row is not None:
+            operation.bytes_read += _size((row,))
+        return row
+
+    def fetchmany(self, *args):
+        started = default_timer()
+        rows = self._cursor.fetchmany(*args)
+        operation = self._stats.current
+        operation.fetch.add(default_timer() - started)
+        operation.bytes_read += _size(rows)
+        return rows
+
+    def fetchall(self):
+        started = default_timer()
+        rows = self._cursor.fetchall()
+        operation = self._stats.current
+        operation.fetch.add(default_timer() - started)
+        operation.bytes_read += _size(rows)
+        return rows
+
+# types of values accounted as read bytes
+_SIZED = (str, buffer, unicode)
+
+def _size(rows):
+    ''' return the size of strings in rows
+    '''
+    size = 0
+    for row in rows:
+        for value in row:
+            if type(value) in _SIZED:
+                size += len(value)
+    return size
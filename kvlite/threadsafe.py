@@ -0,0 +1,200 @@
+import time
+import Queue
+import kvlite
+import threading
+
+from kvlite.aio import Future
+from kvlite.managers import SqliteCollectionManager
+
+# -----------------------------------------------------------------
+# ThreadSafeCollection class
+# -----------------------------------------------------------------
+class ThreadSafeCollection(object):
+    ''' ThreadSafeCollection
+
+    collection shared between threads. Reads are executed by the calling thread
+    with own connection, opened on first read. put() and delete() requests from
+    all threads are queued to the writer thread which executes them in shared
+    transactions (group commit): the writer takes all queued requests, up to
+    `batch_rows` requests or `interval` seconds after the first one, and commits
+    them by one transaction. put() and delete() return futures which are completed
+    after commit.
+
+    the database is switched to WAL journal, so readers are not blocked by the
+    writer. If the transaction is failed, requests are repeated in separate
+    transactions and only failed requests are completed with error. Other writes
+    (metadata, indexes) should be made by separate collection object
+    '''
+    def __init__(self, uri, batch_rows=1000, interval=0.005, queue_size=10000, **kwargs):
+        ''' __init__
+
+        uri         - collection URI
+        batch_rows  - max amount of requests per transaction
+        interval    - how many seconds the writer waits for next requests
+        queue_size  - max amount of queued requests, put() and delete() are
+                    blocked if the queue is full
+        kwargs      - parameters of kvlite.open()
+        '''
+        if not uri.startswith('sqlite://'):
+            raise RuntimeError('Thread-safe mode is supported by SQLite only: %s' % uri)
+        if SqliteCollectionManager.parse_uri(uri)['db'] == ':memory:':
+            raise RuntimeError('Memory database cannot be shared between connections: %s' % uri)
+        if kwargs.get('cache') is not None:
+            raise RuntimeError('Cache is not supported, changes of writer thread are not visible to caches of readers')
+        self._uri = uri
+        self._kwargs = kwargs
+        self._batch_rows = int(batch_rows)
+        self._interval = float(interval)
+
+        collection = kvlite.open(uri, **kwargs)
+        collection.commit()
+        collection._cursor.execute('PRAGMA journal_mode=WAL;')
+        collection.close()
+
+        self._local = threading.local()
+        # reader collections of all threads, closed by close()
+        self._readers = list()
+        self._lock = threading.Lock()
+        self._requests = Queue.Queue(queue_size)
+        self._writer = threading.Thread(target=self._write_loop)
+        self._writer.daemon = True
+        self._writer.start()
+        self._closed = False
+        self.transactions = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def _reader(self):
+        ''' return collection of current thread
+        '''
+        if not hasattr(self._local, 'collection'):
+            # the reader is closed by close() called from any thread
+            collection = kvlite.open(self._uri, check_same_thread=False, **self._kwargs)
+            with self._lock:
+                if self._closed:
+                    collection.close()
+                    raise RuntimeError('The collection is closed')
+                self._readers.append(collection)
+            self._local.collection = collection
+        return self._local.collection
+
+    def __getattr__(self, name):
+        ''' return the attribute of current thread collection, e.g. get(), count
+        '''
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._reader, name)
+
+    def __iter__(self):
+        ''' iterate over collection of current thread
+        '''
+        return iter(self._reader)
+
+    def put(self, *kv):
+        ''' queue put() to writer thread, returns the future of the amount of
+        written documents
+        '''
+        return self._request(lambda c: c.put(*kv))
+
+    def delete(self, k):
+        ''' queue delete(k) to writer thread, returns future
+        '''
+        return self._request(lambda c: c.delete(k))
+
+    def commit(self):
+        ''' returns the future completed when all queued requests are committed,
+        requests are committed by writer thread without commit() call
+        '''
+        return self._request(lambda c: None)
+
+    def _request(self, func):
+        ''' queue func(collection) to writer thread
+        '''
+        if self._closed:
+            raise RuntimeError('The collection is closed')
+        future = Future()
+        self._requests.put((future, func))
+        return future
+
+    def _batch(self):
+        ''' return the list of requests for next transaction, None to stop writer
+        '''
+        request = self._requests.get()
+        if request is None:
+            return None
+        batch = [request, ]
+        deadline = time.time() + self._interval
+        while len(batch) < self._batch_rows:
+            try:
+                request = self._requests.get(timeout=max(deadline - time.time(), 0))
+            except Queue.Empty:
+                break
+            if request is None:
+                # stop after this batch
+                self._requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _write_loop(self):
+        ''' execute queued requests by shared transactions
+        '''
+        collection = kvlite.open(self._uri, **self._kwargs)
+        try:
+            while True:
+                batch = self._batch()
+                if batch is None:
+                    break
+                try:
+                    results = [func(collection) for _, func in batch]
+                    collection.commit()
+                except Exception:
+                    collection._rollback()
+                    results = None
+                self.transactions += 1
+                if results is not None:
+                    for (future, _), result in zip(batch, results):
+                        future.set_result(result)
+                    continue
+                # the transaction is failed, requests are repeated one by one
+                for future, func in batch:
+                    try:
+                        result = func(collection)
+                        collection.commit()
+                    except Exception, err:
+                        collection._rollback()
+                        future.set_exception(err)
+                    else:
+                        future.set_result(result)
+                    self.transactions += 1
+        finally:
+            collection.close()
+
+    def close(self):
+        ''' wait for queued requests and stop writer thread, reader collections
+        of all threads are closed
+        '''
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            readers, self._readers = self._readers, list()
+        self._requests.put(None)
+        self._writer.join()
+        for collection in readers:
+            collection.close()
+        if hasattr(self._local, 'collection'):
+            del self._local.collection
+
+def open(uri, batch_rows=1000, interval=0.005, queue_size=10000, **kwargs):
+    ''' open SQLite collection shared between threads, see ThreadSafeCollection
+
+    kwargs - parameters of kvlite.open(): serializer_name, key_codec
+    '''
+    return ThreadSafeCollection(uri, batch_rows=batch_rows, interval=interval,
+                                queue_size=queue_size, **kwargs)
@@ -2,11 +2,18 @@ import uuid
 import kvlite
 import random
 import string
+import multiprocessing
 
 
-from kvlite.settings import SERIALIZERS
+from kvlite.settings import DEFAULT_SERIALIZER
+from kvlite.settings import ITEMS_PER_REQUEST
 from kvlite.settings import SUPPORTED_VALUE_TYPES
 
+from kvlite.serializers import get_serializer
+
+from kvlite.keys import KEY_CODECS
+from kvlite.keys import ZeroFillKeyCodec
+
 from kvlite.managers import CollectionManager
 from kvlite.collections import MysqlCollection
 from kvlite.collections import SqliteCollection
@@ -14,30 +21,66 @@ from kvlite.collections import SqliteCollection
 # -----------------------------------------------------------------
 # KVLite utils
 # -----------------------------------------------------------------
-def open(uri, serializer_name='pickle'):
+def open(uri, serializer_name=None, cache=None, key_codec=None, check_same_thread=True):
     ''' open collection by URI, 
     
     if collection does not exist kvlite will try to create it
         
-    serializer_name: see details in SERIALIZERS section
+    serializer_name: the name of serializer for new collection, `pickle` by default, 
+        see kvlite.serializers.SERIALIZERS. The serializer of existing collection 
+        is taken from metadata
+    cache: kvlite.cache.LRUCache object for documents read by key
+    key_codec: the name of key codec for new collection, see kvlite.keys. The codec 
+        of existing collection is taken from metadata
+    check_same_thread: SQLite only, if False the connection can be used and closed
+        by other threads, the calls should be serialized by caller
 
     returns MysqlCollection or SqliteCollection object in case of successful 
     opening or creation new collection    
     '''
     # TODO use `None` for serializer to store messages in plain text, suitable for strings, integers, etc
 
-    manager = CollectionManager(uri)
+    manager = CollectionManager(uri, check_same_thread)
     params = manager.parse_uri(uri)
-    if params['collection'] not in manager.collections():
+    if params['collection'] not in manager.tables():
         manager.create(params['collection'])
+    else:
+        manager.create_counter(params['collection'])
         
     collection = manager.collection_class(manager.connection, 
                                         params['collection'], 
-                                        SERIALIZERS[serializer_name])
-    if collection.meta is None:
+                                        get_serializer(serializer_name or DEFAULT_SERIALIZER),
+                                        cache, params.get('options'))
+    # metadata is always serialized by pickle
+    meta = collection.meta
+    if meta is not None and meta.get('serializer'):
+        if serializer_name and serializer_name <> meta['serializer']:
+            raise RuntimeError('The collection uses serializer: %s' % meta['serializer'])
+        serializer_name = meta['serializer']
+        collection._serializer = get_serializer(serializer_name)
+    serializer_name = serializer_name or DEFAULT_SERIALIZER
+    # serializer configured by metadata, e.g. compression dictionaries
+    if hasattr(collection._serializer, 'from_meta'):
+        collection._serializer = collection._serializer.from_meta(meta)
+
+    if meta is None:
+        codec_name = key_codec or ZeroFillKeyCodec.name
+    else:
+        # collections created before key codecs use zero-filled keys
+        codec_name = meta.get('key_codec', ZeroFillKeyCodec.name)
+        if key_codec and key_codec <> codec_name:
+            raise RuntimeError('The collection uses key codec: %s' % codec_name)
+    if codec_name not in KEY_CODECS:
+        raise RuntimeError('Unknown key codec: %s' % codec_name)
+    if collection.BACKEND == 'mysql' and codec_name <> ZeroFillKeyCodec.name:
+        raise RuntimeError('Key codec %s is not supported by MySQL' % codec_name)
+    collection.key_codec = KEY_CODECS[codec_name]
+
+    if meta is None:
         collection.meta = {
             'name': params['collection'],
             'serializer': serializer_name,
+            'key_codec': codec_name,
             'kvlite-version': kvlite.__version__,
         } 
     return collection
@@ -50,21 +93,123 @@ def remove(uri):
     if params['collection'] in manager.collections():
         manager.remove(params['collection'])
 
-def copy(source, target):
+def copy(source, target, batch_size=ITEMS_PER_REQUEST, callback=None):
     ''' copy data from source to target
     
     where
         source = Collection object to source
         target = Collection object to target
+        batch_size = how many documents are copied per transaction
+        callback = function(copied, rowid), called after every committed batch
+    
+    documents are read by batches in rowid order, every batch is committed to target 
+    together with rowid checkpoint in target metadata. If copying was interrupted, 
+    the next copy() from the same source continues from the checkpoint. The source is 
+    identified by its location (database and collection), copy() from other source 
+    starts from the beginning.
+    
+    returns the amount of copied documents
     '''
     if not isinstance(source, (MysqlCollection, SqliteCollection)):
         raise RuntimeError('The source should be MysqlCollection or SqliteCollection object, not %s', type(source))
     if not isinstance(target, (MysqlCollection, SqliteCollection)):
         raise RuntimeError('The source should be MysqlCollection or SqliteCollection object, not %s', type(target))
     
-    data = [kv for kv in source]
-    target.put(data)
+    source_name = source.location
+    checkpoint = target.meta.get('copy', dict())
+    if checkpoint.get('source') <> source_name:
+        checkpoint = {'source': source_name, 'rowid': 0, 'copied': 0}
+    rowid, copied = checkpoint['rowid'], checkpoint['copied']
+    max_rowid = source._max_rowid()
+
+    while True:
+        rows = [r for r in source._get_rows(rowid, limit=batch_size) if r[0] <= max_rowid]
+        if not rows:
+            break
+        kv = [(source.key_codec.decode(k), source._loads(k, v)) for _, k, v in rows if k <> source._ZEROS_KEY]
+        if kv:
+            target.put(kv)
+        rowid = rows[-1][0]
+        copied += len(kv)
+
+        meta = target.meta
+        meta['copy'] = {'source': source_name, 'rowid': rowid, 'copied': copied}
+        target.meta = meta
+        target.commit()
+        if callback:
+            callback(copied, rowid)
+
+    meta = target.meta
+    if 'copy' in meta:
+        del meta['copy']
+        target.meta = meta
     target.commit()
+    return copied
+
+def _copy_partition(params):
+    ''' copy documents with rowid in range (rowid_from, rowid_to] from source to 
+    target, used by parallel_copy() in worker process 
+    '''
+    source_uri, source_serializer, target_uri, target_serializer, rowid_from, rowid_to, batch_size = params
+    source = open(source_uri, source_serializer)
+    target = open(target_uri, target_serializer)
+    try:
+        rowid, copied = rowid_from, 0
+        while rowid < rowid_to:
+            rows = [r for r in source._get_rows(rowid, limit=batch_size) if r[0] <= rowid_to]
+            if not rows:
+                break
+            kv = [(source.key_codec.decode(k), source._loads(k, v)) for _, k, v in rows if k <> source._ZEROS_KEY]
+            if kv:
+                target.put(kv)
+                target.commit()
+            rowid = rows[-1][0]
+            copied += len(kv)
+    finally:
+        source.close()
+        target.close()
+    return {'rowid_from': rowid_from, 'rowid_to': rowid_to, 'copied': copied}
+
+def parallel_copy(source_uri, target_uri, processes=None, source_serializer=None, 
+                    target_serializer=None, batch_size=ITEMS_PER_REQUEST):
+    ''' copy data from source to target by worker processes
+    
+    where
+        source_uri = URI of source collection
+        target_uri = URI of target collection
+        processes = the number of worker processes, cpu count by default
+        source_serializer, target_serializer = serializer names, see open()
+        batch_size = how many documents are copied per transaction
+    
+    the source is split by rowid ranges, every range is copied by separate process 
+    with own connections to source and target. Target collection is created if needed.
+    
+    returns the summary: { 
+        'partitions': [{'rowid_from': .., 'rowid_to': .., 'copied': ..}, ...], 
+        'total': .., 
+    }
+    '''
+    processes = processes or multiprocessing.cpu_count()
+
+    source = open(source_uri, source_serializer)
+    bounds = source._rowid_bounds(processes)
+    source.close()
+    open(target_uri, target_serializer).close()
+    
+    partitions = [
+        (source_uri, source_serializer, target_uri, target_serializer, rowid_from, rowid_to, batch_size) 
+        for rowid_from, rowid_to in bounds
+    ]
+    pool = multiprocessing.Pool(processes)
+    try:
+        summary = pool.map(_copy_partition, partitions)
+    finally:
+        pool.close()
+        pool.join()
+    return {
+        'partitions': summary,
+        'total': sum([p['copied'] for p in summary]),
+    }
 
 def get_uuid(amount=100):
     ''' return UUIDs 
@@ -5,6 +5,10 @@ import kvlite
 
 from math import ceil
 from kvlite.webui import settings
+from kvlite.webui.registry import CollectionRegistry
+
+# opened collections, shared by requests
+registry = CollectionRegistry(settings.COLLECTIONS)
 
 
 #
@@ -65,70 +69,89 @@ def get_key():
 @bottle.route('/collection/<name>/page/<page>')
 def get_page(name, page):
     ''' return collection data for specific page
+    
+    the page is selected by continuation token `after` returned as `next` 
+    with previous page, offset is used only if the token is not defined
     '''
     page = int(page)
+    after = bottle.request.query.get('after')
+    if after is None and page == 0:
+        after = ''
+
+    def page_data(collection):
+        last_page = collection.count / settings.ITEMS_PER_PAGE
+        #last_page = int(ceil(collection.count / float(settings.ITEMS_PER_PAGE)))
+        if after is not None:
+            data, next_token = collection.get(after=after, limit=settings.ITEMS_PER_PAGE)
+        else:
+            data = [kv for kv in collection.get(offset=page * settings.ITEMS_PER_PAGE, limit=settings.ITEMS_PER_PAGE)]
+            next_token = None
+        return last_page, data, next_token
+
     try:
-        collection_uri = settings.COLLECTIONS[name]
+        last_page, data, next_token = registry.call(name, page_data)
     except KeyError:
         return {'error': 'The collection %s is not found' % name, 'status': 'NOT OK'}
-    collection = kvlite.open(collection_uri)
-    last_page = collection.count / settings.ITEMS_PER_PAGE
-    #last_page = int(ceil(collection.count / float(settings.ITEMS_PER_PAGE)))
-    data = [kv for kv in collection.get(offset=page * settings.ITEMS_PER_PAGE, limit=settings.ITEMS_PER_PAGE)]
-    collection.close()
+    except RuntimeError, err:
+        return {'error': str(err), 'status': 'NOT OK'}
     return {
                 'status': 'OK', 
                 'last_page': last_page,
                 'data': data,
+                'next': next_token,
+    }
+
+@bottle.route('/stats')
+def get_stats():
+    ''' return statistics of opened collections: operations, latency and 
+    phases histograms, read and written bytes
+    '''
+    return {
+                'status': 'OK',
+                'stats': registry.stats(),
     }
 
 def create_update_item(collection, k, v):
     ''' create or update item
     '''
-    try:
-        collection_uri = settings.COLLECTIONS[collection]
-        collection = kvlite.open(collection_uri)
-    except KeyError:
-        return {'error': 'The collection %s is not found' % name, 'status': 'NOT OK'}
+    if collection not in settings.COLLECTIONS:
+        return {'error': 'The collection %s is not found' % collection, 'status': 'NOT OK'}
+
+    def put(coll):
+        coll.put(k, json.loads(v))
+        coll.commit()
 
     if v:
         try:
-            collection.put(k, json.loads(v))
-            collection.commit()
-            collection.close()
+            registry.call(collection, put)
             return { 'status': 'OK', }
         except Exception, err:
             return {
                 'status': 'Error',
-                'message': err, 
+                'message': str(err), 
             }
 
 def get_item(collection, k):
     ''' get item details   
     '''
     try:
-        collection_uri = settings.COLLECTIONS[collection]
-        collection = kvlite.open(collection_uri)
+        k, v = registry.call(collection, lambda coll: coll.get({'_key': k}))
     except KeyError:
-        return {'error': 'The collection %s is not found' % name, 'status': 'NOT OK'}
-    
-    k, v = collection.get({'_key': k})
-    collection.close()
+        return {'error': 'The collection %s is not found' % collection, 'status': 'NOT OK'}
     return { 'status': 'OK', 'item': {'key': k, 'value': v}, }
     
 def delete_item(collection, k):
     ''' delete item by key
     '''
-    try:
-        collection_uri = settings.COLLECTIONS[collection]
-        collection = kvlite.open(collection_uri)
-    except KeyError:
-        return {'error': 'The collection %s is not found' % name, 'status': 'NOT OK'}
+    if collection not in settings.COLLECTIONS:
+        return {'error': 'The collection %s is not found' % collection, 'status': 'NOT OK'}
+
+    def delete(coll):
+        coll.delete(k)
+        coll.commit()
 
     try:
-        collection.delete(k)
-        collection.commit()
-        collection.close()
+        registry.call(collection, delete)
         return { 'status': 'OK', }
     except:
         return { 'status': 'Error', 'message': 'Cannot delete the item by key', }
@@ -171,6 +194,7 @@ if __name__ == '__main__':
     for param in SETTING_PARAMS:
         if param in dir(custom_settings):
             settings.__dict__[param] = custom_settings.__dict__[param]
+    registry = CollectionRegistry(settings.COLLECTIONS)
     
     bottle.run(
                 host=settings.WEBUI_HOST, 
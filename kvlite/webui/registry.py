@@ -0,0 +1,101 @@
+import sqlite3
+import kvlite
+import weakref
+import threading
+
+from kvlite.stats import merge
+
+# errors after which the collection is reopened, collection methods
+# report database errors as RuntimeError
+try:
+    import MySQLdb
+    DATABASE_ERRORS = (RuntimeError, sqlite3.Error, MySQLdb.Error)
+except ImportError:
+    DATABASE_ERRORS = (RuntimeError, sqlite3.Error, )
+
+# -----------------------------------------------------------------
+# CollectionRegistry class
+# -----------------------------------------------------------------
+class CollectionRegistry(object):
+    ''' CollectionRegistry
+
+    long-lived registry of opened collections. Collection is opened on first
+    request and reused by next requests. Opened collections are stored per
+    thread, so SQLite connections are used only in the thread where they
+    were created.
+    '''
+    def __init__(self, collections):
+        ''' __init__
+
+        collections - dictionary {name: uri}
+        '''
+        self._collections = collections
+        self._local = threading.local()
+        # opened collections of all threads, {(thread id, name): collection}
+        self._opened = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def _handles(self):
+        ''' return opened collections of current thread
+        '''
+        if not hasattr(self._local, 'handles'):
+            self._local.handles = dict()
+        return self._local.handles
+
+    def get(self, name):
+        ''' return opened collection by name, raises KeyError if collection
+        is not defined
+        '''
+        if name not in self._handles:
+            collection = kvlite.open(self._collections[name])
+            # metadata of new collection is written by open(), commit it
+            # to not keep the database locked by long-lived collection
+            collection.commit()
+            self._handles[name] = collection
+            with self._lock:
+                self._opened[(threading.current_thread().ident, name)] = collection
+        return self._handles[name]
+
+    def call(self, name, func):
+        ''' return func(collection)
+
+        if the call is failed by database error, the collection is reopened
+        and the call is repeated once
+        '''
+        try:
+            return func(self.get(name))
+        except DATABASE_ERRORS:
+            self.reset(name)
+        try:
+            return func(self.get(name))
+        except:
+            self.reset(name)
+            raise
+
+    def reset(self, name):
+        ''' close collection, it will be reopened by next request
+        '''
+        collection = self._handles.pop(name, None)
+        if collection is not None:
+            with self._lock:
+                self._opened.pop((threading.current_thread().ident, name), None)
+            collection.close()
+
+    def stats(self):
+        ''' return statistics of opened collections {name: statistics}, the 
+        statistics of collection objects opened by different threads are merged, 
+        see BaseCollection.stats()
+        '''
+        with self._lock:
+            opened = self._opened.items()
+        results = dict()
+        for (_, name), collection in opened:
+            results.setdefault(name, list()).append(collection.stats())
+        return dict((name, merge(stats)) for name, stats in results.items())
+
+    def close(self):
+        ''' close all opened collections of current thread
+        '''
+        for name in self._handles.keys():
+            self.reset(name)
@@ -1,3 +1,6 @@
+// continuation tokens of known pages, page_tokens[N] is used to get page N
+var page_tokens = [""];
+
 $(document).ready( function() {
     get_collections(0);
     
@@ -78,6 +81,7 @@ function get_collections(page) {
                 });
 
                 $("#current-collection").html(collection_name + "<b class=\"caret\">");
+                page_tokens = [""];
                 get_data(collection_name, page);
             });
         }
@@ -87,15 +91,25 @@ function get_collections(page) {
 
 function get_data(collection_name, page) {
 
-    $.getJSON("/collection/" + collection_name + "/page/" + page).done(function(json) {
+    page = parseInt(page);
+    var url = "/collection/" + collection_name + "/page/" + page;
+    if (page < page_tokens.length) {
+        url += "?after=" + encodeURIComponent(page_tokens[page]);
+    };
+    $.getJSON(url).done(function(json) {
 
         $(".collection-data-pages").empty();
         $("#collection-data").empty();
 
         if (json.status == "OK") {
+            if (json.next) {
+                page_tokens[page + 1] = json.next;
+            } else {
+                page_tokens = page_tokens.slice(0, page + 1);
+            };
             if (json.data.length > 0) {
 
-                show_pagination(page, json.last_page);                
+                show_pagination(page, page_tokens.length - 1);                
                 show_data_as_collapse(json.data);
             };
         } else {
@@ -16,7 +16,7 @@ setup(
     long_description = open('README.rst').read(),
     license = "BSD",
     keywords = "key-value python database mysql sqlite wrapper",
-    packages = ['kvlite', 'kvlite.webui'],
+    packages = ['kvlite', 'kvlite.webui', 'kvlite.bench'],
     include_package_data = True,
     classifiers = [
         'Intended Audience :: Developers',
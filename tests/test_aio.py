@@ -0,0 +1,130 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import shutil
+import tempfile
+import time
+import kvlite
+import logging
+import kvlite.aio
+import unittest
+import threading
+
+from kvlite.aio import Future
+
+class KvliteFutureTests(unittest.TestCase):
+
+    def test_future(self):
+
+        future = Future()
+        self.assertFalse(future.done())
+        self.assertRaises(RuntimeError, future.result, 0.01)
+        called = list()
+        future.add_done_callback(called.append)
+        threading.Timer(0.05, future.set_result, (1,)).start()
+        self.assertEqual(future.result(5), 1)
+        self.assertEqual(called, [future])
+        self.assertRaises(RuntimeError, future.set_result, 2)
+
+        future = Future()
+        future.set_exception(KeyError('k'))
+        self.assertRaises(KeyError, future.result)
+        self.assertTrue(isinstance(future.exception(), KeyError))
+
+    def test_failed_callback(self):
+
+        errors = capture_errors(self)
+        future = Future()
+        called = list()
+        future.add_done_callback(lambda f: 1 / 0)
+        future.add_done_callback(called.append)
+        future.set_result(1)
+        self.assertEqual(called, [future])
+        future.add_done_callback(lambda f: 1 / 0)
+        self.assertEqual(len(errors), 2)
+
+class ErrorsHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = list()
+
+    def emit(self, record):
+        self.records.append(record)
+
+def capture_errors(test):
+    ''' return the list of records logged by kvlite.aio during the test
+    '''
+    handler = ErrorsHandler()
+    logger = logging.getLogger('kvlite.aio')
+    logger.addHandler(handler)
+    logger.propagate = False
+    test.addCleanup(setattr, logger, 'propagate', True)
+    test.addCleanup(logger.removeHandler, handler)
+    return handler.records
+
+class KvliteAsyncCollectionTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name())
+
+    def test_put_get_commit(self):
+
+        with kvlite.aio.open(self.URI, readers=3) as collection:
+            kvs = [('%040x' % i, {'n': i}) for i in range(1, 51)]
+            futures = [collection.put(k, v) for k, v in kvs]
+            collection.commit().result()
+            self.assertTrue(all([f.done() for f in futures]))
+            self.assertEqual(collection.count().result(), 50)
+
+            # reads from many clients overlap
+            futures = [collection.get({'_key': k}) for k, v in kvs]
+            self.assertEqual([f.result() for f in futures], kvs)
+            self.assertEqual(sorted(collection.get({'_key': [k for k, v in kvs[:3]]}).result()), kvs[:3])
+            self.assertEqual(collection.existing(['%040x' % i for i in (1, 100)]).result(), ['%040x' % 1])
+
+            collection.delete(kvs[0][0])
+            collection.commit().result()
+            self.assertFalse(collection.exists(kvs[0][0]).result())
+            self.assertRaises(RuntimeError, collection.get('incorrect').result)
+
+    def test_scan(self):
+
+        with kvlite.aio.open(self.URI) as collection:
+            kvs = [('%040x' % i, i) for i in range(1, 26)]
+            collection.put(kvs)
+            collection.commit().result()
+            pages = collection.scan(limit=10)
+            futures = [pages.next() for _ in range(4)]
+            self.assertEqual([len(f.result(5)) for f in futures], [10, 10, 5, 0])
+            self.assertEqual(sum([f.result() for f in futures], []), kvs)
+
+    def test_failed_callback(self):
+
+        errors = capture_errors(self)
+        with kvlite.aio.open(self.URI, readers=1) as collection:
+            collection.put('01', 'a').add_done_callback(lambda f: 1 / 0)
+            collection.commit().result(5)
+            self.assertEqual(collection.count().result(5), 1)
+            collection.count().add_done_callback(lambda f: 1 / 0)
+            self.assertEqual(collection.get({'_key': '01'}).result(5), ('01'.zfill(40), 'a'))
+        self.assertEqual(len(errors), 2)
+
+    def test_cache(self):
+
+        from kvlite.cache import LRUCache
+        self.assertRaises(RuntimeError, kvlite.aio.open, self.URI, cache=LRUCache(10))
+
+    def test_memory_database(self):
+
+        with kvlite.aio.open('sqlite://memory:kvlite_test', readers=2) as collection:
+            collection.put('01', 'a')
+            self.assertEqual(collection.get({'_key': '01'}).result(), ('01'.zfill(40), 'a'))
+        self.assertRaises(RuntimeError, collection.get, {'_key': '01'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import os
+import copy
+import shutil
+import tempfile
+import kvlite
+import unittest
+import kvlite.bench
+
+from kvlite.bench.suite import make_documents
+
+class KvliteBenchTests(unittest.TestCase):
+
+    def test_make_documents(self):
+
+        docs = make_documents(10, 100, seed=1)
+        self.assertEqual(docs, make_documents(10, 100, seed=1))
+        self.assertNotEqual(docs, make_documents(10, 100, seed=2))
+        self.assertEqual(len(set(k for k, _ in docs)), 10)
+        for k, v in docs:
+            self.assertTrue(len(v['text']) >= 100)
+
+    def test_run(self):
+
+        results = list()
+        report = kvlite.bench.run(backends=['sqlite-memory', 'sqlite-file'], serializers=['pickle', 'zdict_json'],
+                                  doc_sizes=['small'], batch_sizes=[7], documents=20, repeat=2,
+                                  callback=results.append)
+        self.assertEqual(report['results'], results)
+        self.assertEqual(report['skipped'], [])
+        names = set(r['benchmark'] for r in results)
+        self.assertEqual(names, set(kvlite.bench.BENCHMARKS))
+        # docs_struct does not depend on backend
+        self.assertEqual(len([r for r in results if r['benchmark'] == 'docs_struct']), 1)
+        self.assertEqual(len([r for r in results if r['benchmark'] == 'get_all']), 4)
+        for r in results:
+            self.assertEqual(len(r['times']), 2)
+            self.assertEqual(r['median'], sum(r['times']) / 2)
+            if r['benchmark'] in ('put_list', 'get_many', 'get_paged', 'copy'):
+                self.assertEqual(r['batch_size'], 7)
+            else:
+                self.assertEqual(r['batch_size'], None)
+
+    def test_unknown_params(self):
+
+        self.assertRaises(RuntimeError, kvlite.bench.run, backends=['unknown'])
+        self.assertRaises(RuntimeError, kvlite.bench.run, serializers=['unknown'])
+        self.assertRaises(RuntimeError, kvlite.bench.run, benchmarks=['unknown'])
+
+    def test_unavailable_backend(self):
+
+        report = kvlite.bench.run(backends=['sqlite-memory', 'broken'], serializers=['pickle', 'marshal'],
+                                  doc_sizes=['small'], benchmarks=['count'], documents=5, repeat=1,
+                                  uris={'broken': 'unknown://{name}'})
+        self.assertEqual(len(report['results']), 2)
+        self.assertEqual([s['backend'] for s in report['skipped']], ['broken'])
+
+    def test_failed_benchmark(self):
+
+        def fail(case, batch_size):
+            raise ValueError('failed')
+
+        kvlite.bench.BENCHMARKS['fail'] = (fail, 'calls', False, True)
+        try:
+            report = kvlite.bench.run(backends=['sqlite-memory'], serializers=['pickle'], doc_sizes=['small'],
+                                      benchmarks=['fail', 'count'], documents=5, repeat=1)
+        finally:
+            del kvlite.bench.BENCHMARKS['fail']
+        results = dict((r['benchmark'], r) for r in report['results'])
+        self.assertEqual(results['fail']['error'], 'ValueError: failed')
+        self.assertEqual(results['fail']['median'], None)
+        self.assertTrue(results['count']['rate'] > 0)
+
+        differences = kvlite.bench.compare(report, report)
+        self.assertEqual(sorted(d['status'] for d in differences), ['failed', 'same'])
+
+    def test_save_compare(self):
+
+        report = kvlite.bench.run(backends=['sqlite-memory'], serializers=['pickle'], doc_sizes=['small'],
+                                  benchmarks=['get_all', 'count'], documents=10, repeat=1)
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        kvlite.bench.save(report, os.path.join(path, 'baseline.json'))
+        baseline = kvlite.bench.load(os.path.join(path, 'baseline.json'))
+        self.assertEqual(baseline['params'], report['params'])
+
+        current = copy.deepcopy(report)
+        for r in current['results']:
+            if r['benchmark'] == 'count':
+                r['median'] *= 2
+        current['results'].append(dict(current['results'][0], serializer='marshal'))
+        differences = kvlite.bench.compare(baseline, current, threshold=0.2)
+        self.assertEqual([d['status'] for d in differences], ['slower', 'same', 'new'])
+        self.assertAlmostEqual(differences[0]['ratio'], 2.0)
+        self.assertEqual(differences[0]['benchmark'], 'count')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import shutil
+import tempfile
+import time
+import kvlite
+import unittest
+
+class KvliteBufferTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name())
+        self.collection = kvlite.open(self.URI)
+        self.collection.commit()
+
+    def tearDown(self):
+
+        self.collection.close()
+
+    def stored(self):
+        ''' return the list of committed documents
+        '''
+        reader = kvlite.open(self.URI)
+        docs = sorted([v['n'] for k, v in reader])
+        reader.close()
+        return docs
+
+    def test_flush_by_rows(self):
+
+        docs = self.collection.buffered(rows=10)
+        docs.put([(i, {'n': i}) for i in range(1, 10)])
+        self.assertEqual(len(docs), 9)
+        self.assertEqual(self.stored(), [])
+        docs.put(10, {'n': 10})
+        self.assertEqual(len(docs), 0)
+        self.assertEqual(docs.flushes, 1)
+        self.assertEqual(self.stored(), range(1, 11))
+
+    def test_flush_by_size_and_interval(self):
+
+        docs = self.collection.buffered(size=1)
+        docs.put('01', {'n': 1})
+        self.assertEqual(self.stored(), [1])
+
+        docs = self.collection.buffered(interval=0.01)
+        docs.put('02', {'n': 2})
+        time.sleep(0.02)
+        docs.put('03', {'n': 3})
+        self.assertEqual(self.stored(), [1, 2, 3])
+
+    def test_read_your_writes(self):
+
+        self.collection.put([('01', {'n': 1}), ('02', {'n': 2})])
+        self.collection.commit()
+        with self.collection.buffered() as docs:
+            docs.put('01', {'n': 10})
+            docs.delete('02')
+            docs.put('03', {'n': 3})
+            self.assertEqual(docs.get({'_key': '01'})[1], {'n': 10})
+            self.assertEqual(docs.get({'_key': '02'}), (None, None))
+            self.assertEqual(sorted([v['n'] for k, v in docs.get({'_key': ['01', '02', '03']})]), [3, 10])
+            result = docs.get({'_key': ['03', '02', '01', '04']}, ordered=True)
+            self.assertEqual([v and v['n'] for k, v in result], [3, None, 10, None])
+            self.assertEqual(self.stored(), [1, 2])
+            # other reads flush the buffer
+            self.assertEqual(docs.count, 2)
+            self.assertEqual(len(docs), 0)
+        self.assertEqual(self.stored(), [3, 10])
+
+    def test_discard_on_error(self):
+
+        def failed_block():
+            with self.collection.buffered() as docs:
+                docs.put('01', {'n': 1})
+                raise ValueError('failed')
+
+        self.assertRaises(ValueError, failed_block)
+        self.assertEqual(self.stored(), [])
+        self.assertRaises(RuntimeError, self.collection.buffered().delete, 0)
+
+    def test_delete_with_ordered_keys(self):
+
+        collection = kvlite.open('sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name()), 
+                                 key_codec='ordered')
+        collection.put([(1, {'n': 1}), ('a', {'n': 2})])
+        collection.commit()
+        with collection.buffered() as docs:
+            docs.delete(1)
+            docs.delete('a')
+        self.assertEqual(collection.count, 0)
+        self.assertEqual(collection.get({'_key': 1}), (None, None))
+        collection.close()
+
+if __name__ == '__main__':
+    unittest.main()
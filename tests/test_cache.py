@@ -0,0 +1,113 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import shutil
+import tempfile
+import kvlite
+import unittest
+
+from kvlite.cache import LRUCache
+
+class KvliteCacheTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name())
+
+    def test_lru_eviction(self):
+
+        cache = LRUCache(items=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats, {'items': 2, 'size': 0, 'hits': 1, 'misses': 1})
+        self.assertRaises(RuntimeError, LRUCache, 0)
+
+    def test_size_limit(self):
+
+        cache = LRUCache(items=10, size=10)
+        cache.put('a', 'a', 4)
+        cache.put('b', 'b', 4)
+        cache.put('c', 'c', 4)
+        self.assertEqual((len(cache), cache.size), (2, 8))
+        self.assertFalse('a' in cache)
+        cache.put('d', 'd', 11)
+        self.assertFalse('d' in cache)
+        cache.delete('b')
+        self.assertEqual((len(cache), cache.size), (1, 4))
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_collection_cache(self):
+
+        collection = kvlite.open(self.URI, cache=LRUCache(items=100))
+        collection.put([(i, {'n': i}) for i in range(1, 11)])
+        collection.commit()
+
+        k, v = collection.get({'_key': '1'})
+        self.assertEqual(v, {'n': 1})
+        self.assertEqual(collection.get({'_key': '1'}), (k, v))
+        self.assertEqual((collection.cache.hits, collection.cache.misses), (1, 1))
+
+        # only missed documents are selected from database
+        docs = dict(collection.get({'_key': ['1', '2', '3', '100']}))
+        self.assertEqual(sorted([v['n'] for v in docs.values()]), [1, 2, 3])
+        self.assertEqual((collection.cache.hits, collection.cache.misses), (2, 4))
+
+        # put() and delete() invalidate cached documents
+        collection.put('1', {'n': 100})
+        self.assertEqual(collection.get({'_key': '1'})[1], {'n': 100})
+        collection.delete('2')
+        self.assertEqual(collection.get({'_key': '2'}), (None, None))
+        # metadata is not cached
+        collection.meta
+        self.assertFalse(collection._ZEROS_KEY in collection.cache)
+        collection.close()
+        self.assertEqual(len(collection.cache), 0)
+
+    def test_cached_copies(self):
+
+        collection = kvlite.open(self.URI, cache=LRUCache(items=100))
+        collection.put('1', {'x': 1})
+        collection.commit()
+        collection.get({'_key': '1'})[1]['x'] = 999
+        collection.get({'_key': '1'})[1]['x'] = 999
+        self.assertEqual(collection.cache.hits, 1)
+        self.assertEqual(collection.get({'_key': '1'})[1], {'x': 1})
+        self.assertEqual([v for k, v in collection.get({'_key': ['1']})], [{'x': 1}])
+        collection.close()
+
+    def test_rollback(self):
+
+        collection = kvlite.open(self.URI, cache=LRUCache(items=100))
+        collection.put('1', {'y': 1})
+        collection.commit()
+        self.assertEqual(collection.get({'_key': '1'})[1], {'y': 1})
+
+        # documents read after not committed writes are not cached
+        collection.put('1', {'y': 2})
+        self.assertEqual(collection.get({'_key': '1'})[1], {'y': 2})
+        self.assertFalse(collection.prepare_key('1') in collection.cache)
+        collection._rollback()
+        self.assertEqual(collection.get({'_key': '1'})[1], {'y': 1})
+
+        collection.put('2', {'y': 2})
+        collection.get({'_key': ['1', '2']})
+        collection.commit()
+        self.assertEqual(len(collection.cache), 1)
+        collection.get({'_key': '2'})
+        self.assertEqual(len(collection.cache), 2)
+        collection.put('2', {'y': 3})
+        collection._rollback()
+        self.assertEqual(len(collection.cache), 0)
+        self.assertEqual(collection.get({'_key': '2'})[1], {'y': 2})
+        collection.close()
+
+if __name__ == '__main__':
+    unittest.main()
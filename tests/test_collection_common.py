@@ -2,6 +2,8 @@ import sys
 if '' not in sys.path:
     sys.path.append('')
 
+import shutil
+import tempfile
 import kvlite
 import unittest
 
@@ -9,7 +11,9 @@ class CommonCollectionTests(unittest.TestCase):
 
     def setUp(self):
         
-        self.URI = 'sqlite://tests/db/{}.kvlite:kvlite_test'
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/{}.kvlite:kvlite_test' % self.path
 
     def test_get_uuid(self):
         
@@ -55,6 +59,44 @@ class CommonCollectionTests(unittest.TestCase):
         self.assertNotEqual(len(kvs[0:3]), len(result))
         collection.close()
 
+    def test_get_many_ordered(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        kvs = [(collection.get_uuid(), i) for i in range(250)]
+        collection.put(kvs)
+        collection.commit()
+
+        # the list of keys is longer than ITEMS_PER_REQUEST
+        keys = [k for k, v in reversed(kvs)]
+        self.assertEqual(sorted(collection.get({'_key': keys})), sorted(kvs))
+        result = list(collection.get({'_key': keys}, ordered=True))
+        self.assertEqual(result, list(reversed(kvs)))
+
+        absent = '1' * 40
+        result = list(collection.get({'_key': [kvs[1][0], absent, kvs[0][0]]}, ordered=True))
+        self.assertEqual(result, [kvs[1], (absent, None), kvs[0]])
+        collection.close()
+
+    def test_keys_and_exists(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        kvs = [('%040x' % i, i) for i in range(1, 251)]
+        collection.put(kvs)
+        collection.commit()
+
+        self.assertEqual(list(collection.keys()), [k for k, v in kvs])
+        self.assertEqual(list(collection.keys(reverse=True, limit=7)), [k for k, v in reversed(kvs)])
+        self.assertEqual(list(collection.keys({'$prefix': '0' * 38 + '1'})), [k for k, v in kvs[15:31]])
+
+        self.assertTrue(collection.exists(kvs[0][0]))
+        self.assertFalse(collection.exists('1' * 40))
+        self.assertFalse(collection.exists('0' * 40))
+
+        keys = ['%040x' % i for i in range(300, 0, -2)] + ['0' * 40]
+        self.assertEqual(list(collection.existing(keys)), ['%040x' % i for i in range(250, 0, -2)])
+        self.assertEqual(list(collection.existing([])), [])
+        collection.close()
+
     def test_put_get_delete_count_many(self):
         
         collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
@@ -68,6 +110,31 @@ class CommonCollectionTests(unittest.TestCase):
         collection.commit()
         collection.close()
 
+    def test_put_result(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        # inserted, updated and unchanged documents
+        self.assertEqual(collection.put([(1, 'a'), (2, 'b')]), 2)
+        self.assertEqual(collection.put([(1, 'c'), (2, 'b'), (3, 'd')]), 3)
+        self.assertEqual(collection.put(2, 'b'), 1)
+        self.assertEqual(collection.count, 3)
+        collection.commit()
+        collection.close()
+
+    def test_count_replace_and_absent_delete(self):
+        
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        collection.put([(1, 'a'), (2, 'b'), (1, 'c')])
+        collection.put(2, 'd')
+        self.assertEqual(collection.count, 2)
+        collection.delete(3)
+        self.assertEqual(collection.count, 2)
+        collection.meta = collection.meta
+        self.assertEqual(collection.count, 2)
+        self.assertEqual(collection.estimated_count, 2)
+        collection.commit()
+        collection.close()
+
     def test_long_key(self):
         
         collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
@@ -113,6 +180,43 @@ class CommonCollectionTests(unittest.TestCase):
             self.assertIn(res, kvs[2*PAGE_SIZE:2*PAGE_SIZE+PAGE_SIZE])
         collection.close()
 
+    def test_keyset_pagination(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        PAGE_SIZE=10
+        kvs = [(collection.get_uuid(), 'test') for _ in range(95)]
+        collection.put(kvs)
+        collection.commit()
+
+        result = list()
+        docs, token = collection.get(after='', limit=PAGE_SIZE)
+        result.extend(docs)
+        while token:
+            docs, token = collection.get(after=token, limit=PAGE_SIZE)
+            self.assertTrue(len(docs) <= PAGE_SIZE)
+            result.extend(docs)
+        self.assertEqual(result, sorted(kvs))
+        self.assertRaises(RuntimeError, collection.get, after='abcd', limit=PAGE_SIZE)
+        collection.close()
+
+    def test_key_range(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        kvs = [('%040x' % i, i) for i in range(7, 300, 7)]
+        collection.put(kvs)
+        collection.commit()
+
+        result = list(collection.get({'_key': {'$gte': '%040x' % 14, '$lt': '%040x' % 50}}, limit=2))
+        self.assertEqual([v for k, v in result], [14, 21, 28, 35, 42, 49])
+        result = list(collection.get({'_key': {'$gt': '%040x' % 14, '$lte': '%040x' % 49}}, reverse=True))
+        self.assertEqual([v for k, v in result], [49, 42, 35, 28, 21])
+        result = list(collection.get({'_key': {'$prefix': '0' * 38 + '1'}}))
+        self.assertEqual([v for k, v in result], [21, 28])
+        self.assertEqual(len(list(collection.get({'_key': {'$prefix': ''}}))), len(kvs))
+        self.assertRaises(RuntimeError, collection.get, {'_key': {'$prefix': 'xyz'}})
+        self.assertRaises(RuntimeError, collection.get, {'_key': {'$in': ['0']}})
+        collection.close()
+
     def test_use_different_serializators_for_many(self):
 
         URI = self.URI.format(kvlite.utils.tmp_name())
@@ -123,20 +227,82 @@ class CommonCollectionTests(unittest.TestCase):
         collection.commit()
         collection.close()
 
-        collection = kvlite.open(URI, serializer_name='pickle')
-        with self.assertRaises(RuntimeError):
-            res = [(k,v) for k,v in collection]
+        # the serializer of existing collection is taken from metadata
+        self.assertRaises(RuntimeError, kvlite.open, URI, serializer_name='pickle')
+        for serializer_name in (None, 'completed_json'):
+            collection = kvlite.open(URI, serializer_name=serializer_name)
+            self.assertEqual(collection.meta['serializer'], 'completed_json')
+            self.assertEqual(sorted([v for k, v in collection]), [u'diffser1', u'diffser2', u'diffser3'])
+            collection.close()
 
-        collection.put(u'11', u'diffser1')
-        collection.put(u'22', u'diffser2')
-        collection.put(u'33', u'diffser3')
+        self.assertRaises(RuntimeError, kvlite.open, self.URI.format(kvlite.utils.tmp_name()), 
+                                        serializer_name='unknown')
+
+    def test_marshal_serializer(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()), serializer_name='marshal')
+        doc = {'s': 'str', 'u': u'unicode', 'i': 1, 'l': [1.5, None, True], 'd': {'a': (1, 2)}}
+        collection.put('01', doc)
         collection.commit()
+        self.assertEqual(collection.get({'_key': '01'})[1], doc)
+        self.assertRaises(RuntimeError, collection.put, '02', {'obj': object()})
         collection.close()
 
-        collection = kvlite.open(URI, serializer_name='completed_json')        
-        with self.assertRaises(RuntimeError):
-            res = [(k,v) for k,v in collection]
-        collection.close()        
+    def test_train_dictionary(self):
+
+        URI = self.URI.format(kvlite.utils.tmp_name())
+        collection = kvlite.open(URI, serializer_name='zdict_json')
+        docs = [('%040x' % i, {'title': 'post %d' % i, 'tags': ['blog', 'kvlite']}) for i in range(1, 31)]
+        collection.put(docs[:10])
+        self.assertEqual(collection.train_dictionary(samples=10), 1)
+        collection.put(docs[10:20])
+        self.assertEqual(collection.train_dictionary(), 2)
+        collection.put(docs[20:])
+        collection.commit()
+        collection.close()
+
+        collection = kvlite.open(URI)
+        self.assertEqual(collection.meta['zdict']['version'], 2)
+        self.assertEqual(sorted(collection), docs)
+        collection.close()
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        self.assertRaises(RuntimeError, collection.train_dictionary)
+        collection.close()
+
+    def test_dictionary_of_other_object(self):
+
+        URI = self.URI.format(kvlite.utils.tmp_name())
+        trainer = kvlite.open(URI, serializer_name='zdict_json')
+        docs = [('%040x' % i, {'title': 'post %d' % i, 'tags': ['blog', 'kvlite']}) for i in range(1, 21)]
+        trainer.put(docs[:10])
+        trainer.commit()
+        reader = kvlite.open(URI)
+        self.assertEqual(reader.get({'_key': docs[0][0]}), docs[0])
+
+        self.assertEqual(trainer.train_dictionary(), 1)
+        trainer.put(docs[10:])
+        trainer.commit()
+        # the dictionaries are reloaded from metadata by opened collection
+        self.assertEqual(reader.get({'_key': docs[10][0]}), docs[10])
+        self.assertEqual(sorted(reader), docs)
+        self.assertEqual(reader._serializer.version, 1)
+        trainer.close()
+        reader.close()
+
+    def test_scan(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()), serializer_name='zdict_json')
+        kvs = [('%040x' % i, {'n': i, 'tags': ['a', 'b']}) for i in range(1, 51)]
+        collection.put(kvs)
+        collection.train_dictionary()
+        collection.commit()
+        self.assertEqual(list(collection.scan(processes=2, batch_size=7, queue_size=2)), list(collection))
+        self.assertEqual(list(collection.scan(processes=1)), kvs)
+
+        collection._serializer = kvlite.serializers.cPickleSerializer
+        self.assertRaises(RuntimeError, list, collection.scan(processes=1))
+        collection.close()
 
     def test_metadata(self):
         ''' test metadata
@@ -149,6 +315,7 @@ class CommonCollectionTests(unittest.TestCase):
                 'name': 'kvlite_test',
                 'kvlite-version': kvlite.__version__,
                 'serializer': 'pickle',
+                'key_codec': 'zfill',
             })
         collection.close()
         
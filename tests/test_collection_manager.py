@@ -2,6 +2,8 @@ import sys
 if '' not in sys.path:
     sys.path.append('')
 
+import shutil
+import tempfile
 import unittest
 
 from kvlite.managers import CollectionManager
@@ -33,7 +35,9 @@ class KvliteCollectionManagerTests(unittest.TestCase):
 
     def test_sqlite_manager(self):
         
-        URI = 'sqlite://tests/db/testdb.sqlite'
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        URI = 'sqlite://%s/testdb.sqlite' % path
         collection_name = 'kvlite_test'
         
         manager = CollectionManager(URI)
@@ -0,0 +1,198 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import shutil
+import tempfile
+import kvlite
+import unittest
+
+from kvlite.indexes import MysqlIndex
+from kvlite.indexes import SqliteIndex
+from kvlite.indexes import IndexBuilder
+
+class StopAfter(object):
+    ''' stop event which is set after `calls` checks
+    '''
+    def __init__(self, calls):
+        self.calls = calls
+
+    def is_set(self):
+        self.calls -= 1
+        return self.calls < 0
+
+class KvliteIndexesTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/{}.kvlite:kvlite_test' % self.path
+
+    def test_prepare_fields(self):
+
+        self.assertEqual(SqliteIndex.prepare_fields({'a': 1}), [['a', 1]])
+        self.assertEqual(SqliteIndex.prepare_fields([('a', 1), ('b', -1)]), [['a', 1], ['b', -1]])
+        self.assertRaises(RuntimeError, SqliteIndex.prepare_fields, {'a': 1, 'b': 1})
+        self.assertRaises(RuntimeError, SqliteIndex.prepare_fields, {'a': 2})
+        self.assertRaises(RuntimeError, SqliteIndex.prepare_fields, [])
+
+    def test_values(self):
+
+        index = SqliteIndex(kvlite.open('sqlite://memory:test')._conn, 'idx', [('a.b', 1), ('c', 1)])
+        self.assertEqual(index.values({'a': {'b': 1}, 'c': 'x'}), [(1, 'x')])
+        self.assertEqual(sorted(index.values({'a': {'b': 1}, 'c': ['x', 'y']})), [(1, 'x'), (1, 'y')])
+        self.assertEqual(index.values({'a': {'b': 1}}), [])
+        self.assertEqual(index.values('string'), [])
+
+    def test_mysql_values_order(self):
+
+        values = [-2.5, -1, False, 0.5, True, 2, 9, 9.5, 10, 2**53, 2**53 + 1, 2**63, 1e300, '', '10', '9', 'a', u'\xe9']
+        prepared = [MysqlIndex.prepare_value(v) for v in values]
+        self.assertEqual(sorted(prepared), prepared)
+        self.assertEqual(MysqlIndex.prepare_value(2), MysqlIndex.prepare_value(2.0))
+        self.assertEqual(MysqlIndex.prepare_value(True), MysqlIndex.prepare_value(1))
+        self.assertNotEqual(MysqlIndex.prepare_value(10), MysqlIndex.prepare_value('10'))
+        self.assertEqual(len(MysqlIndex.prepare_value('x' * 254)), 255)
+        self.assertRaises(RuntimeError, MysqlIndex.prepare_value, 'x' * 255)
+        self.assertRaises(RuntimeError, MysqlIndex.prepare_value, u'\xe9' * 128)
+
+    def test_make_index_and_search(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        collection.put([(i, {'n': i, 'group': 'g%d' % (i % 3)}) for i in range(1, 31)])
+        collection.commit()
+
+        collection.make_index('n', {'n': 1})
+        self.assertEqual(collection.indexes.keys(), ['n'])
+        result = [v['n'] for k,v in collection.search('n', {'n': {'$gte': 10, '$lt': 15}})]
+        self.assertEqual(result, [10, 11, 12, 13, 14])
+        result = [v['n'] for k,v in collection.search('n', {'n': {'$in': [3, 5, 100]}})]
+        self.assertEqual(result, [3, 5])
+        result = [v['n'] for k,v in collection.search('n', {'n': {'$gt': 0}}, limit=3)]
+        self.assertEqual(result, [1, 2, 3])
+        self.assertRaises(RuntimeError, lambda: list(collection.search('n', {'group': 'g0'})))
+        self.assertRaises(RuntimeError, collection.make_index, 'n', {'n': 1})
+        collection.close()
+
+    def test_compound_index(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        collection.put([(i, {'n': i, 'group': 'g%d' % (i % 3)}) for i in range(1, 31)])
+        collection.make_index('group_n', [('group', 1), ('n', -1)])
+        result = [v['n'] for k,v in collection.search('group_n', {'group': 'g0', 'n': {'$lte': 15}})]
+        self.assertEqual(result, [15, 12, 9, 6, 3])
+        collection.close()
+
+    def test_index_updated_by_put_and_delete(self):
+
+        URI = self.URI.format(kvlite.utils.tmp_name())
+        collection = kvlite.open(URI)
+        collection.make_index('tags', {'tags': 1})
+        collection.put('01', {'tags': ['a', 'b']})
+        collection.put('02', {'tags': ['b', 'c']})
+        collection.commit()
+        self.assertEqual([k for k,v in collection.search('tags', {'tags': 'b'})],
+                        [collection.prepare_key('01'), collection.prepare_key('02')])
+
+        collection.put('01', {'tags': ['c']})
+        collection.delete('02')
+        collection.commit()
+        self.assertEqual([k for k,v in collection.search('tags', {'tags': 'b'})], [])
+        collection.close()
+
+        # index definitions are loaded from metadata
+        collection = kvlite.open(URI)
+        self.assertEqual([k for k,v in collection.search('tags', {'tags': 'c'})], [collection.prepare_key('01')])
+        collection.remove_index('tags')
+        self.assertEqual(collection.indexes, {})
+        self.assertRaises(RuntimeError, lambda: list(collection.search('tags', {'tags': 'c'})))
+        collection.close()
+
+    def test_resumable_build(self):
+
+        collection = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        collection.put([(i, {'n': i}) for i in range(1, 31)])
+        collection.commit()
+
+        collection.make_index('n', {'n': 1}, build=False)
+        self.assertRaises(RuntimeError, lambda: list(collection.search('n', {'n': 1})))
+        # writes during building are indexed
+        collection.put(31, {'n': 31})
+        collection.commit()
+
+        self.assertFalse(collection.build_index('n', batch_size=10, stop_event=StopAfter(2)))
+        self.assertEqual(collection.meta['indexes']['n']['state'], 'building')
+        self.assertNotEqual(collection.meta['indexes']['n']['rowid'], 0)
+
+        self.assertTrue(collection.build_index('n', batch_size=10))
+        self.assertEqual(collection.meta['indexes']['n']['state'], 'ready')
+        self.assertEqual([v['n'] for k,v in collection.search('n', {'n': {'$gt': 0}})], range(1, 32))
+        collection.close()
+
+    def test_background_build(self):
+
+        URI = self.URI.format(kvlite.utils.tmp_name())
+        collection = kvlite.open(URI)
+        collection.put([(i, {'n': i}) for i in range(1, 101)])
+        collection.make_index('n', {'n': 1}, build=False)
+
+        builder = IndexBuilder(URI, 'n', batch_size=10, rows_per_sec=10000)
+        builder.start()
+        builder.join()
+        self.assertTrue(builder.completed)
+        self.assertEqual(builder.error, None)
+        self.assertEqual(len(list(collection.search('n', {'n': {'$lte': 50}}))), 50)
+        collection.close()
+
+        # the serializer is taken from metadata
+        URI = self.URI.format(kvlite.utils.tmp_name())
+        collection = kvlite.open(URI, serializer_name='marshal')
+        collection.put([(i, {'n': i}) for i in range(1, 11)])
+        collection.make_index('n', {'n': 1}, build=False)
+        builder = IndexBuilder(URI, 'n')
+        builder.start()
+        builder.join()
+        self.assertEqual(builder.error, None)
+        self.assertTrue(builder.completed)
+        self.assertEqual(len(list(collection.search('n', {'n': {'$lte': 5}}))), 5)
+        collection.close()
+
+        # errors of opening are reported
+        builder = IndexBuilder('unknown://%s' % URI.split('://', 1)[1], 'n')
+        builder.start()
+        builder.join()
+        self.assertFalse(builder.completed)
+        self.assertTrue(isinstance(builder.error, RuntimeError))
+
+    def test_index_made_by_other_object(self):
+
+        URI = self.URI.format(kvlite.utils.tmp_name())
+        collection = kvlite.open(URI)
+        collection.put([(i, {'n': i}) for i in range(1, 11)])
+        collection.commit()
+        self.assertEqual(collection.indexes, {})
+
+        builder = IndexBuilder(URI, 'n')
+        other = kvlite.open(URI)
+        other.make_index('n', {'n': 1}, build=False)
+        builder.start()
+        builder.join()
+        self.assertTrue(builder.completed)
+
+        # the index is maintained by collection opened before the index
+        collection.put(50, {'n': 50})
+        collection.delete(1)
+        collection.commit()
+        self.assertEqual([v['n'] for k, v in other.search('n', {'n': {'$gt': 0}})], range(2, 11) + [50])
+        self.assertEqual(len(list(collection.search('n', {'n': 50}))), 1)
+
+        other.remove_index('n')
+        collection.put(51, {'n': 51})
+        collection.commit()
+        self.assertEqual(collection.indexes, {})
+        other.close()
+        collection.close()
+
+if __name__ == '__main__':
+    unittest.main()
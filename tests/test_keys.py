@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import shutil
+import tempfile
+import kvlite
+import unittest
+
+from kvlite.keys import META_KEY
+from kvlite.keys import OrderedKeyCodec
+from kvlite.keys import ZeroFillKeyCodec
+
+class KvliteKeyCodecTests(unittest.TestCase):
+
+    def test_zfill(self):
+
+        self.assertEqual(ZeroFillKeyCodec.encode(1), '1'.zfill(40))
+        self.assertEqual(ZeroFillKeyCodec.encode('ab'), 'ab'.zfill(40))
+        self.assertRaises(RuntimeError, ZeroFillKeyCodec.encode, 'a' * 41)
+        self.assertTrue(ZeroFillKeyCodec.is_valid(META_KEY))
+
+    def test_ordered(self):
+
+        keys = [-2**63, -5, 0, 3, 2**40, 2**63-1, '', 'a', 'ab', 'b', u'é']
+        prepared = [OrderedKeyCodec.encode(k) for k in keys]
+        self.assertEqual(sorted(prepared), prepared)
+        self.assertEqual([OrderedKeyCodec.decode(k) for k in prepared][:-1], keys[:-1])
+        self.assertEqual(OrderedKeyCodec.decode(prepared[-1]), u'é'.encode('utf-8'))
+        self.assertTrue(all(OrderedKeyCodec.is_valid(k) for k in prepared))
+        self.assertEqual(OrderedKeyCodec.decode(META_KEY), META_KEY)
+
+    def test_ordered_incorrect_keys(self):
+
+        self.assertRaises(RuntimeError, OrderedKeyCodec.encode, 2**63)
+        self.assertRaises(RuntimeError, OrderedKeyCodec.encode, True)
+        self.assertRaises(RuntimeError, OrderedKeyCodec.encode, 1.5)
+
+    def test_prefix_range(self):
+
+        self.assertEqual(ZeroFillKeyCodec.prefix_range('a1f'), ('a1f'.ljust(40, '0'), 'a20'.ljust(40, '0')))
+        self.assertEqual(ZeroFillKeyCodec.prefix_range('ff'), ('ff'.ljust(40, '0'), None))
+        self.assertEqual(OrderedKeyCodec.prefix_range('a\xff'), ('\x02a\xff', '\x02b'))
+
+class KvliteOrderedCollectionTests(unittest.TestCase):
+
+    LAYOUT = 'default'
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/%s.kvlite:kvlite_test?layout=%s' % (self.path, kvlite.utils.tmp_name(), self.LAYOUT)
+        self.collection = kvlite.open(self.URI, key_codec='ordered')
+        self.collection.put([(k, {'k': k}) for k in [10, -1, 'x', 'abc', 2]])
+        self.collection.commit()
+
+    def tearDown(self):
+
+        self.collection.close()
+
+    def test_get_by_key(self):
+
+        self.assertEqual(self.collection.meta['key_codec'], 'ordered')
+        self.assertEqual(self.collection.count, 5)
+        self.assertEqual(self.collection.get({'_key': -1}), (-1, {'k': -1}))
+        self.assertEqual(self.collection.get({'_key': 'x'}), ('x', {'k': 'x'}))
+        self.assertEqual(self.collection.get({'_key': 3}), (None, None))
+        self.assertEqual(sorted(self.collection.get({'_key': [2, 'abc', 'none']})),
+                            [(2, {'k': 2}), ('abc', {'k': 'abc'})])
+
+    def test_pagination(self):
+
+        docs, token = self.collection.get(after='', limit=2)
+        self.assertEqual([k for k, v in docs], [-1, 2])
+        docs, token = self.collection.get(after=token, limit=2)
+        self.assertEqual([k for k, v in docs], [10, 'abc'])
+        docs, token = self.collection.get(after=token, limit=2)
+        self.assertEqual([k for k, v in docs], ['x'])
+        self.assertEqual(token, None)
+
+    def test_delete_and_search(self):
+
+        self.collection.delete('x')
+        self.collection.commit()
+        self.assertEqual(self.collection.get({'_key': 'x'}), (None, None))
+        self.assertEqual(self.collection.count, 4)
+        self.collection.make_index('k', {'k': 1})
+        self.assertEqual([k for k, v in self.collection.search('k', {'k': {'$gte': 2}})], [2, 10, 'abc'])
+
+    def test_key_range(self):
+
+        self.collection.put([('a%02d' % i, i) for i in range(5)])
+        self.collection.commit()
+        result = self.collection.get({'_key': {'$gt': -1, '$lte': 10}}, limit=1)
+        self.assertEqual([k for k, v in result], [2, 10])
+        result = self.collection.get({'_key': {'$prefix': 'a0'}}, reverse=True, limit=2)
+        self.assertEqual([k for k, v in result], ['a04', 'a03', 'a02', 'a01', 'a00'])
+        result = self.collection.get({'_key': {'$gte': 5, '$prefix': 'a'}})
+        self.assertEqual([k for k, v in result], ['a00', 'a01', 'a02', 'a03', 'a04', 'abc'])
+        result = self.collection.get({'_key': {'$gte': 'abc'}})
+        self.assertEqual([k for k, v in result], ['abc', 'x'])
+        self.assertRaises(RuntimeError, self.collection.get, {'_key': {'$prefix': 1}})
+
+    def test_buffered(self):
+
+        with self.collection.buffered() as docs:
+            docs.put(7, {'k': 7})
+            self.assertEqual(docs.get({'_key': 7}), (7, {'k': 7}))
+            self.assertEqual(list(docs.get({'_key': [7, 10]})), [(7, {'k': 7}), (10, {'k': 10})])
+        self.assertEqual(self.collection.get({'_key': 7}), (7, {'k': 7}))
+
+    def test_reopen(self):
+
+        self.collection.close()
+        self.collection = kvlite.open(self.URI)
+        self.assertEqual(self.collection.key_codec.name, 'ordered')
+        self.assertEqual(self.collection.get({'_key': 10}), (10, {'k': 10}))
+        self.assertRaises(RuntimeError, kvlite.open, self.URI, key_codec='zfill')
+
+    def test_copy(self):
+
+        target = kvlite.open('sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name()), key_codec='ordered')
+        self.assertEqual(kvlite.utils.copy(self.collection, target), 5)
+        self.assertEqual(sorted(target), sorted(self.collection))
+        target.close()
+
+        target = kvlite.open('sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name()))
+        kvlite.utils.copy(self.collection, target)
+        self.assertEqual(target.get({'_key': 10}), ('10'.zfill(40), {'k': 10}))
+        target.close()
+
+class KvliteOrderedCompactCollectionTests(KvliteOrderedCollectionTests):
+
+    LAYOUT = 'compact'
+
+    def test_key_order(self):
+
+        self.assertEqual([k for k, v in self.collection], [-1, 2, 10, 'abc', 'x'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import shutil
+import tempfile
+import kvlite
+import unittest
+
+from kvlite.lazy import LazyValue
+from kvlite.serializers import cPickleSerializer
+
+class CountingSerializer(object):
+
+    def __init__(self):
+        self.loaded = 0
+
+    def dumps(self, v):
+        return cPickleSerializer.dumps(v)
+
+    def loads(self, v):
+        self.loaded += 1
+        return cPickleSerializer.loads(v)
+
+class KvliteLazyValueTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.collection = kvlite.open('sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name()))
+        self.collection._serializer = self.serializer = CountingSerializer()
+        self.kvs = [('%040x' % i, {'n': i, 'tags': ['a', 'b']}) for i in range(1, 21)]
+        self.collection.put(self.kvs)
+        self.collection.commit()
+
+    def tearDown(self):
+
+        self.collection.close()
+
+    def test_lazy_value(self):
+
+        value = LazyValue(lambda k, v: cPickleSerializer.loads(v), '01', cPickleSerializer.dumps({'a': [1, 2]}))
+        self.assertFalse(value.loaded)
+        self.assertEqual(value['a'], [1, 2])
+        self.assertTrue(value.loaded)
+        self.assertEqual(value, {'a': [1, 2]})
+        self.assertEqual(value.keys(), ['a'])
+        self.assertTrue('a' in value)
+        self.assertEqual(len(value), 1)
+        self.assertEqual(repr(value), repr({'a': [1, 2]}))
+
+        broken = LazyValue(self.collection._loads, '01', 'broken')
+        self.assertRaises(RuntimeError, lambda: broken.value)
+
+    def test_lazy_iterators(self):
+
+        docs = list(self.collection.get(lazy=True))
+        self.assertEqual(self.serializer.loaded, 0)
+        self.assertEqual(docs[3][1]['n'], 4)
+        self.assertEqual(self.serializer.loaded, 1)
+        self.assertEqual(docs, self.kvs)
+
+        queries = [
+            lambda: list(self.collection.get(offset=0, limit=5, lazy=True)),
+            lambda: self.collection.get(after='', limit=5, lazy=True)[0],
+            lambda: list(self.collection.get({'_key': [k for k, v in self.kvs[:5]]}, lazy=True)),
+            lambda: list(self.collection.get({'_key': [k for k, v in self.kvs[:5]]}, ordered=True, lazy=True)),
+            lambda: list(self.collection.get({'_key': {'$gte': self.kvs[0][0]}}, limit=5, lazy=True)),
+        ]
+        for query in queries:
+            self.serializer.loaded = 0
+            docs = query()
+            self.assertEqual(self.serializer.loaded, 0)
+            self.assertTrue(all([isinstance(v, LazyValue) for k, v in docs]))
+            self.assertEqual(sorted([v['n'] for k, v in docs])[:5], [1, 2, 3, 4, 5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,7 +20,81 @@ class KvliteMysqlTests(test_collection_common.CommonCollectionTests):
         for collection in manager.collections():
             manager.remove(collection)
 
-  
+class FakeCursor(object):
+
+    def __init__(self, max_packet):
+        self.statements = list()
+        self.max_packet = max_packet
+        self.rowcount = -1
+
+    def execute(self, sql, args=None):
+        self.statements.append((sql, args))
+        self.rowcount = len(args or ()) / 2
+
+    def fetchone(self):
+        return (self.max_packet,)
+
+    def fetchall(self):
+        return list()
+
+class FakeConnection(object):
+
+    def __init__(self, max_packet):
+        self._cursor = FakeCursor(max_packet)
+
+    def cursor(self):
+        return self._cursor
+
+class KvliteMysqlPutTests(unittest.TestCase):
+
+    def test_batched_put(self):
+
+        conn = FakeConnection(max_packet=2048)
+        collection = kvlite.collections.MysqlCollection(conn, 'test', kvlite.serializers.cPickleSerializer)
+        collection._indexes = dict()
+        collection.MAX_INSERT_ROWS = 3
+        self.assertEqual(collection.put([(i, 'v%d' % i) for i in range(1, 8)]), 7)
+
+        inserts = [(sql, args) for sql, args in conn._cursor.statements if sql.startswith('INSERT')]
+        self.assertEqual([len(args) / 2 for sql, args in inserts], [3, 3, 1])
+        self.assertTrue(inserts[0][0].endswith('VALUES (%s,%s),(%s,%s),(%s,%s) ON DUPLICATE KEY UPDATE v=VALUES(v);'))
+        self.assertEqual(inserts[0][1][0], collection.prepare_kv(1, 'v1', backend='mysql')[0])
+
+        # batches are limited by max_allowed_packet
+        conn._cursor.statements = list()
+        self.assertEqual(collection.put([(i, 'x' * 400) for i in range(1, 8)]), 7)
+        inserts = [args for sql, args in conn._cursor.statements if sql.startswith('INSERT')]
+        self.assertEqual([len(args) / 2 for args in inserts], [1] * 7)
+
+    def test_put_result(self):
+
+        conn = FakeConnection(max_packet=2048)
+        collection = kvlite.collections.MysqlCollection(conn, 'test', kvlite.serializers.cPickleSerializer)
+        collection._indexes = dict()
+        # MySQL reports 2 affected rows for every updated row, written documents are returned
+        conn._cursor.execute = lambda sql, args=None: setattr(conn._cursor, 'rowcount', len(args or ()))
+        self.assertEqual(collection.put([(i, 'v%d' % i) for i in range(1, 4)]), 3)
+        self.assertEqual(collection.put(1, 'v1'), 1)
+
+    def test_key_range(self):
+
+        conn = FakeConnection(max_packet=2048)
+        collection = kvlite.collections.MysqlCollection(conn, 'test', kvlite.serializers.cPickleSerializer)
+        criteria = {'_key': {'$gte': 'a0', '$prefix': 'a'}}
+        self.assertEqual(list(collection.get(criteria, reverse=True)), [])
+        sql, args = conn._cursor.statements[-1]
+        self.assertEqual(sql, 'SELECT k,v FROM test WHERE k <> %s AND k >= %s AND k < %s ORDER BY k DESC LIMIT 100;')
+        self.assertEqual(args[1:], ('a'.ljust(40, '0').decode('hex'), 'b'.ljust(40, '0').decode('hex')))
+
+    def test_get_many_chunks(self):
+
+        conn = FakeConnection(max_packet=2048)
+        collection = kvlite.collections.MysqlCollection(conn, 'test', kvlite.serializers.cPickleSerializer)
+        keys = ['%040x' % i for i in range(1, 251)]
+        self.assertEqual(list(collection.get({'_key': keys})), [])
+        selects = [args for sql, args in conn._cursor.statements if sql.startswith('SELECT k,v')]
+        self.assertEqual([len(args) for args in selects], [100, 100, 50])
+
 if __name__ == '__main__':
     unittest.main()        
 
@@ -0,0 +1,154 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import time
+import unittest
+import threading
+
+from kvlite.pool import ConnectionPool
+from kvlite.pool import PooledConnection
+from kvlite.pool import PooledCursor
+from kvlite.pool import get_pool
+
+class FakeError(Exception):
+    pass
+
+class FakeCursor(object):
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, args=None):
+        self.conn.statements.append(sql)
+        if 'missing' in sql:
+            raise FakeError(1146, "Table 'missing' doesn't exist")
+        if 'lost' in sql:
+            raise FakeError(2013, 'Lost connection to MySQL server during query')
+
+    def fetchone(self):
+        return (1,)
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.statements = list()
+        self.alive = True
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def ping(self):
+        if not self.alive:
+            raise RuntimeError('connection is lost')
+
+    def commit(self):
+        self.statements.append('COMMIT')
+
+    def rollback(self):
+        self.statements.append('ROLLBACK')
+
+    def close(self):
+        self.closed = True
+
+class KvlitePoolTests(unittest.TestCase):
+
+    def test_checkout_checkin(self):
+
+        pool = ConnectionPool(FakeConnection, size=2, timeout=0.1)
+        conn1 = pool.checkout()
+        conn2 = pool.checkout()
+        self.assertEqual(pool.created, 2)
+        self.assertRaises(RuntimeError, pool.checkout)
+        pool.checkin(conn1)
+        self.assertEqual(pool.checkout(), conn1)
+        pool.checkin(conn1)
+        pool.checkin(conn2)
+        pool.close()
+        self.assertEqual(pool.created, 0)
+        self.assertTrue(conn1.closed and conn2.closed)
+
+    def test_wait_for_connection(self):
+
+        pool = ConnectionPool(FakeConnection, size=1, timeout=5)
+        conn = pool.checkout()
+        timer = threading.Timer(0.1, pool.checkin, (conn,))
+        timer.start()
+        self.assertEqual(pool.checkout(), conn)
+        timer.join()
+
+    def test_health_check_and_recycle(self):
+
+        pool = ConnectionPool(FakeConnection, size=1, ping=0)
+        conn = pool.checkout()
+        conn.alive = False
+        pool.checkin(conn)
+        time.sleep(0.01)
+        new_conn = pool.checkout()
+        self.assertNotEqual(new_conn, conn)
+        self.assertTrue(conn.closed)
+        pool.checkin(new_conn)
+
+        pool = ConnectionPool(FakeConnection, size=1, recycle=0)
+        conn = pool.checkout()
+        pool.checkin(conn)
+        time.sleep(0.01)
+        self.assertNotEqual(pool.checkout(), conn)
+
+    def test_pooled_connection(self):
+
+        pool = ConnectionPool(FakeConnection, size=1)
+        connection = PooledConnection(pool)
+        cursor = connection.cursor()
+
+        # read statements return connection to pool
+        cursor.execute('SELECT 1;')
+        self.assertEqual(cursor.fetchone(), (1,))
+        self.assertEqual(pool.idle, 1)
+
+        # write statements keep connection till commit
+        cursor.execute('INSERT INTO t VALUES (1);')
+        cursor.execute('SELECT 1;')
+        self.assertEqual(pool.idle, 0)
+        connection.commit()
+        self.assertEqual(pool.idle, 1)
+
+        conn = pool.checkout()
+        self.assertEqual(conn.statements, ['SELECT 1;', 'BEGIN;', 'INSERT INTO t VALUES (1);', 'SELECT 1;', 'COMMIT'])
+        pool.checkin(conn)
+
+    def test_statement_errors(self):
+
+        pool = ConnectionPool(FakeConnection, size=1)
+        cursor = PooledConnection(pool).cursor()
+
+        # the connection is returned to pool after error of statement
+        self.assertRaises(FakeError, cursor.execute, 'SELECT n FROM missing;')
+        self.assertEqual((pool.idle, pool.created), (1, 1))
+        conn = pool.checkout()
+        self.assertFalse(conn.closed)
+        pool.checkin(conn)
+
+        # broken connection is closed
+        self.assertRaises(FakeError, cursor.execute, 'SELECT lost;')
+        self.assertEqual((pool.idle, pool.created), (0, 0))
+        self.assertTrue(conn.closed)
+
+    def test_get_pool(self):
+
+        key = ('localhost', 3306, 'user', 'test_get_pool')
+        pool = get_pool(key, FakeConnection, size=3)
+        self.assertEqual(get_pool(key, FakeConnection), pool)
+        self.assertEqual(get_pool(key, FakeConnection, size=3, timeout=30), pool)
+        self.assertRaises(RuntimeError, get_pool, key, FakeConnection, size=10)
+
+    def test_is_write(self):
+
+        self.assertFalse(PooledCursor.is_write('SELECT k,v FROM t;'))
+        self.assertFalse(PooledCursor.is_write('  show tables;'))
+        self.assertTrue(PooledCursor.is_write('SELECT k FROM t LOCK IN SHARE MODE;'))
+        self.assertTrue(PooledCursor.is_write('DELETE FROM t;'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,11 @@ import unittest
 
 from kvlite.serializers import cPickleSerializer as cps
 from kvlite.serializers import CompressedJsonSerializer as cjs
+from kvlite.serializers import MarshalSerializer as ms
+from kvlite.serializers import ZdictJsonSerializer
+from kvlite.serializers import SERIALIZERS
+from kvlite.serializers import get_serializer
+from kvlite.serializers import register_serializer
 
 class KvliteSerializersTests(unittest.TestCase):
 
@@ -44,7 +49,46 @@ class KvliteSerializersTests(unittest.TestCase):
         v = {'a':1, 'b':2, 'c':3}
         self.assertEqual(cjs.loads(cjs.dumps(v)), v)
 
-        
+    def test_marshal_serializer(self):
+
+        for v in ('string', u'unicode', (1,2,3), [1,2,3], {'a':1, 'b':[2.5, None], 'c':{'d': True}}):
+            self.assertEqual(ms.loads(ms.dumps(v)), v)
+        self.assertEqual(ms.loads(buffer(ms.dumps(v))), v)
+        self.assertRaises(RuntimeError, ms.dumps, {'a': object()})
+
+    def test_zdict_json_serializer(self):
+
+        docs = [{'title': 'Blog post %d' % i, 'keywords': ['post', 'blog', 'kvlite'], 
+                    'author': {'name': 'author %d' % (i % 3)}} for i in range(100)]
+        plain = ZdictJsonSerializer()
+        self.assertEqual(plain.loads(plain.dumps(docs[0])), docs[0])
+        self.assertRaises(RuntimeError, plain.train, [{'a': 1}])
+
+        trained = plain.train(docs[:50])
+        self.assertEqual(trained.version, 1)
+        self.assertTrue(len(trained.dictionaries[1]) > 0)
+        size = lambda serializer: sum([len(serializer.dumps(doc)) for doc in docs[50:]])
+        self.assertTrue(size(trained) < size(plain))
+        for doc in docs:
+            self.assertEqual(trained.loads(trained.dumps(doc)), doc)
+
+        # values of previous versions are readable after retraining
+        retrained = ZdictJsonSerializer.from_meta(trained.train(docs).to_meta(dict()))
+        self.assertEqual(retrained.version, 2)
+        self.assertEqual(retrained.loads(trained.dumps(docs[0])), docs[0])
+        self.assertEqual(retrained.loads(plain.dumps(docs[0])), docs[0])
+        self.assertRaises(RuntimeError, plain.loads, trained.dumps(docs[0]))
+
+    def test_registry(self):
+
+        self.assertEqual(get_serializer('marshal'), ms)
+        self.assertRaises(RuntimeError, get_serializer, 'unknown')
+        self.assertRaises(RuntimeError, register_serializer, 'pickle', cjs)
+        self.assertRaises(RuntimeError, register_serializer, 'broken', object())
+        register_serializer('test_json', cjs)
+        self.assertEqual(get_serializer('test_json'), cjs)
+        del SERIALIZERS['test_json']
+
 if __name__ == '__main__':
     unittest.main()        
 
@@ -3,6 +3,8 @@ if '' not in sys.path:
     sys.path.append('')
 
 import kvlite 
+import shutil
+import tempfile
 import unittest
 import test_collection_common
 
@@ -10,7 +12,8 @@ class KvliteSqliteTests(test_collection_common.CommonCollectionTests):
 
     @classmethod
     def setUpClass(self):
-        self.URI = 'sqlite://tests/db/testdb.sqlite:{}'
+        self.path = tempfile.mkdtemp()
+        self.URI = 'sqlite://%s/testdb.sqlite:{}' % self.path
 
     @classmethod
     def tearDownClass(self):
@@ -19,6 +22,7 @@ class KvliteSqliteTests(test_collection_common.CommonCollectionTests):
         manager = kvlite.managers.CollectionManager(self.URI)
         for collection in manager.collections():
             manager.remove(collection)
+        shutil.rmtree(self.path)
         
 if __name__ == '__main__':
     unittest.main()        
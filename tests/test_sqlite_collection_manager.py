@@ -3,12 +3,21 @@ if '' not in sys.path:
     sys.path.append('')
 
 
+import kvlite
+import shutil
+import tempfile
 import unittest
+import threading
 
 from kvlite.managers import SqliteCollectionManager
 
 class KvliteSqliteCollectionManagerTests(unittest.TestCase):
 
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
     def test_parse_uri_with_collection(self):
         params = SqliteCollectionManager.parse_uri('sqlite://tests/db/testdb.sqlite:kvlite_test')
         self.assertEqual(params['backend'], 'sqlite')
@@ -21,9 +30,119 @@ class KvliteSqliteCollectionManagerTests(unittest.TestCase):
         self.assertEqual(params['db'], 'tests/db/testdb.sqlite')
         self.assertEqual(params['collection'], None)
 
+    def test_parse_uri_with_options(self):
+        params = SqliteCollectionManager.parse_uri('sqlite://tests/db/testdb.sqlite:kvlite_test?profile=fast&synchronous=FULL')
+        self.assertEqual(params['db'], 'tests/db/testdb.sqlite')
+        self.assertEqual(params['collection'], 'kvlite_test')
+        self.assertEqual(params['options']['journal'], 'wal')
+        self.assertEqual(params['options']['synchronous'], 'full')
+        params = SqliteCollectionManager.parse_uri('sqlite://tests/db/testdb.sqlite?cache_size=-2000')
+        self.assertEqual((params['collection'], params['options']), (None, {'cache_size': -2000}))
+
+        for uri in ('sqlite://memory:test?profile=unknown', 'sqlite://memory:test?journal=fast', 
+                    'sqlite://memory:test?mmap_size=large', 'sqlite://memory:test?page_size=1024'):
+            self.assertRaises(RuntimeError, SqliteCollectionManager.parse_uri, uri)
+
+    def test_settings_in_meta(self):
+
+        URI = 'sqlite://%s/%s.kvlite:kvlite_test?profile=bulk-load&busy_timeout=1000' % (self.path, kvlite.utils.tmp_name())
+        collection = kvlite.open(URI)
+        self.assertEqual(collection.meta['settings'], {
+            'journal': 'memory', 'synchronous': 'off', 'cache_size': -262144, 
+            'busy_timeout': 1000, 'mmap_size': 0,
+        })
+        # settings are not stored
+        collection.meta = collection.meta
+        self.assertNotIn('settings', collection.get({'_key': collection._ZEROS_KEY})[1])
+        collection.close()
+
+    def test_compact_layout(self):
+
+        URI = 'sqlite://%s/%s.kvlite:kvlite_test?layout=compact' % (self.path, kvlite.utils.tmp_name())
+        self.assertEqual(SqliteCollectionManager.parse_uri(URI)['layout'], 'compact')
+        self.assertRaises(RuntimeError, SqliteCollectionManager.parse_uri, 'sqlite://memory:test?layout=wide')
+
+        collection = kvlite.open(URI)
+        self.assertEqual(collection.layout, 'compact')
+        collection.put([('%02x' % i, {'n': i}) for i in range(1, 21)])
+        collection.delete('01')
+        collection.commit()
+        self.assertEqual(collection.count, 19)
+        self.assertEqual(collection.get({'_key': '02'}), (collection.prepare_key('02'), {'n': 2}))
+        self.assertEqual(sorted([v['n'] for k, v in collection]), range(2, 21))
+        self.assertRaises(RuntimeError, collection.put, 'key', {'n': 0})
+        collection.close()
+
+    def test_migrate(self):
+
+        URI = 'sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name())
+        collection = kvlite.open(URI)
+        collection.put([(i, {'n': i}) for i in range(1, 101)])
+        collection.commit()
+        self.assertEqual(collection.layout, 'default')
+
+        # changes made during migration are applied
+        def callback(copied):
+            collection.put([(1, {'n': 1000}), (200, {'n': 200})])
+            collection.delete(2)
+            collection.commit()
+
+        manager = kvlite.managers.CollectionManager(URI)
+        self.assertEqual(manager.migrate('kvlite_test', batch_size=30, callback=callback), 101)
+        self.assertEqual(manager.collections(), ['kvlite_test'])
+        self.assertEqual(manager.migrate('kvlite_test'), 0)
+        collection.close()
+
+        collection = kvlite.open(URI)
+        self.assertEqual(collection.layout, 'compact')
+        self.assertEqual(collection.count, 100)
+        docs = dict([(v['n'], k) for k, v in collection])
+        self.assertEqual(sorted(docs.keys()), range(3, 101) + [200, 1000])
+        self.assertEqual(collection.meta['name'], 'kvlite_test')
+        collection.close()
+
+    def test_migrate_ordered_keys(self):
+
+        URI = 'sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name())
+        collection = kvlite.open(URI, key_codec='ordered')
+        kvs = [(-1, 'a'), (2, 'b'), (10, 'c'), ('key', 'd'), (u'\u043a', 'e')]
+        collection.put(kvs)
+        collection.commit()
+
+        def callback(copied):
+            collection.put([(3, 'f'), ('new', 'g')])
+            collection.delete(-1)
+            collection.commit()
+
+        manager = kvlite.managers.CollectionManager(URI)
+        self.assertEqual(manager.migrate('kvlite_test', batch_size=2, callback=callback), 6)
+        collection.close()
+
+        collection = kvlite.open(URI)
+        self.assertEqual(collection.layout, 'compact')
+        self.assertEqual(collection.key_codec.name, 'ordered')
+        self.assertEqual(list(collection), [(2, 'b'), (3, 'f'), (10, 'c'), ('key', 'd'), ('new', 'g'), 
+                                            (u'\u043a'.encode('utf-8'), 'e')])
+        self.assertEqual(collection.get({'_key': 10}), (10, 'c'))
+        self.assertEqual(collection.count, 6)
+        collection.close()
+
+    def test_migrate_incorrect_keys(self):
+
+        URI = 'sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name())
+        collection = kvlite.open(URI)
+        collection.put('key', {'n': 1})
+        collection.commit()
+        collection.close()
+
+        manager = kvlite.managers.CollectionManager(URI)
+        self.assertRaises(RuntimeError, manager.migrate, 'kvlite_test')
+        self.assertEqual(manager.backend_manager.layout('kvlite_test'), 'default')
+        self.assertEqual(manager.backend_manager.tables(), ['kvlite_test', 'kvlite_test_count'])
+
     def test_manager(self):
         
-        URI = 'sqlite://tests/db/testdb.sqlite'
+        URI = 'sqlite://%s/testdb.sqlite' % self.path
         collection = 'kvlite_test'
         
         manager = SqliteCollectionManager(URI)
@@ -42,7 +161,7 @@ class KvliteSqliteCollectionManagerTests(unittest.TestCase):
         manager.close()
 
     def test_manager_get_collection(self):
-        URI = 'sqlite://tests/db/testdb.sqlite'
+        URI = 'sqlite://%s/testdb.sqlite' % self.path
         collection = 'kvlite_test'
 
         manager = SqliteCollectionManager(URI)
@@ -68,6 +187,99 @@ class KvliteSqliteCollectionManagerTests(unittest.TestCase):
 
         manager.close()
     
+    def test_counter(self):
+
+        import kvlite
+        URI = 'sqlite://%s/testdb.sqlite' % self.path
+        collection = 'kvlite_counter_test'
+
+        manager = SqliteCollectionManager(URI)
+        manager.create(collection)
+        self.assertIn(collection, manager.collections())
+        self.assertNotIn('%s_count' % collection, manager.collections())
+        self.assertIn('%s_count' % collection, manager.tables())
+
+        # collection without counter
+        manager._cursor.execute('DROP TRIGGER %s_count_insert;' % collection)
+        manager._cursor.execute('DROP TRIGGER %s_count_delete;' % collection)
+        manager._cursor.execute('DROP TABLE %s_count;' % collection)
+        manager._cursor.execute('INSERT INTO %s (k,v) VALUES (?,?);' % collection, ('1'.zfill(40), 'v'))
+        manager.connection.commit()
+        coll = kvlite.open('%s:%s' % (URI, collection))
+        self.assertIn('%s_count' % collection, manager.tables())
+        self.assertEqual(coll.count, 1)
+        coll.close()
+
+        manager.remove(collection)
+        self.assertNotIn('%s_count' % collection, manager.tables())
+        manager.close()
+
+    def test_concurrent_counter_creation(self):
+
+        URI = 'sqlite://%s/testdb.sqlite:kvlite_test' % self.path
+        collection = kvlite.open(URI)
+        collection.put([('%040x' % i, {'n': i}) for i in range(1, 11)])
+        collection.commit()
+        collection.close()
+
+        # collection without counter
+        manager = kvlite.managers.CollectionManager(URI)
+        manager.connection.execute('DROP TRIGGER kvlite_test_count_insert;')
+        manager.connection.execute('DROP TRIGGER kvlite_test_count_delete;')
+        manager.connection.execute('DROP TABLE kvlite_test_count;')
+        manager.connection.commit()
+
+        errors = list()
+        def opener():
+            try:
+                kvlite.open(URI).close()
+            except Exception, err:
+                errors.append(err)
+        threads = [threading.Thread(target=opener) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        collection = kvlite.open(URI)
+        collection.put('%040x' % 11, {'n': 11})
+        collection.commit()
+        collection.close()
+        self.assertEqual(manager.connection.execute('SELECT n FROM kvlite_test_count;').fetchall(), [(11,)])
+
+        # interrupted creation: the counter without value
+        manager.connection.execute('DELETE FROM kvlite_test_count;')
+        manager.connection.commit()
+        kvlite.open(URI).close()
+        self.assertEqual(manager.connection.execute('SELECT n FROM kvlite_test_count;').fetchall(), [(11,)])
+
+        # the counter is created by other connection after the check
+        other = SqliteCollectionManager(URI)
+        other._has_counter = lambda name: False
+        other.create_counter('kvlite_test')
+        other.connection.close()
+        self.assertEqual(manager.connection.execute('SELECT n FROM kvlite_test_count;').fetchall(), [(11,)])
+        manager.connection.close()
+
+    def test_auxiliary_tables(self):
+
+        URI = 'sqlite://%s/testdb.sqlite' % self.path
+        collection = kvlite.open('%s:docs' % URI)
+        collection.make_index('n', {'n': 1})
+        collection.close()
+        # collections with the names of auxiliary tables
+        for name in ('docs_idx_x', 'docs_migration', 'docs_total_count'):
+            kvlite.open('%s:%s' % (URI, name)).close()
+
+        manager = SqliteCollectionManager(URI)
+        self.assertEqual(sorted(manager.auxiliary('docs')), ['docs_count', 'docs_idx_n'])
+        self.assertEqual(sorted(manager.collections()), ['docs', 'docs_idx_x', 'docs_migration', 'docs_total_count'])
+        manager.remove('docs')
+        self.assertEqual(sorted(manager.collections()), ['docs_idx_x', 'docs_migration', 'docs_total_count'])
+        self.assertNotIn('docs_idx_n', manager.tables())
+        manager.close()
+
     def test_incorrect_uri_wrong_collection_in_remove(self):
 
         URI = 'sqlite://memory'
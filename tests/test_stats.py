@@ -0,0 +1,188 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import shutil
+import tempfile
+import kvlite
+import unittest
+
+from kvlite.stats import Stats
+from kvlite.stats import Histogram
+from kvlite.stats import merge
+from kvlite.stats import instrumented
+from kvlite.cache import LRUCache
+
+class KvliteHistogramTests(unittest.TestCase):
+
+    def test_histogram(self):
+
+        histogram = Histogram()
+        self.assertEqual(histogram.count, 0)
+        self.assertEqual(histogram.percentile(50), None)
+        for seconds in [0.0000005, 0.000003, 0.000003, 0.001, 2.5]:
+            histogram.add(seconds)
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.total, 2.5010065)
+        result = histogram.to_dict()
+        # buckets by upper bound in microseconds
+        self.assertEqual(result['buckets'], {1: 1, 4: 2, 1024: 1, 4194304: 1})
+        self.assertEqual(result['p50'], 0.000004)
+        self.assertEqual(result['max'], 4.194304)
+
+        copy = Histogram()
+        copy.update(result)
+        copy.update(result)
+        self.assertEqual(copy.counts, [n * 2 for n in histogram.counts])
+        self.assertAlmostEqual(copy.total, histogram.total * 2)
+
+def phase(stats, name, seconds, bytes_read=0, bytes_written=0):
+    ''' account the phase of current operation like StatsCursor
+    '''
+    operation = stats.current
+    getattr(operation, name).add(seconds)
+    operation.bytes_read += bytes_read
+    operation.bytes_written += bytes_written
+
+class Instrumented(object):
+
+    def __init__(self):
+        self._stats = Stats()
+
+    @instrumented('call')
+    def call(self, error=False):
+        phase(self._stats, 'sql', 0.001)
+        if error:
+            raise RuntimeError('failed')
+        return self.inner()
+
+    @instrumented('inner')
+    def inner(self):
+        phase(self._stats, 'fetch', 0.002, bytes_read=10)
+        return 1
+
+    @instrumented('iterate')
+    def iterate(self, error=False):
+        for i in range(3):
+            phase(self._stats, 'decode', 0.001)
+            yield i
+        if error:
+            raise RuntimeError('failed')
+
+class KvliteStatsTests(unittest.TestCase):
+
+    def test_instrumented(self):
+
+        obj = Instrumented()
+        self.assertEqual(obj.call(), 1)
+        self.assertRaises(RuntimeError, obj.call, True)
+        phase(obj._stats, 'encode', 0.001, bytes_written=5)
+
+        stats = obj._stats.to_dict()
+        operations = stats['operations']
+        self.assertEqual(sorted(operations), ['call', 'inner', 'other'])
+        self.assertEqual(operations['call']['count'], 2)
+        self.assertEqual(operations['call']['errors'], 1)
+        # phases are accounted to the innermost operation
+        self.assertEqual(operations['call']['phases'].keys(), ['sql'])
+        self.assertEqual(operations['call']['phases']['sql']['count'], 2)
+        self.assertEqual(operations['inner']['phases'].keys(), ['fetch'])
+        self.assertEqual(operations['other']['phases'].keys(), ['encode'])
+        self.assertEqual((stats['bytes_read'], stats['bytes_written']), (10, 5))
+
+    def test_iterators(self):
+
+        obj = Instrumented()
+        iterator = obj.iterate()
+        self.assertEqual(obj._stats.to_dict()['operations'], {})
+        self.assertEqual(iterator.next(), 0)
+        # phases of caller between items are not accounted to iterator
+        phase(obj._stats, 'sql', 0.001)
+        self.assertEqual(list(iterator), [1, 2])
+
+        operations = obj._stats.to_dict()['operations']
+        self.assertEqual(operations['iterate']['count'], 1)
+        self.assertEqual(operations['iterate']['phases']['decode']['count'], 3)
+        self.assertEqual(operations['other']['phases']['sql']['count'], 1)
+
+        # closed iterator is accounted, failed iterator is accounted as error
+        iterator = obj.iterate()
+        iterator.next()
+        iterator.close()
+        self.assertRaises(RuntimeError, list, obj.iterate(error=True))
+        operations = obj._stats.to_dict()['operations']
+        self.assertEqual(operations['iterate']['count'], 3)
+        self.assertEqual(operations['iterate']['errors'], 1)
+
+    def test_reset_merge(self):
+
+        obj = Instrumented()
+        obj.call()
+        first = obj._stats.to_dict()
+        obj._stats.reset()
+        self.assertEqual(obj._stats.to_dict()['operations'], {})
+        obj.call()
+        obj.call()
+        merged = merge([first, obj._stats.to_dict()])
+        self.assertEqual(merged['operations']['call']['count'], 3)
+        self.assertEqual(merged['operations']['inner']['bytes_read'], 30)
+        self.assertEqual(merged['bytes_read'], 30)
+        self.assertEqual(merge([])['operations'], {})
+
+class KvliteCollectionStatsTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name())
+
+    def test_collection_stats(self):
+
+        collection = kvlite.open(self.URI)
+        collection.stats(reset=True)
+
+        kvs = [('%040x' % i, {'i': i, 'text': 'x' * 100}) for i in range(1, 11)]
+        self.assertEqual(collection.put(kvs), 10)
+        collection.commit()
+        self.assertEqual(collection.get({'_key': kvs[0][0]}), kvs[0])
+        self.assertEqual(len(list(collection.get())), 10)
+        self.assertEqual(collection.count, 10)
+        self.assertRaises(RuntimeError, collection.get, after='abc')
+
+        stats = collection.stats()
+        operations = stats['operations']
+        for name in ('put', 'commit', 'get_one', 'get_all', 'count', 'get_after'):
+            self.assertTrue(operations[name]['count'] >= 1, name)
+        self.assertEqual(operations['get_after']['errors'], 1)
+        self.assertEqual(sorted(operations['put']['phases']), ['encode', 'sql'])
+        self.assertEqual(operations['put']['phases']['encode']['count'], 10)
+        self.assertEqual(sorted(operations['get_one']['phases']), ['decode', 'fetch', 'sql'])
+        self.assertEqual(operations['get_all']['phases']['decode']['count'], 10)
+        self.assertTrue(operations['put']['bytes_written'] > 1000)
+        self.assertTrue(operations['get_all']['bytes_read'] > 1000)
+        self.assertEqual(stats['bytes_written'], operations['put']['bytes_written'])
+        self.assertTrue(operations['get_one']['latency']['p99'] > 0)
+        self.assertTrue('cache' not in stats)
+
+        collection.stats(reset=True)
+        self.assertEqual(collection.stats()['operations'], {})
+        collection.close()
+
+    def test_cache_stats(self):
+
+        collection = kvlite.open(self.URI, cache=LRUCache(10))
+        # metadata is read by open()
+        collection.stats(reset=True)
+        collection.put('%040x' % 1, {'a': 1})
+        # documents are cached after commit
+        collection.commit()
+        collection.get({'_key': '%040x' % 1})
+        collection.get({'_key': '%040x' % 1})
+        stats = collection.stats()
+        self.assertEqual(stats['cache']['hits'], 1)
+        self.assertEqual(stats['operations']['get_one']['count'], 2)
+        collection.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import sys
 if '' not in sys.path:
     sys.path.append('')
 
+import shutil
+import tempfile
 import pprint
 import kvlite
 import unittest
@@ -12,7 +14,9 @@ class KvliteUtilsTests(unittest.TestCase):
 
     def setUp(self):
         
-        self.URI = 'sqlite://tests/db/{}.kvlite:kvlite_test'
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/{}.kvlite:kvlite_test' % self.path
 
     def test_get_uuid(self):
         
@@ -22,7 +26,7 @@ class KvliteUtilsTests(unittest.TestCase):
     def test_sqlite_open(self):
         
         _key = kvlite.get_uuid(1)[0]
-        collection = kvlite.open('sqlite://tests/db/testdb.sqlite:kvlite_test')
+        collection = kvlite.open('sqlite://%s/testdb.sqlite:kvlite_test' % self.path)
         collection.put(_key,1)
         self.assertEqual(collection.count,1)
         self.assertEqual(collection.get({'_key': _key}), (_key,1))
@@ -33,7 +37,7 @@ class KvliteUtilsTests(unittest.TestCase):
     
     def test_sqlite_remove(self):
         
-        kvlite.remove('sqlite://tests/db/testdb.sqlite:kvlite_test')
+        kvlite.remove('sqlite://%s/testdb.sqlite:kvlite_test' % self.path)
 
     def test_mysql_open(self):
         pass
@@ -174,7 +178,78 @@ class KvliteUtilsTests(unittest.TestCase):
         
         source.close()    
         target.close()
+
+    def test_copy_resume(self):
+        ''' test_copy_resume
+        '''
+        source = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        target = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        source.put([(k, 'value: %d' % k) for k in range(1, 101)])
+        source.commit()
+
+        def interrupt(copied, rowid):
+            if copied >= 30:
+                raise KeyboardInterrupt()
+
+        self.assertRaises(KeyboardInterrupt, kvlite.utils.copy, source, target, batch_size=10, callback=interrupt)
+        copied = target.count
+        self.assertTrue(30 <= copied < 100)
+        self.assertEqual(target.meta['copy']['copied'], copied)
+
+        progress = list()
+        self.assertEqual(kvlite.utils.copy(source, target, batch_size=10, 
+                            callback=lambda copied, rowid: progress.append(copied)), 100)
+        self.assertEqual(progress[0], copied + 10)
+        self.assertEqual(target.count, 100)
+        self.assertNotIn('copy', target.meta)
+        self.assertEqual(target.get({'_key': '100'})[1], 'value: 100')
+        source.close()
+        target.close()
+
+    def test_copy_resume_other_source(self):
+        ''' the checkpoint of other database with the same collection name is not used
+        '''
+        first = kvlite.open(self.URI.format('s1'))
+        second = kvlite.open(self.URI.format('s2'))
+        target = kvlite.open(self.URI.format(kvlite.utils.tmp_name()))
+        first.put([(k, 's1-%d' % k) for k in range(1, 51)])
+        first.commit()
+        second.put([(k, 's2-%d' % k) for k in range(1, 51)])
+        second.commit()
+        self.assertNotEqual(first.location, second.location)
+
+        def interrupt(copied, rowid):
+            if copied >= 20:
+                raise KeyboardInterrupt()
+
+        self.assertRaises(KeyboardInterrupt, kvlite.utils.copy, first, target, batch_size=10, callback=interrupt)
+        self.assertEqual(target.meta['copy']['source'], first.location)
+        self.assertEqual(kvlite.utils.copy(second, target, batch_size=10), 50)
+        self.assertEqual(target.get({'_key': '1'})[1], 's2-1')
+        self.assertEqual(target.count, 50)
+        for collection in (first, second, target):
+            collection.close()
         
+    def test_parallel_copy(self):
+        ''' test_parallel_copy
+        '''
+        source_uri = self.URI.format(kvlite.utils.tmp_name())
+        target_uri = self.URI.format(kvlite.utils.tmp_name())
+        source = kvlite.open(source_uri)
+        source.put([(k, 'value: %d' % k) for k in range(1, 301)])
+        source.commit()
+        source.close()
+
+        summary = kvlite.utils.parallel_copy(source_uri, target_uri, processes=3, batch_size=50)
+        self.assertEqual(len(summary['partitions']), 3)
+        self.assertEqual(summary['total'], 300)
+        self.assertEqual(sum([p['copied'] for p in summary['partitions']]), 300)
+
+        target = kvlite.open(target_uri)
+        self.assertEqual(target.count, 300)
+        self.assertEqual(target.get({'_key': '300'})[1], 'value: 300')
+        target.close()
+
 if __name__ == '__main__':
     unittest.main()        
 
@@ -0,0 +1,86 @@
+import sys
+if '' not in sys.path:
+    sys.path.append('')
+
+import shutil
+import tempfile
+import kvlite
+import sqlite3
+import unittest
+import threading
+
+from kvlite.webui.registry import CollectionRegistry
+
+class KvliteWebuiRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.URI = 'sqlite://%s/%s.kvlite:kvlite_test' % (self.path, kvlite.utils.tmp_name())
+        self.registry = CollectionRegistry({'test': self.URI})
+
+    def tearDown(self):
+
+        self.registry.close()
+
+    def test_reuse_collection(self):
+
+        collection = self.registry.get('test')
+        self.assertEqual(self.registry.get('test'), collection)
+        self.assertRaises(KeyError, self.registry.get, 'unknown')
+
+        # collections are not shared between threads
+        handles = list()
+        thread = threading.Thread(target=lambda: handles.append(self.registry.get('test')))
+        thread.start()
+        thread.join()
+        self.assertNotEqual(handles[0], collection)
+        handles[0].close()
+
+    def test_call_reopens_broken_collection(self):
+
+        def put(collection):
+            collection.put('01', {'a': 1})
+            collection.commit()
+
+        self.registry.call('test', put)
+        collection = self.registry.get('test')
+        collection.close()
+        # closed connection raises sqlite3.ProgrammingError, the collection is reopened
+        self.assertEqual(self.registry.call('test', lambda c: c.get({'_key': '01'}))[1], {'a': 1})
+        self.assertNotEqual(self.registry.get('test'), collection)
+
+        def fail(collection):
+            raise sqlite3.OperationalError('failed')
+
+        collection = self.registry.get('test')
+        self.assertRaises(sqlite3.OperationalError, self.registry.call, 'test', fail)
+        self.assertNotEqual(self.registry.get('test'), collection)
+
+    def test_registry_stats(self):
+
+        registry = self.registry
+        registry.call('test', lambda c: c.count)
+        opened, release = threading.Event(), threading.Event()
+
+        def read():
+            registry.call('test', lambda c: c.count)
+            opened.set()
+            release.wait()
+            registry.close()
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        opened.wait()
+        # the statistics of collections opened by both threads are merged
+        self.assertEqual(registry.stats()['test']['operations']['count']['count'], 2)
+        release.set()
+        thread.join()
+        # collections closed by the thread are not accounted
+        self.assertEqual(registry.stats()['test']['operations']['count']['count'], 1)
+        registry.close()
+        self.assertEqual(registry.stats(), {})
+
+if __name__ == '__main__':
+    unittest.main()